@@ -0,0 +1,80 @@
+"""
+Allocations of the monthly calc of net_per_stock over a synthetic table of negocios_realizados, traced with tracemalloc.
+Before: each month copies the table and slices the rows of the month (previous _append_net_per_stock_for_month). After: the rows of the month
+are read in place from the shared table.
+
+Usage:
+    python benchmarks/bench_monthly_calc.py [num_rows] [num_tickers]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../tests")))
+from pystock import calc_monthly_net_result as cmnr
+from pystock import net_per_stock_engine as engine
+from synthetic_notas import make_negocios_realizados
+
+YEAR = 2020
+
+
+def _legacy_append_month(net_per_stock, month_year, negocios_realizados, month_index, positions):
+    """Baseline: copy of the table and slice of the month per call."""
+    m, y = month_year.split("/")
+    list_notas = negocios_realizados.copy()
+    lo, hi = month_index[(int(y), int(m))]
+    for _, _, ticker, *values in engine.group_month_ticker(list_notas[lo:hi]):
+        line = cmnr._net_per_stock_line(month_year, ticker, *values, *positions.get(ticker))
+        net_per_stock.append(line)
+        positions.add(line)
+
+
+def trace_months(append_month, negocios_realizados):
+    """Net per stock of the 12 months, allocations traced per month.
+
+    Returns:
+        list, list, float: net_per_stock, peak bytes allocated per month, seconds.
+    """
+    net_per_stock = []
+    month_index = cmnr.index_months(negocios_realizados)
+    positions = engine.Positions()
+    peaks = []
+    seconds = 0.0
+    tracemalloc.start()
+    for m in range(1, 13):
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        append_month(net_per_stock, f"{m:02d}/{YEAR}", negocios_realizados, month_index, positions)
+        seconds += time.perf_counter() - start
+        peaks.append(tracemalloc.get_traced_memory()[1] - start_bytes)
+    tracemalloc.stop()
+    return net_per_stock, peaks, seconds
+
+
+def main():
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    num_tickers = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    negocios_realizados = make_negocios_realizados(
+        num_rows, YEAR, tickers=[f"T{t:03d}3 ON NM" for t in range(num_tickers)]
+    )
+
+    before, peaks_before, seconds_before = trace_months(_legacy_append_month, negocios_realizados)
+    after, peaks_after, seconds_after = trace_months(
+        cmnr._append_net_per_stock_for_month, negocios_realizados
+    )
+    assert before == after, "Net per stock differs from the baseline."
+    for name, peaks, seconds in [
+        ("before", peaks_before, seconds_before),
+        ("after", peaks_after, seconds_after),
+    ]:
+        print(
+            f"{name}: rows={num_rows} months=12 peak={sum(peaks) / len(peaks) / 1024:.1f} KiB/month "
+            f"(max {max(peaks) / 1024:.1f} KiB) time={seconds / 12 * 1e3:.2f} ms/month"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark wall time per page of the table extraction of notas de corretagem.
+Before: two page.extract_tables() passes per page (default and "lines_strict"). After: page_layout.extract_page_layout, edges merged once
+for both detections and the text of the cells read once from an index of the chars.
+
+Usage:
+    python benchmarks/bench_page_layout.py [path_pdf] [repeat]
+"""
+import os
+import sys
+import time
+
+import pdfplumber
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pystock import page_layout as pl
+
+
+def _two_passes(page):
+    tables = page.extract_tables()
+    df_custo = page.extract_tables(pl.TABLE_SETTINGS_CUSTOS)
+    return tables, df_custo
+
+
+def time_per_page(path, extract_function, warm_objects=False):
+    """Wall time per page of extract_function, each run opens a new pdf handle.
+
+    Args:
+        path (string): Path to pdf.
+        extract_function (function): Function receiving a page.
+        warm_objects (bool, optional): If true parses the pdf objects before timing, measuring only the table stage. Defaults to False.
+
+    Returns:
+        float,int: seconds per page, number of pages
+    """
+    with pdfplumber.open(path) as pdf:
+        total = 0.0
+        for page in pdf.pages:
+            if warm_objects:
+                page.objects
+            start = time.perf_counter()
+            extract_function(page)
+            total += time.perf_counter() - start
+            page.close()
+        return total / len(pdf.pages), len(pdf.pages)
+
+
+def main():
+    path = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else os.path.abspath(
+            os.path.join(
+                os.path.dirname(__file__), "../tests/tests_data/notas_operacoes_2020.pdf"
+            )
+        )
+    )
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    for warm_objects, stage in [(False, "page"), (True, "table stage")]:
+        before = min(
+            time_per_page(path, _two_passes, warm_objects)[0] for _ in range(repeat)
+        )
+        after, num_pages = min(
+            time_per_page(path, pl.extract_page_layout, warm_objects)
+            for _ in range(repeat)
+        )
+        print(
+            f"{stage:<12} pages={num_pages} before={before * 1000:.2f} ms/page "
+            f"after={after * 1000:.2f} ms/page speedup={before / after:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Micro-benchmark of the parse of blocos de custos over the fixtures tests/tests_data/_parse_{resumo_dos_negocios,clearing,bovespa,corretagem}_*.in.
+Before: the four legacy parsers (lower-case and rewrite every line, uncompiled re.split per header). After: table-driven _parse_custos_blocos.
+
+Usage:
+    python benchmarks/bench_parse_custos.py [path_tests_data] [number]
+"""
+import glob
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from pystock import helpersio as hio
+from pystock import parse_notas_corretagem as pnc
+
+BLOCOS = ["resumo_dos_negocios", "clearing", "bovespa", "corretagem"]
+LEGACY_HEADERS = [
+    [
+        "debêntures",
+        "vendas à vista",
+        "compras à vista",
+        "opções - compras",
+        "opções - vendas",
+        "operações à termo",
+        "\\)",
+        "valor das operações",
+    ],
+    [
+        "clearing",
+        "valor líquido das operações",
+        "taxa de liquidação",
+        "taxa de registro",
+        "total cblc",
+    ],
+    ["bolsa", "taxa de termo/opções", "taxa ana", "emolumentos", "total bovespa / soma"],
+    [
+        "corretagem / despesas",
+        "clearing",
+        "execução",
+        "execução casa",
+        "iss \\(são paulo\\)",
+        "irrf s/ operações, base r$",
+        "outras bovespa",
+        "total corretagem / despesas",
+    ],
+]
+
+
+def _legacy_parse_bloco(df_str, bloco):
+    """Legacy parsers of the blocos de custos, kept as baseline."""
+    linhas = df_str.split("\n")
+    linhas_processed = [x.lower().replace(".", "").replace(",", ".") for x in linhas]
+    headers = LEGACY_HEADERS[bloco]
+    valores = []
+    if bloco == 0:
+        for i in range(len(headers)):
+            valores.append(float(re.split(headers[i], linhas_processed[i])[-1].strip()))
+        return valores
+    for i in range(1, len(headers)):
+        values = re.split(headers[i], linhas_processed[i])[-1].strip()
+        if bloco == 3 and i == 5:
+            valores.append(float(values.split(" ")[-1].strip()))
+        else:
+            valores.append(float(values.split(" ")[0].strip()))
+    return valores
+
+
+def _legacy_parse_blocos(blocos):
+    valores = []
+    for bloco, df_str in enumerate(blocos):
+        valores.extend(_legacy_parse_bloco(df_str, bloco))
+    return valores
+
+
+def load_cases(path_data):
+    """Load fixtures grouped by test id, only ids having the four blocos.
+
+    Args:
+        path_data (string): Path to tests_data.
+
+    Returns:
+        list: List of [resumo, clearing, bovespa, corretagem] strings.
+    """
+    ids = sorted(
+        os.path.basename(p)[len("_parse_clearing_") : -len(".in")]
+        for p in glob.glob(os.path.join(path_data, "_parse_clearing_*.in"))
+    )
+    cases = []
+    for id_test in ids:
+        paths = [os.path.join(path_data, f"_parse_{b}_{id_test}.in") for b in BLOCOS]
+        if all(os.path.exists(p) for p in paths):
+            cases.append([hio.read_strings(p) for p in paths])
+    return cases
+
+
+def main():
+    path_data = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else os.path.abspath(os.path.join(os.path.dirname(__file__), "../tests/tests_data/"))
+    )
+    number = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    cases = load_cases(path_data)
+    assert cases, f"No fixtures _parse_*_{{id}}.in found in {path_data}."
+    for blocos in cases:
+        assert _legacy_parse_blocos(blocos) == pnc._parse_custos_blocos(blocos)
+
+    before = min(
+        timeit.repeat(
+            lambda: [_legacy_parse_blocos(b) for b in cases], number=number, repeat=3
+        )
+    )
+    after = min(
+        timeit.repeat(
+            lambda: [pnc._parse_custos_blocos(b) for b in cases], number=number, repeat=3
+        )
+    )
+    per_nota = number * len(cases)
+    print(
+        f"notas={len(cases)} before={before / per_nota * 1e6:.2f} us/nota "
+        f"after={after / per_nota * 1e6:.2f} us/nota speedup={before / after:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark of the whole parse of notas de corretagem (parse_notas_corretagem_btg) on synthetic pdfs (tests/synthetic_notas.py).
+Reports pages/sec, rows/sec (negócios realizados) and peak RSS per number of pages, each parse runs in a new process so the peak RSS
+is of that parse only. Generated pdfs are kept in the data directory and reused.
+
+Usage:
+    python benchmarks/bench_parse_pdf.py [--pages 10 1000 10000] [--trades 5] [--fast] [--use-template] [--workers 1] [--window N] [--max-memory BYTES]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../tests")))
+from pystock import parse_notas_corretagem as pnc
+import synthetic_notas as sn
+
+PAGES = [10, 1000, 10000]
+DATA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "data/"))
+
+
+def _peak_rss():
+    """Peak resident memory of the process in bytes."""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes
+
+
+def synthetic_pdf(pages, trades_per_page, data_path=DATA_PATH):
+    """Path of the synthetic pdf with the number of pages, generated if missing.
+
+    Args:
+        pages (int): Number of pages.
+        trades_per_page (int): Negócios per page.
+        data_path (string, optional): Directory of generated pdfs. Defaults to DATA_PATH.
+
+    Returns:
+        string: Path to pdf.
+    """
+    os.makedirs(data_path, exist_ok=True)
+    path = os.path.join(data_path, f"notas_synthetic_{pages}p_{trades_per_page}t.pdf")
+    if not os.path.exists(path):
+        sn.write_notas_pdf(path, pages, trades_per_page)
+    return path
+
+
+def run_parse(path, kwargs):
+    """Parse the pdf in this process.
+
+    Returns:
+        dict: seconds, rows, peak_rss
+    """
+    start = time.perf_counter()
+    negocios_realizados, _ = pnc.parse_notas_corretagem_btg(path, **kwargs)
+    return {
+        "seconds": time.perf_counter() - start,
+        "rows": len(negocios_realizados) - 1,
+        "peak_rss": _peak_rss(),
+    }
+
+
+def run_parse_subprocess(path, kwargs):
+    """Parse the pdf in a new process, the peak RSS is not affected by previous runs."""
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", path, json.dumps(kwargs)],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(run_parse(sys.argv[2], json.loads(sys.argv[3]))))
+        return
+    parser = argparse.ArgumentParser(description="Benchmark parse of synthetic notas de corretagem.")
+    parser.add_argument("--pages", type=int, nargs="+", default=PAGES)
+    parser.add_argument("--trades", type=int, default=5, help="Negócios per page.")
+    parser.add_argument("--fast", action="store_true")
+    parser.add_argument("--use-template", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--window", type=int, default=None)
+    parser.add_argument("--max-memory", type=int, default=None)
+    args = parser.parse_args()
+    kwargs = {
+        "fast": args.fast,
+        "use_template": args.use_template,
+        "workers": args.workers,
+        "window": args.window,
+        "max_memory": args.max_memory,
+    }
+    print(f"Options: {kwargs}")
+    for pages in args.pages:
+        result = run_parse_subprocess(synthetic_pdf(pages, args.trades), kwargs)
+        print(
+            f"pages={pages:<6} rows={result['rows']:<7} "
+            f"pages/sec={pages / result['seconds']:8.2f} rows/sec={result['rows'] / result['seconds']:9.2f} "
+            f"peak_rss={result['peak_rss'] / 2 ** 20:8.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
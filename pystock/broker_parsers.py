@@ -0,0 +1,130 @@
+"""
+Registry of parsers of notas de corretagem per broker. The broker of a pdf is found by a fingerprint of the header text of its first page,
+without table detection, and the choice is cached per file. Every parser returns negócios realizados with the columns HEADERS_RESUMO_NOTA
+(HEADERS_NEGOCIOS_REALIZADOS plus "taxas" and "Data pregao") and a dict of custos per número de nota.
+"""
+import os
+import re
+
+import pdfplumber
+from pdfplumber import utils
+
+from pystock import parse_notas_corretagem as pnc
+
+FINGERPRINT_HEADER_RATIO = 0.2  # Fraction of the height of the first page read by the fingerprint
+BROKER_PARSERS = {}  # Broker: {"fingerprint", "parse", "iterate"}
+_BROKER_OF_FILE = {}  # (path, size, mtime): broker
+
+
+class UnknownBrokerError(ValueError):
+    """No registered parser of notas de corretagem matches the pdf."""
+
+
+def register_parser(broker, fingerprint, parse, iterate):
+    """Register the parser of notas de corretagem of a broker.
+
+    Args:
+        broker (str): Name of the broker, ex: "btg".
+        fingerprint (str): Regex searched (case insensitive) in the header text of the first page.
+        parse (function): parse(path, **kwargs) returning negócios realizados (header HEADERS_RESUMO_NOTA) and dict of custos per nota.
+        iterate (function): iterate(path, **kwargs) yielding one record per page, see parse_notas_corretagem.iter_notas_corretagem_btg.
+    """
+    BROKER_PARSERS[broker] = {
+        "fingerprint": re.compile(fingerprint, re.IGNORECASE).search,
+        "parse": parse,
+        "iterate": iterate,
+    }
+    _BROKER_OF_FILE.clear()  # Detected brokers may change
+
+
+register_parser(
+    "btg",
+    r"btg\s*pactual",
+    pnc.parse_notas_corretagem_btg,
+    pnc.iter_notas_corretagem_btg,
+)
+
+
+def read_header_text(path, ratio=FINGERPRINT_HEADER_RATIO):
+    """Text of the top of the first page of the pdf, the other pages are not read.
+
+    Args:
+        path (string): Path to pdf.
+        ratio (float, optional): Fraction of the height of the page. Defaults to FINGERPRINT_HEADER_RATIO.
+
+    Returns:
+        str: Header text, empty if the pdf has no pages.
+    """
+    with open(path, "rb") as stream:
+        pdf = pdfplumber.open(stream)
+        for _, page in pnc.iter_pdf_pages(pdf):
+            limit = page.bbox[1] + page.height * ratio
+            return utils.extract_text([c for c in page.chars if c["bottom"] <= limit])
+    return ""
+
+
+def detect_broker(path):
+    """Broker of the pdf by the fingerprint of the header, cached per file (path, size and modification time).
+
+    Args:
+        path (string): Path to pdf.
+
+    Raises:
+        UnknownBrokerError: No fingerprint matches the header.
+
+    Returns:
+        str: Broker.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _BROKER_OF_FILE:
+        header = read_header_text(path)
+        brokers = [
+            broker
+            for broker, parser in BROKER_PARSERS.items()
+            if parser["fingerprint"](header)
+        ]
+        if not brokers:
+            raise UnknownBrokerError(
+                f"No parser of notas de corretagem matches the header of {path}: {header[:80]!r}"
+            )
+        _BROKER_OF_FILE[key] = brokers[0]
+    return _BROKER_OF_FILE[key]
+
+
+def _get_parser(path, broker):
+    if broker is None:
+        broker = detect_broker(path)
+    if broker not in BROKER_PARSERS:
+        raise UnknownBrokerError(
+            f"No parser registered for broker {broker}, registered: {list(BROKER_PARSERS)}."
+        )
+    return BROKER_PARSERS[broker]
+
+
+def parse_notas_corretagem(path, broker=None, **kwargs):
+    """Parse notas de corretagem with the parser of the broker.
+
+    Args:
+        path (string): Path to pdf.
+        broker (str, optional): Broker, if None detected by detect_broker. Defaults to None.
+        **kwargs: Options of the parser of the broker, ex: cache, workers.
+
+    Returns:
+        lista (str),dict: lista de negócios realizados (header HEADERS_RESUMO_NOTA), dict de custos por nota
+    """
+    return _get_parser(path, broker)["parse"](path, **kwargs)
+
+
+def iter_notas_corretagem(path, broker=None, **kwargs):
+    """Generator of records per page with the parser of the broker.
+
+    Args:
+        path (string): Path to pdf.
+        broker (str, optional): Broker, if None detected by detect_broker. Defaults to None.
+        **kwargs: Options of the parser of the broker.
+
+    Returns:
+        generator: Records of pages, keys "pagina", "num_nota", "data_pregao", "negocios_realizados", "custos_nota".
+    """
+    return _get_parser(path, broker)["iterate"](path, **kwargs)
@@ -3,6 +3,7 @@ Calculate net monthly result per month.
 First: Creates a net_per_stock table that is evaluated by month and aggregates buy, sell operations.
 Second: Calculates the net profit per month.
 """
+import bisect
 import pandas as pd
 import os
 import pdfplumber
@@ -10,42 +11,30 @@ import re
 import json, codecs
 
 import pystock.helpersio as hio#Running from package perspective
+import pystock.schema_notas as schema
+from pystock import net_per_stock_engine as engine
+from pystock.net_per_stock_table import NET_PER_STOCK_SCHEMA, NetPerStock
 # import helpersio as hio
 import sys
 
 
 
-HEADERS_TABLE_NET_PER_STOCK = [
-    "Month Year",
-    "Ticker",
-    "Available Quantity units",
-    "Average Buy Price brl_unit",
-    "Sold Quantity units",
-    "Average Sell Price without sales operations costs brl_unit",
-    "Profit Loss without sales operations costs brl_per_unit",
-    "Profit Loss with sales operations costs per unit brl_per_unit",
-    "Profit Loss brl",
-    "Remain Quantity units",
-    "Remain Operation value with sales operations costs brl",
-]
+HEADERS_TABLE_NET_PER_STOCK = [name for name, _ in NET_PER_STOCK_SCHEMA]
 HEADERS_MONTHLY_PROFIT_LOSS=["Month Year","Initial assets brl","Total transactions brl","Total profitloss without sales costs brl","Total profitloss with sales costs brl","Ratio Profit to assets sold percentage ","Remaining Assets brl"]
 
 
 
 def _transform_str_numeric_read_negocios_realizados(row):
-    """Transformation fucntion from string to numeric for rows of table net_per_stock.
+    """Transformation function from string to the types of schema_notas for rows of table negocios_realizados read from csv (index column first).
+    Quantidade int (non integer values raise ValueError), Preço, Valor Operação and taxas float, Data pregao schema_notas.DataBr.
 
     Args:
         row (list): List of strings
 
     Returns:
-        list: List of strings and numeric.
+        list: List of strings and typed values.
     """
-    row[8] = int(float(row[8]))
-    row[9] = float(row[9])
-    row[10] = float(row[10])
-    row[13] = float(row[13])
-    return row
+    return schema.type_negocio(row, 1)
 
 
 def _transform_str_numeric_read_net_per_stock(row):
@@ -96,9 +85,28 @@ def _load_table_net_per_stock(path, skip_headers=False):
     return b
 
 
+def read_net_per_stock_year_balance(path):
+    """Read net_per_stock_year_balance{year}.csv with the numeric columns converted.
+
+    Args:
+        path (string): Path to csv with headers.
+
+    Returns:
+        list: Rows of the year balance, empty if the file does not exist (no previous stocks).
+    """
+    if not os.path.exists(path):
+        print("No previous stock data found.")
+        return []
+    return hio.read_csv(
+        path,
+        skip_headers=True,
+        func_transf_row=_transform_str_numeric_read_net_per_stock,
+    )
+
+
 def _is_year_correct(y, nested_list):
-    date_file = nested_list[1][14].split("/")[1:]  # Tests for the first instance only
-    if y == (date_file[1]):
+    date_file = nested_list[0][14]  # Tests for the first instance only
+    if y == str(date_file.year):
         return True
     else:
         raise ValueError(
@@ -107,8 +115,8 @@ def _is_year_correct(y, nested_list):
 
 
 def _is_month_year_correct(m, y, nested_list, i=1):
-    date_file = nested_list[i][14].split("/")[1:]  # Tests for the first instance i
-    if (m == (date_file[0])) & (y == (date_file[1])):
+    date_file = nested_list[i][14]  # Tests for the first instance i
+    if (m == f"{date_file.month:02d}") & (y == str(date_file.year)):
         return True
     else:
         raise ValueError(
@@ -117,7 +125,7 @@ def _is_month_year_correct(m, y, nested_list, i=1):
 
 
 def get_month(date):
-    """Extract month as form receiving string dd/mm/yyyy or mm/yyyy
+    """Extract month as form receiving string dd/mm/yyyy or mm/yyyy or a date (Data pregao of schema_notas)
 
     Args:
         date (string): Date formate dd/mm/yyyy
@@ -125,6 +133,8 @@ def get_month(date):
     Returns:
         mm: string with month.
     """
+    if isinstance(date, schema.DataBr):
+        return f"{date.month:02d}"
     num_chars = len(date)
     if num_chars == 10:
         return date.split("/")[1]
@@ -132,106 +142,93 @@ def get_month(date):
         return date.split("/")[0]
 
 
-def _search_col(key, col, a, lo, hi, trans_function=None, transformation=False):
-    """Search key in col of a nested list, performs the lower boundary search in case of repeated values.
+def month_key(date):
+    """Comparable key yyyymm of a date, ex: "15/03/2019", "03/2019" and "3/2019" -> 201903. Year balance rows "00/2020" -> 202000, before
+    the months of the year.
 
     Args:
-        key (comparable): key to search
-        col (int): index of column to search key
-        a (list): nested list
-        lo (int): Lower index
-        hi (int): Higher index
-        trans_function (function, optional): Function to preprocess column content before comparison with the key. Defaults to None.
-        transformation (bool, optional): Marks if the function will use the preprocess function. Defaults to False.
+        date (string): Date dd/mm/yyyy, mm/yyyy or a date (Data pregao of schema_notas).
 
     Returns:
-        [type]: [description]
+        int: yyyymm
     """
-    if lo >= hi:
-        if transformation:
-            try:
-                val = trans_function(a[lo][col])
-            except IndexError:
-                # print("IndexError")
-                # TODO:Create an improved function to create a set of months that contain notas so this would be avoided
-                return -1  # Not found
+    if isinstance(date, schema.DataBr):
+        return date.year * 100 + date.month
+    parts = date.split("/")
+    return int(parts[-1]) * 100 + int(parts[-2])
+
+
+class SortedKeys:
+    """Key column of a table sorted by the key, computed once. Lookups are iterative binary searches (bisect) over the keys.
+
+    Args:
+        a (list): Nested list sorted by the key of col.
+        col (int): Column of the key.
+        key_function (function, optional): Key of the column content. Defaults to month_key, None compares the content.
+    """
+
+    def __init__(self, a, col, key_function=month_key):
+        if key_function is None:
+            self.keys = [row[col] for row in a]
         else:
-            val = a[lo][col]
-        if val == key:
+            self.keys = [key_function(row[col]) for row in a]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lower_bound(self, key, lo=0, hi=None):
+        """First index whose key is not less than key."""
+        return bisect.bisect_left(self.keys, key, lo, len(self.keys) if hi is None else hi)
+
+    def upper_bound(self, key, lo=0, hi=None):
+        """First index whose key is greater than key."""
+        return bisect.bisect_right(self.keys, key, lo, len(self.keys) if hi is None else hi)
+
+    def range(self, key):
+        """Rows with the key.
+
+        Returns:
+            int,int: First index, last index + 1. Equal if the key is not found.
+        """
+        lo = self.lower_bound(key)
+        return lo, self.upper_bound(key, lo)
+
+    def first(self, key):
+        """First index with the key, -1 if not found."""
+        lo = self.lower_bound(key)
+        if lo < len(self.keys) and self.keys[lo] == key:
             return lo
-        else:
-            return -1  # Not found
-    mid = lo + (hi - lo) // 2
-    if transformation:
-        val = trans_function(a[mid][col])
-    else:
-        val = a[mid][col]
-    if val >= key:
-        return _search_col(
-            key, col, a, lo, mid, trans_function, transformation
-        )  # Binary Search Lower bound
-    else:  # val < key
-        return _search_col(key, col, a, mid + 1, hi, trans_function, transformation)
-
-
-def _search_previous_col(key, col, a, trans_function=None, transformation=False):
-    prev_index = -1
-    for i, row in enumerate(a):
-        if transformation:
-            val = trans_function(row[col])
-        else:
-            val = row[col]
-        if val < key:
-            prev_index = i
-        else:
-            break
-    return prev_index
+        return -1
 
+    def previous(self, key):
+        """Last index whose key is less than key, -1 if none."""
+        return self.lower_bound(key) - 1
 
-def _search_previous_next_col(key, col, a, trans_function=None, transformation=False):
-    prev_index = -1
-    next_index = -1
-    for i, row in enumerate(a):
-        if transformation:
-            val = trans_function(row[col])
-        else:
-            val = row[col]
-        if val < key:
-            prev_index = i
-        elif val == key:
-            continue
-        else:  # Found next
-            next_index = i
-            break
-    if next_index == -1:
-        next_index = len(a)
-    if prev_index == -1:
-        prev_index = 0
-    return prev_index, next_index
-
-
-def _search_index_range_of_key(key, col, a, trans_function=None, transformation=False):
-    ix = []
-    for i, row in enumerate(a):
-        if transformation:
-            val = trans_function(row[col])
-        else:
-            val = row[col]
-        if val == key:
-            ix.append(i)
-    if ix:
-        prev_index = ix[0]
-        next_index = ix[-1] + 1
-    else:
-        prev_index = 0
-        next_index = 0
-    return prev_index, next_index
+    def groups(self):
+        """Range of rows of each key, in order.
+
+        Yields:
+            key, int, int: Key, first index, last index + 1.
+        """
+        lo = 0
+        while lo < len(self.keys):
+            key = self.keys[lo]
+            hi = self.upper_bound(key, lo)
+            yield key, lo, hi
+            lo = hi
+
+
+def _search_keys(nested_list, col, trans_function, transformation, keys):
+    """Keys given by the caller, or SortedKeys of col of nested_list."""
+    if keys is None:
+        keys = SortedKeys(nested_list, col, trans_function if transformation else None)
+    return keys
 
 
 def _get_index_range_search_col(
-    m, col, nested_list, trans_function=None, transformation=False
+    m, col, nested_list, trans_function=None, transformation=False, keys=None
 ):
-    """Return lower and greatest range for previous index of a key and index of the first higher key than search key. Receives as input a sorted nested list where a key is being seached in the col number.Returns 1,1(Considers receiving headers in data) if value is not contained. 
+    """Return lower and greatest range for previous index of a key and index of the first higher key than search key. Receives as input a sorted nested list where a key is being seached in the col number.Returns 0,0 if value is not contained.
 
     Args:
         m (comparable): comparable being searched
@@ -239,25 +236,19 @@ def _get_index_range_search_col(
         nested_list (list): Nested List with the values being searched. Ex [[0,1,2,2][0,1,2,2]] First inner list represents a row of attributes of an instance.
         trans_function (func): Function to transform the comparison value of the column.    
         transformation (boolean): If true uses a tranformation in the column value before comparison of the values.
+        keys (SortedKeys, optional): Keys of col of nested_list, built once for several searches on the same table. Defaults to None, built per call.
 
     Returns:
         int,int: Index of the previous key being searched, first index of the next key of the key  being searched. Ex: key=3 list=[1,3,3,5] returns 1,3
     """
-    if nested_list:
-        # lo, hi = _search_previous_next_col(
-        #     m, col, nested_list, trans_function, transformation
-        # )
-        lo, hi = _search_index_range_of_key(
-            m, col, nested_list, trans_function, transformation
-        )
-
-        return lo, hi
-    else:  # No operations found for the month
+    lo, hi = _search_keys(nested_list, col, trans_function, transformation, keys).range(m)
+    if lo == hi:  # No operations found for the month
         return 0, 0
+    return lo, hi
 
 
 def _get_previous_index_search_col(
-    m, col, nested_list, trans_function=None, transformation=False
+    m, col, nested_list, trans_function=None, transformation=False, keys=None
 ):
     """Return previous index of a a key, from a sorted nested list where a key is being seached in the col number.Returns -1 if value is not found. 
 
@@ -267,17 +258,18 @@ def _get_previous_index_search_col(
         nested_list (list): Nested List with the values being searched. Ex [[0,1,2,2][0,1,2,2]] First inner list represents a row of attributes of an instance.
         trans_function (func): Function to transform the comparison value of the column.    
         transformation (boolean): If true uses a tranformation in the column value before comparison of the values.
+        keys (SortedKeys, optional): Keys of col of nested_list, built once for several searches on the same table. Defaults to None, built per call.
 
     Returns:
         int: Index of the value being searched.
     """
-    ix = _search_previous_col(m, col, nested_list, trans_function, transformation)
+    ix = _search_keys(nested_list, col, trans_function, transformation, keys).previous(m)
     assert ix != -1, f"Previous keyword to {m} was not found."
     return ix
 
 
 def _get_first_index_search_col(
-    m, col, nested_list, trans_function=None, transformation=False
+    m, col, nested_list, trans_function=None, transformation=False, keys=None
 ):
     """Return first index of a sorted nested list where a key is being seached in the col number.Returns -1 if value is not found. 
 
@@ -287,41 +279,34 @@ def _get_first_index_search_col(
         nested_list (list): Nested List with the values being searched. Ex [[0,1,2,2][0,1,2,2]] First inner list represents a row of attributes of an instance.
         trans_function (func): Function to transform the comparison value of the column.    
         transformation (boolean): If true uses a tranformation in the column value before comparison of the values.
+        keys (SortedKeys, optional): Keys of col of nested_list, built once for several searches on the same table. Defaults to None, built per call.
 
     Returns:
         int: Index of the value being searched or -1 in case no notas was found in the month.
     """
-    ix = _search_col(
-        m, col, nested_list, 0, len(nested_list), trans_function, transformation
-    )
+    ix = _search_keys(nested_list, col, trans_function, transformation, keys).first(m)
     if ix == -1:  # Not found
         print(f"No Notas was found for month {m}.")
     return ix
 
 
-def get_stocks_per_ticker_previous_month_year(ticker, net_per_stock):
-    """Get Previous month stock infos per ticker. If not found return zeros.
+def index_months(negocios_realizados, col=14):
+    """Index of the rows of each month of a table sorted by date, from the yyyymm keys of the table (SortedKeys). Lookups per month are O(1).
 
     Args:
-        ticker (string): Ticker string
-        net_per_stock (list): List containing historic information of stock wallet.
+        negocios_realizados (list): Table negocios_realizados sorted by ascending date (rows read from csv, Data pregao in col 14).
+        col (int, optional): Column of the date (schema_notas.DataBr). Defaults to 14.
 
     Returns:
-        int,int: prev_units=Units in wallet in previous month,prev_value=Value in wallet in previous month
+        dict: (year, month): (first row, last row + 1)
     """
-    # TODO:Implement a verification of month year in the case prev month is from another year
-    ix_prev_ticker = -1
-    for k in range(len(net_per_stock) - 1, -1, -1):
-        if net_per_stock[k][1] == ticker:
-            ix_prev_ticker = k
-            break
-    if ix_prev_ticker == -1:
-        return 0, 0
-    else:
-        return net_per_stock[ix_prev_ticker][-2], net_per_stock[ix_prev_ticker][-1]
+    return {
+        divmod(key, 100): (lo, hi)
+        for key, lo, hi in SortedKeys(negocios_realizados, col).groups()
+    }
 
 
-def get_stocks_per_ticker_at_month_year(ticker, net_per_stock, month, year):
+def get_stocks_per_ticker_at_month_year(ticker, net_per_stock, month, year, keys=None):
     """Get month stock infos per ticker at month.
 
     Args:
@@ -329,19 +314,18 @@ def get_stocks_per_ticker_at_month_year(ticker, net_per_stock, month, year):
         net_per_stock (list): List containing historic information of stock wallet.
         month (comparable): Month  to be searched information.
         year (comparable): Year  to be searched information.
+        keys (SortedKeys, optional): yyyymm keys of net_per_stock (SortedKeys(net_per_stock, 0)), built once for several lookups. Defaults to None, built per call.
 
     Returns:
-        int,int: units=Units in wallet at search month,prev_value=Value in wallet at search month
+        int,int: units=Units in wallet at search month,prev_value=Value in wallet at search month. Zeros if the ticker has no row in the month.
     """
-    if len(net_per_stock) == 1:  # No history of previous Stocks
-        return 0, 0
-    elif get_month(net_per_stock[1][0]) < month:  # No history of previous Stocks
-        return 0, 0
-    else:
-        i = _get_first_index_search_col(
-            month, 0, net_per_stock, get_month, True
-        )  # Month Year is within col 0
-        return net_per_stock[i][10], net_per_stock[i][11]
+    if keys is None:
+        keys = SortedKeys(net_per_stock, 0)
+    lo, hi = keys.range(int(year) * 100 + int(month))
+    for i in range(lo, hi):
+        if net_per_stock[i][1] == ticker:
+            return net_per_stock[i][-2], net_per_stock[i][-1]
+    return 0, 0
 
 
 def get_previous_month_year(m, y, type_out="int"):
@@ -361,99 +345,141 @@ def get_previous_month_year(m, y, type_out="int"):
         raise ValueError(f"Type of output return {type_out} non recognized.")
 
 
-def _append_net_per_stock_for_month(net_per_stock, month_year, negocios_realizados):
+def _append_net_per_stock_for_month(
+    net_per_stock, month_year, negocios_realizados, month_index=None, positions=None
+):
     """Append to list net operations per stock for month_year. Consolidates all buy, sell and remaining operations per month (including older ones) per ticker.
 
     Args:
         net_per_stock (list): List of table net_per_stock sorted by ascending date that will receive the values.
         month_year (string): String containg month and year to be appended in the format "03/2019"
-        negocios_realizados (list): List of table negocios_realizados sorted by ascending date with the table with the notas de corretagem for the month to be appended .
+        negocios_realizados (list): List of table negocios_realizados sorted by ascending date with the table with the notas de corretagem for the month to be appended . Read in place, shared by all months (not copied).
+        month_index (dict, optional): Rows per month from index_months(negocios_realizados), built once for all months of the table. Defaults to None, built for this call.
+        positions (net_per_stock_engine.Positions, optional): Latest position per ticker of net_per_stock, updated with the appended rows. Must be built from net_per_stock and kept for all months. Defaults to None, built for this call.
     """
     m, y = month_year.split("/")
     assert _is_year_correct(y, negocios_realizados)
-    list_notas = negocios_realizados.copy()
 
-    cur_ix = _get_first_index_search_col(
-        m, 14, list_notas, get_month, True
-    )  # Month is within col 14
+    if month_index is None:
+        month_index = index_months(negocios_realizados)
+    cur_ix, next_ix = month_index.get((int(y), int(m)), (-1, -1))
     if cur_ix == -1:  # No notas was found in the month
+        print(f"No Notas was found for month {m}.")
         return
-    assert _is_month_year_correct(m, y, list_notas, i=cur_ix)
-    # TODO:Fix prev_ix, next_ix to avoid doing linear search
-    prev_ix, next_ix = _get_index_range_search_col(m, 14, list_notas, get_month, True)
+    assert _is_month_year_correct(m, y, negocios_realizados, i=cur_ix)
+    if positions is None:
+        positions = engine.Positions(net_per_stock)
+    for _, _, ticker, *values in engine.group_month_ticker(
+        negocios_realizados, cur_ix, next_ix
+    ):  # Loop per ticker of the month
+        prev_units, prev_value = positions.get(ticker)
+        line = _net_per_stock_line(month_year, ticker, *values, prev_units, prev_value)
+        net_per_stock.append(line)
+        positions.add(line)
+
+
+def _net_per_stock_line(
+    month_year,
+    ticker,
+    buy_units,
+    buy_value,
+    sell_units,
+    sell_value,
+    sell_value_with_ops_cost,
+    prev_units,
+    prev_value,
+):
+    """Roll forward the average prices of a ticker from the previous month with the negocios of the month (net_per_stock_engine.group_month_ticker).
 
-    # assert _is_month_year_correct(m, y, list_notas, i=lo)
-    # assert _is_month_year_correct(m, y, list_notas, i=hi)
+    Args:
+        month_year (string): Month and year in the format "03/2019".
+        ticker (string): Ticker.
+        buy_units (int): Units bought in the month.
+        buy_value (float): Value bought in the month, valor operacao+taxas.
+        sell_units (int): Units sold in the month.
+        sell_value (float): Value sold in the month, valor operacao.
+        sell_value_with_ops_cost (float): Value sold in the month with sales operations costs.
+        prev_units (int): Units in wallet in previous month.
+        prev_value (float): Value in wallet in previous month.
 
-    seen_tickers = set()
-    for i in range(cur_ix, next_ix):  # Loop per ticker of the month
-        ticker = negocios_realizados[i][6]
-        if ticker in seen_tickers:
-            continue
-        # print(ticker," ",m)
-        seen_tickers.add(ticker)
-        line = [month_year, ticker]
-        buy_units = 0
-        buy_value = 0
-        sell_units = 0
-        sell_value = 0.0
-        sell_value_with_ops_cost = 0.0
-        for k in range(prev_ix, next_ix):  # Loop all notas
-            if ticker == negocios_realizados[k][6]:
-                if negocios_realizados[k][3] == "C":  # compra
-                    buy_units += negocios_realizados[k][8]
-                    buy_value += (
-                        negocios_realizados[k][10] + negocios_realizados[k][13]
-                    )  # Valor operacao+Taxas
-                elif negocios_realizados[k][3] == "V":  # Venda
-                    sell_units += negocios_realizados[k][8]
-                    sell_value += negocios_realizados[k][10]
-                    sell_value_with_ops_cost += sell_value + negocios_realizados[k][13]
-
-        prev_units, prev_value = get_stocks_per_ticker_previous_month_year(
-            ticker, net_per_stock
-        )
+    Returns:
+        list: Row of table net_per_stock, see HEADERS_TABLE_NET_PER_STOCK.
+    """
+    bought_units = buy_units + prev_units
+    avg_buy_price = (
+        round((buy_value + prev_value) / bought_units, 2)
+        if bought_units > 0.01
+        else 0.0
+    )  # includes operation costs
+    avg_sell_price = round(sell_value / sell_units, 2) if sell_units > 0.01 else 0.0
+    avg_unit_profit_loss = (
+        round(avg_sell_price - avg_buy_price, 2) if sell_units > 0.01 else 0.0
+    )
+    avg_sell_price_with_ops_cost = (
+        round(sell_value_with_ops_cost / sell_units, 2) if sell_units >= 0.01 else 0
+    )
+    avg_unit_profit_loss_with_ops_cost = (
+        round(avg_sell_price_with_ops_cost - avg_buy_price, 2)
+        if sell_units >= 0.01
+        else 0
+    )
 
-        bought_units = buy_units + prev_units
-        avg_buy_price = (
-            round((buy_value + prev_value) / bought_units, 2)
-            if bought_units > 0.01
-            else 0.0
-        )  # includes operation costs
-        avg_sell_price = round(sell_value / sell_units, 2) if sell_units > 0.01 else 0.0
-        avg_unit_profit_loss = (
-            round(avg_sell_price - avg_buy_price, 2) if sell_units > 0.01 else 0.0
-        )
-        avg_sell_price_with_ops_cost = (
-            round(sell_value_with_ops_cost / sell_units, 2) if sell_units >= 0.01 else 0
-        )
-        avg_unit_profit_loss_with_ops_cost = (
-            round(avg_sell_price_with_ops_cost - avg_buy_price, 2)
-            if sell_units >= 0.01
-            else 0
-        )
+    net_units = prev_units + buy_units - sell_units
+    net_value = (
+        round(prev_value + buy_value - sell_value_with_ops_cost, 2) if net_units >= 0.01 else 0.0
+    )
 
-        net_units = prev_units + buy_units - sell_units
-        net_value = (
-            round(prev_value + buy_value - sell_value_with_ops_cost, 2) if net_units >= 0.01 else 0.0
-        )
+    return [
+        month_year,
+        ticker,
+        bought_units,  # Number of units in wallet
+        avg_buy_price,  # Average price per stock bought considers stocks in wallet
+        sell_units,  # Number sold units
+        avg_sell_price,  # Average Sell Price without sales operations costs brl_unit
+        avg_unit_profit_loss,  # Profit Loss without sales operations costs brl_per_unit
+        avg_unit_profit_loss_with_ops_cost,  # Profit Loss with sales operations costs per unit brl_per_unit
+        round(avg_unit_profit_loss * sell_units, 2),  # Profit Loss brl
+        net_units,#Remain Quantity units
+        net_value,#Remain Operation value with sales operations costs brl
+    ]
+
+
+def _append_net_per_stock_from_stream(net_per_stock, paginas):
+    """Append to net_per_stock consuming a stream of parsed notas (parse_notas_corretagem.iter_notas_corretagem_btg) sorted by ascending date.
+    Negocios realizados are buffered for one month only, each month is appended as soon as the first nota of the next month arrives.
 
+    Args:
+        net_per_stock (list): List of table net_per_stock sorted by ascending date that will receive the values.
+        paginas (iterable): Records per page with key "negocios_realizados", rows in the same format as parse_notas_corretagem_btg.
 
-        line.extend(
-            [
-                bought_units,  # Number of units in wallet
-                avg_buy_price,  # Average price per stock bought considers stocks in wallet
-                sell_units,  # Number sold units
-                avg_sell_price,  # Average Sell Price without sales operations costs brl_unit
-                avg_unit_profit_loss,  # Profit Loss without sales operations costs brl_per_unit
-                avg_unit_profit_loss_with_ops_cost,  # Profit Loss with sales operations costs per unit brl_per_unit
-                round(avg_unit_profit_loss * sell_units, 2),  # Profit Loss brl
-                net_units,#Remain Quantity units
-                net_value,#Remain Operation value with sales operations costs brl
-            ]
+    Returns:
+        list: List of month_year appended.
+    """
+    months_appended = []
+    positions = engine.Positions(net_per_stock)
+    month_rows = []
+    month_year = None
+    ix = 1  # Rows index, same as negocios_realizados csv
+    for pagina in paginas:
+        for row in pagina["negocios_realizados"]:
+            row = [str(ix)] + row  # Typed at parse time
+            ix += 1
+            row_month_year = f"{row[14].month:02d}/{row[14].year}"
+            if row_month_year != month_year:
+                if month_rows:
+                    _append_net_per_stock_for_month(
+                        net_per_stock, month_year, month_rows, positions=positions
+                    )
+                    months_appended.append(month_year)
+                month_rows = []
+                month_year = row_month_year
+            month_rows.append(row)
+    if month_rows:
+        _append_net_per_stock_for_month(
+            net_per_stock, month_year, month_rows, positions=positions
         )
-        # print(line)
-        net_per_stock.append(line)
+        months_appended.append(month_year)
+    return months_appended
 
 
 def _create_net_per_stock_year_balance(net_per_stock):
@@ -485,6 +511,59 @@ def _create_net_per_stock_year_balance(net_per_stock):
                 # print(line)
     return net_per_stock_year_balance
 
+def calc_net_per_stock_years(negocios_realizados, net_per_stock_year_balance=None, years=None):
+    """Net per stock of every year of negocios_realizados in one pass, from a single group-by of the whole table. Positions are rolled
+    forward month by month in memory, the year balance of each year opens the next one, the same tables as one run per year chained by
+    net_per_stock_year_balance{year}.csv. Years without notas carry the balance forward.
+
+    Args:
+        negocios_realizados (list): Table negocios_realizados of any range of dates sorted by ascending date (rows read from csv).
+        net_per_stock_year_balance (list, optional): Year balance before the first year, ex: rows of net_per_stock_year_balance{year}.csv. Defaults to None, no previous stocks.
+        years (iterable, optional): Consecutive years to calculate, containing the years of negocios_realizados. Defaults to None, from the first to the last year of negocios_realizados.
+
+    Returns:
+        dict: year: {"net_per_stock": NetPerStock, "net_per_stock_year_balance": list, "monthly_profit_loss": list}
+    """
+    if years is None:
+        if not negocios_realizados:
+            return {}
+        years = range(negocios_realizados[0][14].year, negocios_realizados[-1][14].year + 1)
+    years = list(years)
+    assert not negocios_realizados or (
+        years and years[0] <= negocios_realizados[0][14].year and negocios_realizados[-1][14].year <= years[-1]
+    ), f"Negocios realizados out of the years {years}."
+    balance = [
+        _transform_str_numeric_read_net_per_stock(row.copy())
+        for row in net_per_stock_year_balance or []
+    ]
+    groups = engine.group_month_ticker(negocios_realizados)
+    results = {}
+    g = 0
+    for year in years:
+        net_per_stock = NetPerStock(balance)
+        positions = engine.Positions(balance)
+        while g < len(groups) and groups[g][0] == year:
+            _, month, ticker, *values = groups[g]
+            line = _net_per_stock_line(f"{month:02d}/{year}", ticker, *values, *positions.get(ticker))
+            net_per_stock.append(line)
+            positions.add(line)
+            g += 1
+        year_balance = (
+            _create_net_per_stock_year_balance(net_per_stock) if net_per_stock else []
+        )
+        results[year] = {
+            "net_per_stock": net_per_stock,
+            "net_per_stock_year_balance": year_balance,
+            "monthly_profit_loss": _calc_monthly_profit_loss(net_per_stock)
+            if net_per_stock
+            else [],
+        }
+        balance = [  # Same types as read from csv by the run of the next year
+            _transform_str_numeric_read_net_per_stock(row.copy()) for row in year_balance
+        ]
+    return results
+
+
 def get_summary_values_month(m,year,net_per_stock):
     initial_assets=0.0#Assets from previous month
     tot_transactions=0.0
@@ -512,11 +591,13 @@ def _calc_monthly_profit_loss(net_per_stock):
     Remaining Assets brl=Initial Assets-Total transactions brl
 
     Args:
-        net_per_stock (list): List of lists.
+        net_per_stock (list): List of lists or NetPerStock (aggregated with numpy).
 
     Returns:
         list: List of lists monthly profit loss.
     """
+    if isinstance(net_per_stock, NetPerStock):
+        return net_per_stock.monthly_profit_loss()
     monthly_profit_loss=[]
     year=net_per_stock[0][0].split('/')[1]
     added_month=1
@@ -619,15 +700,20 @@ def main():
     # except FileNotFoundError|AssertionError:
         print("No previous stock data found.")
         net_per_stock = []
+    net_per_stock = NetPerStock(net_per_stock)
+    month_index = index_months(negocios_realizados)
+    positions = engine.Positions(net_per_stock)
     # TODO:Fix range of 1,13. Verify the potential breaks given the change of the year.
     for i in range(1, 13):
         if i < 10:
             date = f"0{i}/{cur_year}"
         else:
             date = f"{i}/{cur_year}"
-        _append_net_per_stock_for_month(net_per_stock, date, negocios_realizados)
+        _append_net_per_stock_for_month(
+            net_per_stock, date, negocios_realizados, month_index, positions
+        )
     print(net_per_stock)
-    net_per_stock_df = pd.DataFrame(net_per_stock)
+    net_per_stock_df = net_per_stock.to_pandas()
     net_per_stock_df.to_csv(
         os.path.join(
             data_processed_notas_path_cur_year, f"net_per_stock{cur_year}.csv"
@@ -0,0 +1,237 @@
+"""
+Columnar table of custos das notas de corretagem. The dict custos_notas of the parser (número da nota: list of 25 attributes) is stored as one
+contiguous numpy array per attribute, rows indexed by número da nota, with named access, vectorized aggregations of the taxas and binary
+serialization (npz, no pickle).
+"""
+import numpy as np
+
+import pystock.schema_notas as schema
+
+# Attributes of custos_notas[num_nota], in the order of parse_notas_corretagem.CUSTOS_FIELDS followed by the líquido para
+CUSTOS_ATTRIBUTES = [
+    "debêntures",
+    "vendas à vista",
+    "compras à vista",
+    "opções - compras",
+    "opções - vendas",
+    "operações à termo",
+    "valor das oper. com títulos públ",
+    "valor das operações",
+    "valor líquido das operações",
+    "taxa de liquidação",
+    "taxa de registro",
+    "total cblc",
+    "taxa de termo/opções",
+    "taxa a.n.a.",
+    "emolumentos",
+    "total bovespa / soma",
+    "clearing",
+    "execução",
+    "execução casa",
+    "iss (são paulo)",
+    "i.r.r.f. s/ operações, base r$",
+    "outras bovespa",
+    "total corretagem / despesas",
+    "data de liquidação",
+    "valor líquido",
+]
+CUSTOS_INDEX = {atributo: i for i, atributo in enumerate(CUSTOS_ATTRIBUTES)}
+DATE_ATTRIBUTES = ["data de liquidação", "data pregão"]
+TAXAS_ATTRIBUTES = [
+    "taxa de liquidação",
+    "taxa de registro",
+    "emolumentos",
+    "total corretagem / despesas",
+]  # Taxas allocated to the negócios realizados
+
+
+def parse_brl(value):
+    """Number from string 1.234,56 (or number)."""
+    if isinstance(value, str):
+        return float(value.replace(".", "").replace(",", "."))
+    return float(value)
+
+
+def _to_datetime64(value):
+    """Date from string dd/mm/yyyy, datetime.date or None (NaT)."""
+    if value is None:
+        return np.datetime64("NaT", "D")
+    return np.datetime64(schema.DataBr.parse(value), "D")
+
+
+class CustosNotas:
+    """Custos das notas de corretagem, one row per nota.
+
+    Columns are numpy arrays: num_nota (str), the numeric CUSTOS_ATTRIBUTES (float64), "data de liquidação" and "data pregão"
+    (datetime64[D], NaT if unknown). Access by name: table["emolumentos"], row of a nota: table.row("1000").
+    """
+
+    def __init__(self, columns):
+        """
+        Args:
+            columns (dict): Arrays of equal length, keys "num_nota", CUSTOS_ATTRIBUTES and "data pregão".
+        """
+        self.columns = {
+            name: np.ascontiguousarray(array) for name, array in columns.items()
+        }
+        num_rows = {len(array) for array in self.columns.values()}
+        assert len(num_rows) == 1, f"Columns of different lengths {num_rows}."
+        self._index = {
+            num_nota: ix for ix, num_nota in enumerate(self.columns["num_nota"].tolist())
+        }
+        assert len(self._index) == len(
+            self.columns["num_nota"]
+        ), "Duplicated número de nota in custos."
+
+    @classmethod
+    def from_dict(cls, custos_notas, datas_pregao=None):
+        """Table from the dict custos_notas of the parser (or loaded from json).
+
+        Args:
+            custos_notas (dict): número da nota: list of CUSTOS_ATTRIBUTES.
+            datas_pregao (dict, optional): número da nota: data pregão (dd/mm/yyyy or date). Defaults to None, NaT.
+
+        Returns:
+            CustosNotas: Table.
+        """
+        datas_pregao = datas_pregao or {}
+        nums = list(custos_notas)
+        values = list(custos_notas.values())
+        for num_nota, nota in custos_notas.items():
+            assert len(nota) == len(
+                CUSTOS_ATTRIBUTES
+            ), f"Nota {num_nota} has {len(nota)} custos attributes instead of {len(CUSTOS_ATTRIBUTES)}."
+        columns = {"num_nota": np.array(nums, dtype=str)}
+        for ix, atributo in enumerate(CUSTOS_ATTRIBUTES):
+            if atributo in DATE_ATTRIBUTES:
+                columns[atributo] = np.array(
+                    [_to_datetime64(nota[ix]) for nota in values], dtype="datetime64[D]"
+                )
+            else:
+                columns[atributo] = np.array(
+                    [parse_brl(nota[ix]) for nota in values], dtype=np.float64
+                )
+        columns["data pregão"] = np.array(
+            [_to_datetime64(datas_pregao.get(num_nota)) for num_nota in nums],
+            dtype="datetime64[D]",
+        )
+        return cls(columns)
+
+    @classmethod
+    def from_negocios_realizados(cls, custos_notas, negocios_realizados):
+        """Table with the data pregão of the notas taken from the negócios realizados (with header row).
+
+        Args:
+            custos_notas (dict): número da nota: list of CUSTOS_ATTRIBUTES.
+            negocios_realizados (list): Rows of schema_notas, first row headers.
+
+        Returns:
+            CustosNotas: Table.
+        """
+        col_nota, col_data = schema.col("Nr. nota"), schema.col("Data pregao")
+        datas_pregao = {
+            row[col_nota]: row[col_data] for row in negocios_realizados[1:]
+        }
+        return cls.from_dict(custos_notas, datas_pregao)
+
+    def __len__(self):
+        return len(self.columns["num_nota"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, num_nota):
+        return num_nota in self._index
+
+    def index(self, num_nota):
+        """Row of the nota.
+
+        Args:
+            num_nota (str): Número da nota.
+
+        Returns:
+            int: Row.
+        """
+        return self._index[num_nota]
+
+    def row(self, num_nota):
+        """Custos of the nota by attribute.
+
+        Args:
+            num_nota (str): Número da nota.
+
+        Returns:
+            dict: Attribute: value.
+        """
+        ix = self._index[num_nota]
+        return {name: array[ix] for name, array in self.columns.items()}
+
+    def taxas(self):
+        """Total of TAXAS_ATTRIBUTES per nota.
+
+        Returns:
+            numpy.ndarray: Taxas per row.
+        """
+        return np.sum([self.columns[atributo] for atributo in TAXAS_ATTRIBUTES], axis=0)
+
+    def sum_by_date(self, values, date_column="data pregão", unit="D"):
+        """Sum of values grouped by a date column truncated to unit. Rows with unknown date are skipped.
+
+        Args:
+            values (numpy.ndarray): Values per row, ex: table.taxas() or table["emolumentos"].
+            date_column (str, optional): "data pregão" or "data de liquidação". Defaults to "data pregão".
+            unit (str, optional): numpy datetime unit, "D" day, "M" month, "Y" year. Defaults to "D".
+
+        Returns:
+            numpy.ndarray, numpy.ndarray: Sorted dates (datetime64[unit]), sum per date.
+        """
+        dates = self.columns[date_column].astype(f"datetime64[{unit}]")
+        known = ~np.isnat(dates)
+        keys, inverse = np.unique(dates[known], return_inverse=True)
+        return keys, np.bincount(inverse, weights=values[known], minlength=len(keys))
+
+    def taxas_por_mes(self):
+        """Total of taxas per month of the data pregão.
+
+        Returns:
+            dict: "mm/yyyy": taxas, months in order.
+        """
+        meses, totais = self.sum_by_date(self.taxas(), "data pregão", "M")
+        return {
+            f"{mes.item().month:02d}/{mes.item().year}": round(total, 2)
+            for mes, total in zip(meses, totais.tolist())
+        }
+
+    def taxas_por_liquidacao(self):
+        """Total of taxas per data de liquidação.
+
+        Returns:
+            dict: "dd/mm/yyyy": taxas, dates in order.
+        """
+        datas, totais = self.sum_by_date(self.taxas(), "data de liquidação", "D")
+        return {
+            str(schema.DataBr.parse(data.item())): round(total, 2)
+            for data, total in zip(datas, totais.tolist())
+        }
+
+    def save(self, path):
+        """Export the columns to a npz file.
+
+        Args:
+            path (string): Path to file, ex: custos_notas2020.npz
+        """
+        with open(path, "wb") as f:
+            np.savez(f, **self.columns)
+
+    @classmethod
+    def load(cls, path):
+        """Load table exported by save.
+
+        Args:
+            path (string): Path to npz file.
+
+        Returns:
+            CustosNotas: Table.
+        """
+        with np.load(path, allow_pickle=False) as npz:
+            return cls({name: npz[name] for name in npz.files})
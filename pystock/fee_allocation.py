@@ -0,0 +1,120 @@
+"""
+Allocation of the taxas of the notas de corretagem to the negócios realizados in one vectorized step over the whole table of negócios joined
+to the table of custos (custos_table.CustosNotas). The policy of allocation can be changed on the processed files, without parsing the pdfs.
+
+Policies:
+    "nota": total corretagem split equally by the negócios of the nota plus liquidação, registro and emolumentos pro-rata by the valor over the
+        valor das operações of the nota. Same taxas as the parser.
+    "valor": all taxas pro-rata by the valor of the negócio.
+    "quantidade": all taxas pro-rata by the quantidade of the negócio.
+    "igual": all taxas split equally by the negócios of the nota.
+"""
+import numpy as np
+
+import pystock.schema_notas as schema
+
+TAXAS_LRE = ["taxa de liquidação", "taxa de registro", "emolumentos"]
+TAXA_CORRETAGEM = "total corretagem / despesas"
+DEFAULT_POLICY = "nota"
+
+
+class UnknownPolicyError(ValueError):
+    def __init__(self, policy):
+        super().__init__(
+            f"Unknown policy {policy!r} of allocation of taxas, policies: {sorted(POLICIES)}."
+        )
+
+
+def _divide(a, b):
+    """a/b, 0 where b is 0."""
+    return np.divide(a, b, out=np.zeros(np.broadcast(a, b).shape), where=b != 0)
+
+
+def _taxas_nota(custos, nota, valor, quantidade, num_negocios):
+    lre = np.sum([custos[atributo] for atributo in TAXAS_LRE], axis=0)
+    return _divide(custos[TAXA_CORRETAGEM], num_negocios)[nota] + _divide(
+        lre, custos["valor das operações"]
+    )[nota] * valor
+
+
+def _pro_rata(weights, nota, total, num_notas):
+    return _divide(total, np.bincount(nota, weights=weights, minlength=num_notas))[
+        nota
+    ] * weights
+
+
+def _taxas_valor(custos, nota, valor, quantidade, num_negocios):
+    return _pro_rata(valor, nota, custos.taxas(), len(custos))
+
+
+def _taxas_quantidade(custos, nota, valor, quantidade, num_negocios):
+    return _pro_rata(quantidade.astype(np.float64), nota, custos.taxas(), len(custos))
+
+
+def _taxas_igual(custos, nota, valor, quantidade, num_negocios):
+    return _divide(custos.taxas(), num_negocios)[nota]
+
+
+POLICIES = {
+    "nota": _taxas_nota,
+    "valor": _taxas_valor,
+    "quantidade": _taxas_quantidade,
+    "igual": _taxas_igual,
+}
+
+
+def allocate_taxas(negocios_realizados, custos, policy=DEFAULT_POLICY, offset=0):
+    """Taxas of each negócio realizado.
+
+    Args:
+        negocios_realizados (list): Rows of schema_notas, without header.
+        custos (custos_table.CustosNotas): Custos of the notas of the rows.
+        policy (str, optional): Key of POLICIES. Defaults to DEFAULT_POLICY.
+        offset (int, optional): Columns before the schema, 1 for rows read from csv (index column). Defaults to 0.
+
+    Returns:
+        numpy.ndarray: Taxas per row rounded to cents.
+    """
+    if policy not in POLICIES:
+        raise UnknownPolicyError(policy)
+    col_nota = schema.col("Nr. nota", offset)
+    col_valor = schema.col("Valor Operação / Ajuste", offset)
+    col_quantidade = schema.col("Quantidade", offset)
+    num_rows = len(negocios_realizados)
+    notas, inverse = np.unique(
+        np.array([row[col_nota] for row in negocios_realizados], dtype=str),
+        return_inverse=True,
+    )
+    missing = [num_nota for num_nota in notas.tolist() if num_nota not in custos]
+    assert not missing, f"Notas {missing} of negócios realizados not found in custos."
+    nota = np.array([custos.index(num_nota) for num_nota in notas.tolist()], dtype=np.intp)[
+        inverse.reshape(-1)
+    ]
+    valor = np.fromiter(
+        (row[col_valor] for row in negocios_realizados), np.float64, num_rows
+    )
+    quantidade = np.fromiter(
+        (row[col_quantidade] for row in negocios_realizados), np.int64, num_rows
+    )
+    num_negocios = np.bincount(nota, minlength=len(custos))
+    taxas = POLICIES[policy](custos, nota, valor, quantidade, num_negocios)
+    return np.round(taxas, 2)
+
+
+def apply_taxas(negocios_realizados, custos, policy=DEFAULT_POLICY, offset=0):
+    """Replace, in place, the column taxas of the negócios realizados by the allocation of the policy.
+
+    Args:
+        negocios_realizados (list): Rows of schema_notas, without header.
+        custos (custos_table.CustosNotas): Custos of the notas of the rows.
+        policy (str, optional): Key of POLICIES. Defaults to DEFAULT_POLICY.
+        offset (int, optional): Columns before the schema, 1 for rows read from csv (index column). Defaults to 0.
+
+    Returns:
+        list: The rows.
+    """
+    col_taxas = schema.col("taxas", offset)
+    taxas = allocate_taxas(negocios_realizados, custos, policy, offset)
+    for row, taxa in zip(negocios_realizados, taxas.tolist()):
+        row[col_taxas] = taxa
+    return negocios_realizados
@@ -6,6 +6,7 @@ import pandas as pd
 import json
 import os
 import csv
+import hashlib
 
 
 def exportPdFrameToLatex(path, file):
@@ -89,6 +90,66 @@ def exportToJson(data, path):
         json.dump(data, codecs.getwriter("utf-8")(f), ensure_ascii=False)
 
 
+def append_to_json_dict(data, path):
+    """Append items of dict to a json file containing a dict (same format as exportToJson), without rewriting the existing content.
+
+    Args:
+        data (dict): Items to be appended.
+        path (string): Path to json file, created if it does not exist.
+    """
+    if not os.path.exists(path):
+        exportToJson(data, path)
+        return
+    if not data:
+        return
+    items = json.dumps(data, ensure_ascii=False)[1:-1].encode("utf-8")
+    with open(path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        while end > 0:  # Find closing brace
+            f.seek(end - 1)
+            char = f.read(1)
+            if char == b"}":
+                break
+            end -= 1
+        assert end > 0, f"Could not find the end of the json dict in {path}."
+        f.seek(end - 2)
+        is_empty = f.read(1) == b"{"
+        f.seek(end - 1)
+        f.truncate()
+        f.write((b"" if is_empty else b", ") + items + b"}")
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hash sha256 of a file, read in chunks.
+
+    Args:
+        path (string): path to file.
+        chunk_size (int, optional): Bytes read per chunk. Defaults to 1MB.
+
+    Returns:
+        str: Hex digest.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def memory_usage():
+    """Resident memory (RSS) of the process in bytes, read from /proc (Linux).
+
+    Returns:
+        int: Bytes, None if not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
 """
 CSV
 """
@@ -99,6 +160,17 @@ def export_to_csv_from_lists(mylists, outputPath):
     df.to_csv(outputPath, index=False, header=False)
 
 
+def append_to_csv_from_lists(mylists, outputPath):
+    """Append rows to csv file, without reading or rewriting the existing rows.
+
+    Args:
+        mylists (list): Nested list with rows.
+        outputPath (string): Path to csv file, created if it does not exist.
+    """
+    with open(outputPath, "a", newline="", encoding="utf-8") as csvfile:
+        csv.writer(csvfile, lineterminator=os.linesep).writerows(mylists)
+
+
 def read_csv(path, skip_headers=False, delimiter=",",func_transf_row=None):
     """Read csv file, returning a nested list, each row having a column row output will be strings or numeric.
 
@@ -0,0 +1,349 @@
+"""
+Incremental ingestion of a directory tree of notas de corretagem PDFs. A persisted manifest (path, size, mtime, sha256) marks the files already ingested,
+only new files are parsed and their rows are appended to negocios_realizados_{year}.csv and custos_notas{year}.json without rewriting them.
+The manifest records the notas of each file, the rows of a changed file replace the rows of its previous ingestion.
+Notas already ingested from another file (re-sent notas, overlapping pdfs) are skipped by the index of notas (nota_index).
+Manifest and index are kept in the processed directory, the raw directory only holds the pdfs. The state of the monthly calc of each year
+(net_per_stock_state) is updated with the notas of each ingested file. The table custos_notas{year}.npz (custos_table) is removed when
+the custos of the year change and built again from custos_notas{year}.json by load_custos_notas.
+"""
+import json
+import os
+
+import pystock.helpersio as hio
+import pystock.schema_notas as schema
+from pystock import net_per_stock_state as nps
+from pystock import parse_notas_corretagem as pnc
+from pystock.custos_table import CustosNotas
+from pystock.nota_index import INDEX_FILE_NAME, NotaIndex
+
+PROCESSED_PATH_TEMPLATE = nps.PROCESSED_PATH_TEMPLATE
+MANIFEST_FILE_NAME = "manifest_notas_corretagem.json"
+COL_NOTA = schema.col("Nr. nota", 1)  # Column of negocios_realizados csv (index column first)
+
+
+def _load_manifest(path):
+    """Load manifest of ingested files, returns an empty manifest if the file does not exist.
+
+    Args:
+        path (string): Path to manifest json.
+
+    Returns:
+        dict: {"files": {relative path: {"size", "mtime", "sha256", "notas": {year: [Nr. nota]}}}, "watermark": {year: {"rows", "data_pregao"}}}
+    """
+    if not os.path.exists(path):
+        return {"files": {}, "watermark": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest, path):
+    """Save manifest atomically, an interrupted run keeps the previous manifest.
+
+    Args:
+        manifest (dict): Manifest.
+        path (string): Path to manifest json.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def processed_root(processed_path_template):
+    """Directory of the processed files of all years, where the manifest and the index of notas are kept.
+
+    Args:
+        processed_path_template (string): Output directory with {year} placeholder.
+
+    Returns:
+        str: Absolute path of the template up to the {year} placeholder.
+    """
+    return os.path.abspath(processed_path_template.split("{year}")[0])
+
+
+def _remove_custos_table(processed_path, year):
+    """Remove custos_notas{year}.npz, stale once the custos of the year change.
+
+    Args:
+        processed_path (string): Directory of the processed files of the year.
+        year (str): Year.
+    """
+    path_custos_table = os.path.join(processed_path, f"custos_notas{year}.npz")
+    if os.path.exists(path_custos_table):
+        os.remove(path_custos_table)
+
+
+def load_custos_notas(processed_path, year):
+    """Table of custos of the year, loaded from custos_notas{year}.npz. If the npz is missing or older than custos_notas{year}.json
+    (ingestion, stream export), it is built from the json and the data pregão of negocios_realizados_{year}.csv and saved.
+
+    Args:
+        processed_path (string): Directory of the processed files of the year.
+        year (int): Year.
+
+    Returns:
+        CustosNotas: Table.
+    """
+    path_custos_table = os.path.join(processed_path, f"custos_notas{year}.npz")
+    path_custos_notas = os.path.join(processed_path, f"custos_notas{year}.json")
+    if os.path.exists(path_custos_table) and os.path.getmtime(
+        path_custos_table
+    ) >= os.path.getmtime(path_custos_notas):
+        return CustosNotas.load(path_custos_table)
+    with open(path_custos_notas, encoding="utf-8") as f:
+        custos_notas = json.load(f)
+    negocios_realizados = hio.read_csv(
+        os.path.join(processed_path, f"negocios_realizados_{year}.csv")
+    )
+    custos = CustosNotas.from_negocios_realizados(
+        custos_notas, [row[1:] for row in negocios_realizados]
+    )
+    custos.save(path_custos_table)
+    return custos
+
+
+def _date_key(data_pregao):
+    """Comparable key yyyymmdd from dd/mm/yyyy.
+
+    Args:
+        data_pregao (string): Date dd/mm/yyyy
+
+    Returns:
+        str: yyyymmdd
+    """
+    d, m, y = data_pregao.split("/")
+    return y + m + d
+
+
+def scan_pdfs(raw_path):
+    """Find pdf files in a directory tree, sorted by relative path.
+
+    Args:
+        raw_path (string): Root directory.
+
+    Returns:
+        list: Relative paths of pdf files.
+    """
+    hio.assert_exist_path(raw_path)
+    paths = []
+    for root, _, files in os.walk(raw_path):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                paths.append(os.path.relpath(os.path.join(root, name), raw_path))
+    return sorted(paths)
+
+
+def _find_new_or_changed(raw_path, manifest):
+    """Compare files in the directory with the manifest. Unchanged size and mtime skip hashing, files whose hash is unchanged only update the stat.
+
+    Args:
+        raw_path (string): Root directory.
+        manifest (dict): Manifest.
+
+    Returns:
+        list: List of (relative path, entry of manifest) to ingest.
+    """
+    to_ingest = []
+    for rel_path in scan_pdfs(raw_path):
+        stat = os.stat(os.path.join(raw_path, rel_path))
+        previous = manifest["files"].get(rel_path)
+        if (
+            previous is not None
+            and previous["size"] == stat.st_size
+            and previous["mtime"] == stat.st_mtime
+        ):
+            continue
+        sha256 = hio.file_sha256(os.path.join(raw_path, rel_path))
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+        if previous is not None and previous["sha256"] == sha256:
+            previous.update(entry)  # Touched only
+            continue
+        if previous is not None:
+            print(f"File {rel_path} changed since last ingestion, its notas will be replaced.")
+        to_ingest.append((rel_path, entry))
+    return to_ingest
+
+
+def _append_paginas(paginas, manifest, processed_path_template):
+    """Append rows of parsed pages to the files of the year of the data pregão.
+
+    Args:
+        paginas (list): Records of parse_notas_corretagem.iter_notas_corretagem_btg.
+        manifest (dict): Manifest, watermark is updated.
+        processed_path_template (string): Output directory with {year} placeholder.
+
+    Returns:
+        dict: {year: appended rows, index column of the csv first}
+    """
+    rows_year = {}
+    custos_year = {}
+    for pagina in paginas:
+        year = pagina["data_pregao"].split("/")[2]
+        watermark = manifest["watermark"].setdefault(
+            year, {"rows": 0, "data_pregao": pagina["data_pregao"]}
+        )
+        if _date_key(pagina["data_pregao"]) < _date_key(watermark["data_pregao"]):
+            print(
+                f"Nota {pagina['num_nota']} of {pagina['data_pregao']} is older than the last ingested {watermark['data_pregao']}, rows will not be sorted by date."
+            )
+        else:
+            watermark["data_pregao"] = pagina["data_pregao"]
+        rows = rows_year.setdefault(year, [])
+        for row in pagina["negocios_realizados"]:
+            watermark["rows"] += 1
+            rows.append([watermark["rows"]] + row)
+        custos_year.setdefault(year, {})[pagina["num_nota"]] = pagina["custos_nota"]
+
+    for year, rows in rows_year.items():
+        processed_path = os.path.abspath(processed_path_template.format(year=year))
+        os.makedirs(processed_path, exist_ok=True)
+        path_negocios_realizados = os.path.join(
+            processed_path, f"negocios_realizados_{year}.csv"
+        )
+        if not os.path.exists(path_negocios_realizados):
+            hio.append_to_csv_from_lists(
+                [[0] + pnc.HEADERS_RESUMO_NOTA], path_negocios_realizados
+            )
+        hio.append_to_csv_from_lists(rows, path_negocios_realizados)
+        hio.append_to_json_dict(
+            custos_year[year], os.path.join(processed_path, f"custos_notas{year}.json")
+        )
+        _remove_custos_table(processed_path, year)
+    return rows_year
+
+
+def _remove_notas(notas_year, manifest, processed_path_template):
+    """Remove the rows and custos of notas from the processed files, rows are renumbered and the watermark is updated.
+
+    Args:
+        notas_year (dict): {year: [Nr. nota]}
+        manifest (dict): Manifest, watermark is updated.
+        processed_path_template (string): Output directory with {year} placeholder.
+    """
+    for year, notas in notas_year.items():
+        notas = set(notas)
+        processed_path = os.path.abspath(processed_path_template.format(year=year))
+        path_negocios_realizados = os.path.join(
+            processed_path, f"negocios_realizados_{year}.csv"
+        )
+        headers, *rows = hio.read_csv(path_negocios_realizados)
+        rows = [row for row in rows if row[COL_NOTA] not in notas]
+        for ix, row in enumerate(rows, 1):
+            row[0] = ix
+        tmp_path = f"{path_negocios_realizados}.tmp"
+        hio.append_to_csv_from_lists([headers] + rows, tmp_path)
+        os.replace(tmp_path, path_negocios_realizados)
+        manifest["watermark"][year]["rows"] = len(rows)
+
+        path_custos_notas = os.path.join(processed_path, f"custos_notas{year}.json")
+        with open(path_custos_notas, encoding="utf-8") as f:
+            custos_notas = json.load(f)
+        for num_nota in notas:
+            custos_notas.pop(num_nota, None)
+        hio.exportToJson(custos_notas, path_custos_notas)
+        _remove_custos_table(processed_path, year)
+
+
+def _update_net_per_stock_states(rows_year, previous_notas, processed_path_template):
+    """Update the state of net_per_stock of the years of the appended rows and of the notas of the previous ingestion of the file.
+
+    Args:
+        rows_year (dict): {year: appended rows} of _append_paginas.
+        previous_notas (dict): {year: [Nr. nota]} of the previous ingestion of the file, removed from the state if not in paginas.
+        processed_path_template (string): Output directory with {year} placeholder.
+    """
+    negocios_year = {
+        year: [schema.type_negocio(row, 1) for row in rows] for year, rows in rows_year.items()
+    }
+    for year in sorted(set(negocios_year) | set(previous_notas)):
+        nps.update_year(
+            int(year), processed_path_template, negocios_year.get(year, []), previous_notas.get(year)
+        )
+
+
+def _ingest_paginas(rel_path, entry, paginas, manifest, processed_path_template):
+    """Append the rows of the parsed pages of a file, the rows of a previous ingestion of the file are removed first.
+    The entry of the file in the manifest records its notas, the states of net_per_stock of the years are updated.
+
+    Args:
+        rel_path (string): Relative path of the pdf.
+        entry (dict): Entry of the manifest {"size", "mtime", "sha256"}.
+        paginas (list): Records of parse_notas_corretagem.iter_notas_corretagem_btg.
+        manifest (dict): Manifest.
+        processed_path_template (string): Output directory with {year} placeholder.
+
+    Returns:
+        int: Number of appended negócios realizados.
+    """
+    previous = manifest["files"].get(rel_path)
+    if previous is not None:
+        assert "notas" in previous, (
+            f"Notas of {rel_path} are not in the manifest, its rows cannot be replaced. "
+            "Remove the processed files and the manifest to ingest all files again."
+        )
+        _remove_notas(previous["notas"], manifest, processed_path_template)
+    rows_year = _append_paginas(paginas, manifest, processed_path_template)
+    entry["notas"] = {}
+    for pagina in paginas:
+        year = pagina["data_pregao"].split("/")[2]
+        entry["notas"].setdefault(year, []).append(pagina["num_nota"])
+    _update_net_per_stock_states(
+        rows_year, previous["notas"] if previous is not None else {}, processed_path_template
+    )
+    manifest["files"][rel_path] = entry
+    return sum(len(rows) for rows in rows_year.values())
+
+
+def ingest_notas_corretagem(
+    raw_path,
+    processed_path_template=PROCESSED_PATH_TEMPLATE,
+    manifest_path=None,
+    cache=None,
+    index_path=None,
+):
+    """Ingest new or changed pdfs of notas de corretagem btg found in raw_path, appending the rows to the processed files per year.
+    Each file is parsed completely before any row is appended, and the manifest and the index of notas are saved after the rows of each file. The rows of a changed file replace
+    the rows of its previous ingestion.
+
+    Args:
+        raw_path (string): Root directory with pdfs, ex: data/raw/
+        processed_path_template (string, optional): Output directory with {year} placeholder. Defaults to PROCESSED_PATH_TEMPLATE.
+        manifest_path (string, optional): Path to manifest json. Defaults to MANIFEST_FILE_NAME in processed_root.
+        cache (ParseCache, optional): Cache of parsed pages. Defaults to None.
+        index_path (string, optional): Path to index of notas json. Defaults to nota_index.INDEX_FILE_NAME in processed_root.
+
+    Returns:
+        list: List of (relative path, number of appended negócios realizados) ingested.
+    """
+    root = processed_root(processed_path_template)
+    os.makedirs(root, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = os.path.join(root, MANIFEST_FILE_NAME)
+    if index_path is None:
+        index_path = os.path.join(root, INDEX_FILE_NAME)
+    manifest = _load_manifest(manifest_path)
+    index = NotaIndex(index_path)
+    ingested = []
+    for rel_path, entry in _find_new_or_changed(raw_path, manifest):
+        path = os.path.join(raw_path, rel_path)
+        if rel_path in manifest["files"]:  # Changed, its notas are indexed again
+            index.remove_file(os.path.abspath(path))
+        paginas = list(pnc.iter_notas_corretagem_btg(path, cache, index=index))
+        num_rows = _ingest_paginas(
+            rel_path, entry, paginas, manifest, processed_path_template
+        )
+        _save_manifest(manifest, manifest_path)
+        index.save()  # After the rows are persisted, an interrupted ingestion parses the file again
+        ingested.append((rel_path, num_rows))
+        print(f"Ingested {rel_path}: {num_rows} negocios realizados.")
+    _save_manifest(manifest, manifest_path)
+    return ingested
+
+
+def main():
+    ingest_notas_corretagem(os.path.abspath(os.path.join("data/raw/")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Group-by engine of the monthly net result per stock. The rows of negocios_realizados are grouped in one pass by (month, ticker) and split by
+C/V with numpy, giving the units and values bought and sold per ticker of each month. calc_monthly_net_result rolls the average prices
+forward from the groups, in order of month and first negócio of the ticker in the month.
+Sums are accumulated in row order (np.bincount and np.cumsum are sequential), the values are the same floats as a loop over the rows.
+"""
+import numpy as np
+
+import pystock.schema_notas as schema
+
+# Columns of negocios_realizados read from csv (index column first)
+COL_CV = schema.col("C/V", 1)
+COL_TICKER = schema.col("Especificação do título", 1)
+COL_QUANTIDADE = schema.col("Quantidade", 1)
+COL_VALOR = schema.col("Valor Operação / Ajuste", 1)
+COL_TAXAS = schema.col("taxas", 1)
+COL_DATA = schema.col("Data pregao", 1)
+
+
+def _cumsum_per_group(group, values, num_groups):
+    """Running sum of values within each group.
+
+    Args:
+        group (numpy.ndarray): Group of each row.
+        values (numpy.ndarray): Value of each row.
+        num_groups (int): Number of groups.
+
+    Returns:
+        numpy.ndarray: Running sum of the group up to each row (inclusive), in the order of the rows.
+    """
+    order = np.argsort(group, kind="stable")
+    bounds = np.searchsorted(group[order], np.arange(num_groups + 1)).tolist()
+    sorted_values = values[order]
+    running = np.empty(len(values))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if lo < hi:
+            running[order[lo:hi]] = np.cumsum(sorted_values[lo:hi])
+    return running
+
+
+def group_month_ticker(negocios_realizados, lo=0, hi=None):
+    """Units and values bought and sold per (month, ticker) of rows [lo,hi) of negocios_realizados.
+
+    Args:
+        negocios_realizados (list): Table negocios_realizados sorted by ascending date (rows read from csv, index column first).
+        lo (int, optional): First row. Defaults to 0.
+        hi (int, optional): Last row (exclusive). Defaults to None, up to the last row.
+
+    Returns:
+        list: Tuples (year, month, ticker, buy_units, buy_value, sell_units, sell_value, sell_value_with_ops_cost) in order of month and
+            first row of the ticker in the month. buy_value includes taxas, sell_value does not, sell_value_with_ops_cost is the sum over
+            the sells of the running sell_value plus the taxas of the sell.
+    """
+    hi = len(negocios_realizados) if hi is None else hi
+    num_rows = hi - lo
+    if num_rows <= 0:
+        return []
+    rows = range(lo, hi)  # Rows are read in place, the table is not sliced
+
+    def column(col, dtype):
+        return np.fromiter((negocios_realizados[i][col] for i in rows), dtype, num_rows)
+
+    ticker_ids = {}
+    ticker = np.fromiter(
+        (
+            ticker_ids.setdefault(negocios_realizados[i][COL_TICKER], len(ticker_ids))
+            for i in rows
+        ),
+        np.int64,
+        num_rows,
+    )
+    month = np.fromiter(
+        (
+            negocios_realizados[i][COL_DATA].year * 12
+            + negocios_realizados[i][COL_DATA].month
+            - 1
+            for i in rows
+        ),
+        np.int64,
+        num_rows,
+    )
+    buy = np.fromiter((negocios_realizados[i][COL_CV] == "C" for i in rows), bool, num_rows)
+    sell = np.fromiter((negocios_realizados[i][COL_CV] == "V" for i in rows), bool, num_rows)
+    quantidade = column(COL_QUANTIDADE, np.int64)
+    valor = column(COL_VALOR, np.float64)
+    taxas = column(COL_TAXAS, np.float64)
+
+    _, first_row, group = np.unique(
+        (month - month.min()) * len(ticker_ids) + ticker,
+        return_index=True,
+        return_inverse=True,
+    )
+    group = group.reshape(-1)
+    num_groups = len(first_row)
+
+    def sum_group(mask, weights):
+        return np.bincount(group[mask], weights=weights[mask], minlength=num_groups)
+
+    buy_units = sum_group(buy, quantidade).astype(np.int64)
+    buy_value = sum_group(buy, valor + taxas)  # Valor operacao+Taxas
+    sell_units = sum_group(sell, quantidade).astype(np.int64)
+    sell_value = sum_group(sell, valor)
+    running_sell_value = _cumsum_per_group(group[sell], valor[sell], num_groups)
+    sell_value_with_ops_cost = np.bincount(
+        group[sell], weights=running_sell_value + taxas[sell], minlength=num_groups
+    )
+
+    order = np.lexsort((first_row, month[first_row]))
+    tickers = list(ticker_ids)
+    group_month = month[first_row[order]]
+    return list(
+        zip(
+            (group_month // 12).tolist(),
+            (group_month % 12 + 1).tolist(),
+            [tickers[t] for t in ticker[first_row[order]].tolist()],
+            buy_units[order].tolist(),
+            buy_value[order].tolist(),
+            sell_units[order].tolist(),
+            sell_value[order].tolist(),
+            sell_value_with_ops_cost[order].tolist(),
+        )
+    )
+
+
+class Positions:
+    """Latest position, (Remain Quantity units, Remain Operation value), per ticker of a table net_per_stock. Lookups are O(1) instead of a
+    backwards scan of net_per_stock, rows must be added as they are
+    appended to the table.
+
+    Args:
+        net_per_stock (list, optional): Rows of table net_per_stock sorted by ascending date, ex: net_per_stock_year_balance{year}.csv.
+            Defaults to None, no positions.
+    """
+
+    def __init__(self, net_per_stock=None):
+        self.latest = {}  # Ticker: (remain units, remain value)
+        for row in net_per_stock or []:
+            self.add(row)
+
+    def __len__(self):
+        return len(self.latest)
+
+    def __contains__(self, ticker):
+        return ticker in self.latest
+
+    def add(self, row):
+        """Update the position of the ticker of a row appended to net_per_stock.
+
+        Args:
+            row (list): Row of table net_per_stock.
+        """
+        self.latest[row[1]] = (row[-2], row[-1])
+
+    def get(self, ticker):
+        """Latest position of the ticker.
+
+        Args:
+            ticker (string): Ticker.
+
+        Returns:
+            int,int: Remain units, remain value. Zeros if the ticker has no rows.
+        """
+        return self.latest.get(ticker, (0, 0))
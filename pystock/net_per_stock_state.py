@@ -0,0 +1,272 @@
+"""
+Persisted state of the monthly calc of net_per_stock of a year: positions per ticker as of the last processed month, the high-water mark
+(yyyymm of the last processed month), the negócios realizados of each processed month, net_per_stock and monthly profit loss.
+New negócios are fed with update: months after the high-water mark roll forward from the persisted positions and only their rows are
+appended. Negócios of a processed month (late nota or re-issued nota, whose rows replace the indexed ones in any month) invalidate the rows
+from that month on, the affected months are replayed forward from the positions of the month before. The state of each year is kept in its
+processed directory and updated by ingest_notas after each ingested file.
+
+Usage:
+    python -m pystock.net_per_stock_state 2020
+"""
+import argparse
+import json
+import os
+
+import pystock.schema_notas as schema
+from pystock import calc_monthly_net_result as cmnr
+from pystock import net_per_stock_engine as engine
+
+PROCESSED_PATH_TEMPLATE = "data/processed/{year}/btg/notas_corretagem/"  # Processed files of ingest_notas
+STATE_FILE_NAME = "state_net_per_stock_{year}.json"
+COL_NOTA = schema.col("Nr. nota", 1)
+
+
+class NetPerStockState:
+    """State of the net_per_stock of a year, loaded from and saved to a json file.
+
+    Args:
+        year (int): Year of the negócios.
+        net_per_stock_year_balance (list, optional): Year balance of the previous year, rows of net_per_stock_year_balance{year}.csv. Defaults
+            to None, no previous stocks. Ignored if the state is loaded.
+        path (string, optional): Path to json, loaded if it exists. Defaults to None, in memory only.
+    """
+
+    def __init__(self, year, net_per_stock_year_balance=None, path=None):
+        self.year = year
+        self.path = path
+        self.high_water_mark = 0  # yyyymm of the last processed month, 0 if none
+        self.opening = [  # Same types as read from csv
+            cmnr._transform_str_numeric_read_net_per_stock(row.copy())
+            for row in net_per_stock_year_balance or []
+        ]
+        self.months = {}  # yyyymm: {Nr. nota: rows}
+        self.net_per_stock = [row.copy() for row in self.opening]
+        self.monthly_profit_loss = (
+            cmnr._calc_monthly_profit_loss(self.net_per_stock) if self.net_per_stock else []
+        )
+        self.positions = engine.Positions(self.opening)
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    def _load(self, path):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        assert state["year"] == self.year, f"State of {path} is of year {state['year']}, not {self.year}."
+        self.high_water_mark = state["high_water_mark"]
+        self.opening = state["opening"]
+        self.months = {
+            int(key): {
+                num_nota: [schema.type_negocio(row, 1) for row in rows]
+                for num_nota, rows in notas.items()
+            }
+            for key, notas in state["months"].items()
+        }
+        self.net_per_stock = state["net_per_stock"]
+        self.monthly_profit_loss = state["monthly_profit_loss"]
+        self.positions = engine.Positions()
+        self.positions.latest = {
+            ticker: tuple(position) for ticker, position in state["positions"].items()
+        }
+
+    def negocios_realizados(self, first_month=0):
+        """Negócios of the processed months from first_month on, in order.
+
+        Args:
+            first_month (int, optional): yyyymm. Defaults to 0, all months.
+
+        Returns:
+            list: Rows of negocios_realizados.
+        """
+        return [
+            row
+            for key in sorted(self.months)
+            if key >= first_month
+            for rows in self.months[key].values()
+            for row in rows
+        ]
+
+    def _add_negocios(self, negocios_realizados, notas_removed=None):
+        """Add the negócios per nota, the rows of a nota replace the rows indexed for it in any month (re-issued nota with another data
+        pregão). The notas of a month are kept in the order of the csv: data pregão, then index of the first row.
+
+        Returns:
+            int: yyyymm of the first month changed, 0 if nothing changed.
+        """
+        notas = {}  # Nr. nota: rows
+        for row in negocios_realizados:
+            date = row[engine.COL_DATA]
+            assert date.year == self.year, f"Negócio of {date} is not of year {self.year}."
+            notas.setdefault(row[COL_NOTA], []).append(row)
+        indexed_month = {  # Nr. nota: yyyymm
+            num_nota: key for key, month in self.months.items() for num_nota in month
+        }
+        previous = {}  # yyyymm: rows of the month before the changes, without index
+
+        def touch(key):
+            if key not in previous:
+                previous[key] = self._month_rows(key)
+
+        removed = False
+        for num_nota in notas_removed or []:  # Rows removed from the csv (ingest_notas._remove_notas)
+            key = indexed_month.pop(num_nota, None)
+            if key is not None:
+                touch(key)
+                del self.months[key][num_nota]
+                removed = True
+        if removed:  # Renumbered as the rows of the csv, rows appended next follow them
+            remaining = [row for month in self.months.values() for rows in month.values() for row in rows]
+            for ix, row in enumerate(sorted(remaining, key=lambda row: int(row[0])), 1):
+                row[0] = ix
+        for num_nota, rows in notas.items():
+            date = rows[0][engine.COL_DATA]
+            key = date.year * 100 + date.month
+            indexed_key = indexed_month.get(num_nota)
+            if indexed_key is not None:
+                indexed = self.months[indexed_key][num_nota]
+                if indexed_key == key and [r[1:] for r in indexed] == [r[1:] for r in rows]:
+                    continue  # Nota sent again
+                touch(indexed_key)
+                del self.months[indexed_key][num_nota]
+            touch(key)
+            self.months.setdefault(key, {})[num_nota] = rows
+        for key in previous:  # Months without notas are dropped
+            if self.months.get(key):
+                self.months[key] = dict(
+                    sorted(
+                        self.months[key].items(),
+                        key=lambda item: (item[1][0][engine.COL_DATA], int(item[1][0][0])),
+                    )
+                )
+            else:
+                self.months.pop(key, None)
+        return min(
+            (key for key, rows in previous.items() if rows != self._month_rows(key)), default=0
+        )
+
+    def _month_rows(self, key):
+        """Rows of the negócios of a month in order, without index."""
+        return [row[1:] for rows in self.months.get(key, {}).values() for row in rows]
+
+    def update(self, negocios_realizados, notas_removed=None):
+        """Add negócios and recompute the months affected, the months after the high-water mark roll forward from the positions.
+
+        Args:
+            negocios_realizados (list): Rows of negocios_realizados of the year (rows read from csv), of new or processed months.
+            notas_removed (iterable, optional): Nr. nota of processed notas whose rows are removed from the csv, ex: notas of the previous
+                ingestion of a changed file. The remaining rows are renumbered as in the csv, notas also in negocios_realizados are added
+                again after them. Defaults to None.
+
+        Returns:
+            int: yyyymm of the first month recomputed, 0 if nothing changed. Rows of net_per_stock and monthly_profit_loss of the months
+                before it are unchanged.
+        """
+        first_month = self._add_negocios(negocios_realizados, notas_removed)
+        if first_month == 0:
+            return 0
+        if first_month <= self.high_water_mark:  # Correction, replay from the month
+            lo = cmnr.SortedKeys(self.net_per_stock, 0).lower_bound(first_month)
+            del self.net_per_stock[lo:]
+            self.positions = engine.Positions(self.net_per_stock)
+            self.monthly_profit_loss = [
+                line
+                for line in self.monthly_profit_loss
+                if self.year * 100 + int(line[0].split("/")[0]) < first_month
+            ]
+        lo = len(self.net_per_stock)
+        for _, month, ticker, *values in engine.group_month_ticker(
+            self.negocios_realizados(first_month)
+        ):
+            line = cmnr._net_per_stock_line(
+                f"{month:02d}/{self.year}", ticker, *values, *self.positions.get(ticker)
+            )
+            self.net_per_stock.append(line)
+            self.positions.add(line)
+        if lo == 0:
+            self.monthly_profit_loss = (
+                cmnr._calc_monthly_profit_loss(self.net_per_stock) if self.net_per_stock else []
+            )
+        else:  # Row lo-1 is skipped by _calc_monthly_profit_loss
+            self.monthly_profit_loss.extend(
+                cmnr._calc_monthly_profit_loss(self.net_per_stock[lo - 1 :])
+            )
+        self.high_water_mark = max(self.months, default=0)
+        return first_month
+
+    def save(self, path=None):
+        """Save atomically.
+
+        Args:
+            path (string, optional): Path to json. Defaults to None, the path of the state.
+        """
+        path = path or self.path
+        assert path is not None, "No path to save the state of net_per_stock."
+        state = {
+            "year": self.year,
+            "high_water_mark": self.high_water_mark,
+            "positions": self.positions.latest,
+            "opening": self.opening,
+            "months": {
+                str(key): {
+                    num_nota: [[str(v) if isinstance(v, schema.DataBr) else v for v in row] for row in rows]
+                    for num_nota, rows in notas.items()
+                }
+                for key, notas in self.months.items()
+            },
+            "net_per_stock": self.net_per_stock,
+            "monthly_profit_loss": self.monthly_profit_loss,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def update_year(year, processed_path_template, negocios_realizados=None, notas_removed=None):
+    """Update the persisted state of a year in its processed directory. A missing state is created from negocios_realizados_{year}.csv and
+    the year balance of the previous year.
+
+    Args:
+        year (int): Year of the negócios.
+        processed_path_template (string): Directory of the processed files with {year} placeholder.
+        negocios_realizados (list, optional): New or re-issued negócios of the year (rows read from csv). Defaults to None, all rows of
+            negocios_realizados_{year}.csv.
+        notas_removed (iterable, optional): Nr. nota of processed notas to remove. Defaults to None.
+
+    Returns:
+        tuple: (NetPerStockState, yyyymm of the first month recomputed, 0 if nothing changed)
+    """
+    path = os.path.abspath(processed_path_template.format(year=year))
+    state_path = os.path.join(path, STATE_FILE_NAME.format(year=year))
+    balance = None
+    if negocios_realizados is None or not os.path.exists(state_path):
+        negocios_realizados = schema.read_negocios_realizados_csv(
+            os.path.join(path, f"negocios_realizados_{year}.csv")
+        )
+    if not os.path.exists(state_path):
+        balance = cmnr.read_net_per_stock_year_balance(
+            os.path.join(
+                os.path.abspath(processed_path_template.format(year=year - 1)),
+                f"net_per_stock_year_balance{year - 1}.csv",
+            )
+        )
+    state = NetPerStockState(year, balance, state_path)
+    first_month = state.update(negocios_realizados, notas_removed)
+    state.save()
+    return state, first_month
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the state of net_per_stock of a year with negocios_realizados_{year}.csv.")
+    parser.add_argument("year", type=int)
+    parser.add_argument("--processed-path-template", default=PROCESSED_PATH_TEMPLATE)
+    args = parser.parse_args()
+    state, first_month = update_year(args.year, args.processed_path_template)
+    if first_month:
+        print(f"Recomputed from {first_month % 100:02d}/{args.year}, high-water mark {state.high_water_mark}.")
+    else:
+        print(f"No changes, high-water mark {state.high_water_mark}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Typed table net_per_stock: one numpy array per column of NET_PER_STOCK_SCHEMA instead of a list of lists. Month Year and Ticker are stored as
+codes of their distinct values. Rows are read through NetPerStockRow views (row[k], row[-1], row.copy()), so the functions of
+calc_monthly_net_result written for lists accept the table. Columns are exported to pandas without copy and aggregated with numpy.
+Values of MIXED_COLUMNS keep the python type of the appended row and are exported as pandas infers the column of the list of lists, the csv
+written from the table is the one written from the list of lists.
+"""
+import numpy as np
+import pandas as pd
+
+NET_PER_STOCK_SCHEMA = [
+    ("Month Year", str),
+    ("Ticker", str),
+    ("Available Quantity units", int),
+    ("Average Buy Price brl_unit", float),
+    ("Sold Quantity units", int),
+    ("Average Sell Price without sales operations costs brl_unit", float),
+    ("Profit Loss without sales operations costs brl_per_unit", float),
+    ("Profit Loss with sales operations costs per unit brl_per_unit", float),
+    ("Profit Loss brl", float),
+    ("Remain Quantity units", int),
+    ("Remain Operation value with sales operations costs brl", float),
+]
+NUM_COLUMNS = len(NET_PER_STOCK_SCHEMA)
+CODED_COLUMNS = [0, 1]  # Month Year, Ticker
+MIXED_COLUMNS = [7]  # Float, int 0 if no units sold in the month (calc_monthly_net_result._net_per_stock_line)
+DTYPES = {str: np.int32, int: np.int64, float: np.float64}  # str columns hold codes
+INITIAL_CAPACITY = 256
+
+
+class NetPerStockRow:
+    """View of a row of NetPerStock, indexed as the list row of net_per_stock.
+
+    Args:
+        table (NetPerStock): Table.
+        index (int): Row.
+    """
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __len__(self):
+        return NUM_COLUMNS
+
+    def __getitem__(self, col):
+        if isinstance(col, slice):
+            return self.copy()[col]
+        return self.table.value(self.index, col)
+
+    def __iter__(self):
+        return (self.table.value(self.index, col) for col in range(NUM_COLUMNS))
+
+    def __eq__(self, other):
+        return self.copy() == list(other)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def copy(self):
+        """Row as list."""
+        return list(self)
+
+
+class NetPerStock:
+    """Table net_per_stock backed by typed arrays, rows appended as lists in the order of HEADERS_TABLE_NET_PER_STOCK.
+
+    Args:
+        rows (iterable, optional): Rows of net_per_stock, typed (ex: read with _transform_str_numeric_read_net_per_stock). Defaults to None, empty.
+        capacity (int, optional): Rows allocated, doubled when full. Defaults to INITIAL_CAPACITY.
+    """
+
+    def __init__(self, rows=None, capacity=INITIAL_CAPACITY):
+        self.num_rows = 0
+        self.columns = [np.empty(capacity, DTYPES[t]) for _, t in NET_PER_STOCK_SCHEMA]
+        self.categories = {col: [] for col in CODED_COLUMNS}  # Distinct values of the str columns, index is the code
+        self._codes = {col: {} for col in CODED_COLUMNS}
+        self._is_int = {col: np.zeros(capacity, bool) for col in MIXED_COLUMNS}  # Rows whose value is an int
+        for row in rows or []:
+            self.append(row)
+
+    def __len__(self):
+        return self.num_rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [NetPerStockRow(self, i) for i in range(*index.indices(self.num_rows))]
+        if index < 0:
+            index += self.num_rows
+        if not 0 <= index < self.num_rows:
+            raise IndexError(f"Row {index} out of range of net_per_stock with {self.num_rows} rows.")
+        return NetPerStockRow(self, index)
+
+    def __iter__(self):
+        return (NetPerStockRow(self, i) for i in range(self.num_rows))
+
+    def __eq__(self, other):
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    def value(self, index, col):
+        """Value of a cell as python type.
+
+        Args:
+            index (int): Row.
+            col (int): Column, negative from the last column.
+
+        Returns:
+            str, int or float: Value.
+        """
+        if col < 0:
+            col += NUM_COLUMNS
+        if col in self.categories:
+            return self.categories[col][self.columns[col][index]]
+        if col in self._is_int and self._is_int[col][index]:
+            return int(self.columns[col][index])
+        return self.columns[col][index].item()
+
+    def append(self, row):
+        """Append a row.
+
+        Args:
+            row (list): Row of net_per_stock.
+        """
+        assert len(row) == NUM_COLUMNS, f"Row {row} must have {NUM_COLUMNS} columns."
+        if self.num_rows == len(self.columns[0]):
+            self.columns = [
+                np.concatenate((column, np.empty(max(len(column), 1), column.dtype)))
+                for column in self.columns
+            ]
+            self._is_int = {
+                col: np.concatenate((is_int, np.zeros(max(len(is_int), 1), bool)))
+                for col, is_int in self._is_int.items()
+            }
+        for col, value in enumerate(row):
+            if col in self._is_int:
+                self._is_int[col][self.num_rows] = isinstance(value, int)
+            if col in self._codes:
+                codes = self._codes[col]
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(self.categories[col])
+                    self.categories[col].append(value)
+                value = code
+            self.columns[col][self.num_rows] = value
+        self.num_rows += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def column(self, col):
+        """Values of a column without copy, codes for Month Year and Ticker (see categories).
+
+        Args:
+            col (int): Column.
+
+        Returns:
+            numpy.ndarray: View of the rows of the table.
+        """
+        return self.columns[col][: self.num_rows]
+
+    @property
+    def nbytes(self):
+        return sum(self.column(col).nbytes for col in range(NUM_COLUMNS)) + sum(
+            is_int[: self.num_rows].nbytes for is_int in self._is_int.values()
+        )
+
+    def tolist(self):
+        return [row.copy() for row in self]
+
+    def to_pandas(self):
+        """DataFrame with the headers of NET_PER_STOCK_SCHEMA, numeric columns share memory with the table, Month Year and Ticker are
+        categoricals on the codes. A mixed column whose values are all int is exported as int, as pandas infers the column of the list of
+        lists.
+
+        Returns:
+            pandas.DataFrame: Table.
+        """
+        data = {}
+        for col, (name, _) in enumerate(NET_PER_STOCK_SCHEMA):
+            if col in self.categories:
+                data[name] = pd.Categorical.from_codes(
+                    self.column(col), self.categories[col]
+                )
+            elif col in self._is_int and self.num_rows and self._is_int[col][: self.num_rows].all():
+                data[name] = self.column(col).astype(np.int64)
+            else:
+                data[name] = self.column(col)
+        return pd.DataFrame(data, copy=False)
+
+    def monthly_profit_loss(self):
+        """Monthly profit loss, same lines as calc_monthly_net_result._calc_monthly_profit_loss of the rows as lists: rows after the first one
+        are grouped by runs of the same month, sums in row order with np.bincount.
+
+        Returns:
+            list: List of lists monthly profit loss.
+        """
+        n = self.num_rows
+        if n <= 1:
+            return []
+        year = self.value(0, 0).split("/")[1]
+        month = np.array(
+            [int(month_year.split("/")[0]) for month_year in self.categories[0]], np.int64
+        )[self.column(0)[1:]]
+        run = np.concatenate(([0], np.cumsum(month[1:] != month[:-1])))
+
+        def col(k):
+            return self.column(k)[1:]
+
+        initial_assets, tot_transactions, tot_profit_wo_sales, tot_profit_w_sales, remain_assets = (
+            np.bincount(run, weights=weights).tolist()
+            for weights in (
+                col(2) * col(3),  # Assets from previous month
+                col(4) * col(5),  # Total transactions brl
+                col(4) * col(6),  # Total profitloss without sales costs brl
+                col(4) * col(7),  # Total profitloss with sales costs brl
+                col(10),
+            )
+        )
+        first_row = np.flatnonzero(np.diff(run, prepend=-1))
+        monthly_profit_loss = []
+        for r, m in enumerate(month[first_row].tolist()):
+            profit_to_assets = (
+                round(tot_profit_w_sales[r] * 100 / initial_assets[r], 2)
+                if initial_assets[r] > 0.01
+                else 0.0
+            )
+            monthly_profit_loss.append(
+                [
+                    f"{m}/{year}",
+                    round(initial_assets[r], 2),
+                    round(tot_transactions[r], 2),
+                    round(tot_profit_wo_sales[r], 2),
+                    round(tot_profit_w_sales[r], 2),
+                    profit_to_assets,
+                    round(remain_assets[r], 2),
+                ]
+            )
+        return monthly_profit_loss
@@ -0,0 +1,123 @@
+"""
+Persistent index of the pages of notas de corretagem already parsed: hash of the page content stream -> (número da nota, source file, page).
+Brokers re-send notas and consolidated pdfs overlap, the parser checks the hash of each page before the layout analysis, pages whose content is
+already indexed are skipped wherever they are found. A nota may span several pages of one file. A nota whose número is indexed from another
+file with a different content (re-issued nota) is reported and skipped, the indexed version is kept.
+
+Usage:
+    python -m pystock.nota_index data/processed/index_notas_corretagem.json
+"""
+import argparse
+import json
+import os
+
+INDEX_FILE_NAME = "index_notas_corretagem.json"
+
+
+class NotaIndex:
+    """Index of parsed pages of notas, loaded from and saved to a json file.
+
+    Args:
+        path (string, optional): Path to json, loaded if it exists. Defaults to None, in memory only.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pages = {}  # Hash: {"num_nota", "file", "page"}
+        self.notas = {}  # Número da nota: file
+        self.conflicts = []  # Re-issued notas found since loaded
+        self.duplicates = 0  # Pages skipped since loaded
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.pages = json.load(f)["pages"]
+            self.notas = {entry["num_nota"]: entry["file"] for entry in self.pages.values()}
+
+    def __len__(self):
+        return len(self.notas)
+
+    def __contains__(self, num_nota):
+        return num_nota in self.notas
+
+    def is_duplicate(self, page_hash):
+        """True if the content of the page is indexed, from any file or page.
+
+        Args:
+            page_hash (str): Hash of the page content from parse_cache.page_key without parser version.
+
+        Returns:
+            bool: Duplicate.
+        """
+        return page_hash in self.pages
+
+    def register(self, num_nota, page_hash, source, count_page):
+        """Add a parsed page of a nota. A número already indexed from another file is a conflict (re-issued nota): reported, kept out of
+        the index and the page must be skipped. Pages of a nota of several pages are indexed from the same file.
+
+        Args:
+            num_nota (str): Número da nota.
+            page_hash (str): Hash of the page content from parse_cache.page_key without parser version.
+            source (string): Path of the pdf.
+            count_page (int): Número da página no arquivo.
+
+        Returns:
+            bool: False if the page must be skipped (duplicate or conflict).
+        """
+        if self.is_duplicate(page_hash):
+            self.duplicates += 1
+            return False
+        indexed_file = self.notas.get(num_nota)
+        if indexed_file is not None and indexed_file != source:
+            self.conflicts.append(
+                {
+                    "num_nota": num_nota,
+                    "file": source,
+                    "page": count_page,
+                    "indexed_file": indexed_file,
+                }
+            )
+            print(
+                f"Nota {num_nota} of {source} page {count_page} differs from the indexed nota of {indexed_file}, skipped."
+            )
+            return False
+        self.pages[page_hash] = {"num_nota": num_nota, "file": source, "page": count_page}
+        self.notas[num_nota] = source
+        return True
+
+    def remove_file(self, source):
+        """Remove the pages indexed from a file, ex: a changed file that is parsed again.
+
+        Args:
+            source (string): Path of the pdf.
+        """
+        self.pages = {h: entry for h, entry in self.pages.items() if entry["file"] != source}
+        self.notas = {num: indexed for num, indexed in self.notas.items() if indexed != source}
+
+    def save(self, path=None):
+        """Save atomically.
+
+        Args:
+            path (string, optional): Path to json. Defaults to None, the path of the index.
+        """
+        path = path or self.path
+        assert path is not None, "No path to save the index of notas."
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the index of parsed notas de corretagem.")
+    parser.add_argument("path")
+    args = parser.parse_args()
+    index = NotaIndex(args.path)
+    files = {}
+    for source in index.notas.values():
+        files[source] = files.get(source, 0) + 1
+    print(f"{len(index)} notas in {args.path}.")
+    for source, num_notas in sorted(files.items()):
+        print(f"{num_notas:6d} {source}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,527 @@
+"""
+Layout stage of a page of nota de corretagem, returning both table views used by the parser: the default table detection (header and negócios
+realizados) and the "lines_strict" horizontal detection (blocos de custos). Edges are merged once for both views (pdfplumber.table functions,
+version pinned in environ.yml), the text of the cells is read from one index of the chars of the page, cells found by both views are read once.
+Pages of the same layout may be extracted from crop regions of a template (named bounding boxes) learned from a full page detection,
+converting only the layout objects within the regions, or read from the text layer only, grouping chars by the positions of the cells of
+the template (no table detection).
+"""
+from bisect import bisect_left
+from itertools import chain
+from operator import itemgetter
+from unicodedata import normalize as normalize_unicode
+
+from pdfminer.layout import LTChar, LTContainer, LTCurve, LTLine, LTRect
+
+from pdfplumber import utils
+from pdfplumber.page import fix_fontname_bytes
+from pdfplumber.utils.pdfinternals import resolve_and_decode
+from pdfplumber.table import (
+    Table,
+    TableSettings,
+    cells_to_tables,
+    edges_to_intersections,
+    intersections_to_cells,
+    merge_edges,
+)
+
+from pystock.parse_stats import NO_STATS
+
+TABLE_SETTINGS_CUSTOS = {"horizontal_strategy": "lines_strict"}
+TEMPLATE_PADDING = 2  # Points added around the bbox of each region of the template
+REGION_OBJECT_KINDS = {LTChar: "char", LTLine: "line", LTRect: "rect", LTCurve: "curve"}  # Objects read from the regions of the template
+TEXT_OBJECT_KINDS = {LTChar: "char"}  # Objects read by the text layer parse
+TEXT_LINE_TOLERANCE = 3  # Maximum distance of vertical middle points of chars of the same text line
+
+
+def _index_chars(chars):
+    """Sort chars by vertical middle point, so rows of the text layer are selected by bisection instead of scanning every char of the page.
+
+    Args:
+        chars (list): page.chars
+
+    Returns:
+        list,list: v_mids sorted, (v_mid,h_mid,position in page.chars,char) sorted by v_mid.
+    """
+    index = sorted(
+        (
+            ((c["top"] + c["bottom"]) / 2, (c["x0"] + c["x1"]) / 2, i, c)
+            for i, c in enumerate(chars)
+        ),
+        key=itemgetter(0, 2),
+    )
+    return [c[0] for c in index], index
+
+
+def _cell_chars(bbox, chars):
+    """Chars of the index whose middle point is within the bbox.
+
+    Args:
+        bbox (tuple): Bounding box of the cell.
+        chars (list): Entries of the char index from _index_chars, in order of page.chars.
+
+    Returns:
+        list: Chars of the cell.
+    """
+    x0, top, x1, bottom = bbox
+    return [
+        c[3]
+        for c in chars
+        if x0 <= c[1] < x1 and top <= c[0] < bottom
+    ]
+
+
+def _extract_rows(rows, v_mids, index, texts=None):
+    """Extract text of cells of rows given by their bounding boxes from the text layer, chars are assigned to cells by their middle point as
+    in pdfplumber Table.extract().
+
+    Args:
+        rows (list): List of (row bbox, list of cell bbox or None).
+        v_mids (list): Sorted vertical middle points from _index_chars.
+        index (list): Char index from _index_chars.
+        texts (dict, optional): Text per cell bbox, shared by the tables of both views of the page. Defaults to None, no sharing.
+
+    Returns:
+        list: Nested list with text of cells per row.
+    """
+    if texts is None:
+        texts = {}
+    table_arr = []
+    for (x0, top, x1, bottom), cells in rows:
+        row_chars = None
+        arr = []
+        for cell in cells:
+            if cell is None:
+                arr.append(None)
+                continue
+            text = texts.get(cell)
+            if text is None:
+                if row_chars is None:
+                    row_chars = sorted(
+                        (
+                            c
+                            for c in index[bisect_left(v_mids, top) : bisect_left(v_mids, bottom)]
+                            if x0 <= c[1] < x1
+                        ),
+                        key=itemgetter(2),
+                    )  # Keeps order of page.chars
+                cell_chars = _cell_chars(cell, row_chars)
+                text = texts[cell] = utils.extract_text(cell_chars) if cell_chars else ""
+            arr.append(text)
+        table_arr.append(arr)
+    return table_arr
+
+
+def _table_rows(table):
+    """Bounding boxes of rows and cells of a pdfplumber Table.
+
+    Args:
+        table (Table): pdfplumber Table.
+
+    Returns:
+        list: List of (row bbox, list of cell bbox or None).
+    """
+    return [(tuple(row.bbox), list(row.cells)) for row in table.rows]
+
+
+def _merge_filter_edges(edges, settings):
+    """Merge (snap and join) edges of one orientation and filter by minimum length, as pdfplumber TableFinder.get_edges.
+
+    Args:
+        edges (list): Edges of one orientation.
+        settings (TableSettings): Table settings.
+
+    Returns:
+        list: Merged edges.
+    """
+    edges = merge_edges(
+        edges,
+        snap_x_tolerance=settings.snap_x_tolerance,
+        snap_y_tolerance=settings.snap_y_tolerance,
+        join_x_tolerance=settings.join_x_tolerance,
+        join_y_tolerance=settings.join_y_tolerance,
+    )
+    return utils.filter_edges(edges, min_length=settings.edge_min_length)
+
+
+def _tables_from_edges(page, v_edges, h_edges, settings):
+    """Tables of merged vertical and horizontal edges, as pdfplumber TableFinder.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        v_edges (list): Merged vertical edges.
+        h_edges (list): Merged horizontal edges.
+        settings (TableSettings): Table settings.
+
+    Returns:
+        list: pdfplumber Table
+    """
+    intersections = edges_to_intersections(
+        v_edges + h_edges,
+        settings.intersection_x_tolerance,
+        settings.intersection_y_tolerance,
+    )
+    cells = intersections_to_cells(intersections)
+    return [Table(page, cell_group) for cell_group in cells_to_tables(cells)]
+
+
+def _find_page_tables(page, stats=NO_STATS):
+    """Both table views of the page from edges merged once: the vertical edges are the same for both views (strategy "lines"), only the
+    horizontal edges of "lines_strict" (line objects only) are merged again. Same tables as page.find_tables() and
+    page.find_tables(TABLE_SETTINGS_CUSTOS) for pdfplumber 0.11 (environ.yml).
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        stats (ParseStats, optional): Timers of the stages. Defaults to NO_STATS.
+
+    Returns:
+        list,list: tables (default), tables_custos ("lines_strict" horizontal), pdfplumber Table
+    """
+    settings = TableSettings.resolve(None)
+    with stats.timer("page_objects"):
+        edges = page.edges
+    min_length = settings.edge_min_length_prefilter
+    with stats.timer("tables"):
+        v_edges = _merge_filter_edges(utils.filter_edges(edges, "v", min_length=min_length), settings)
+        h_edges = _merge_filter_edges(utils.filter_edges(edges, "h", min_length=min_length), settings)
+        tables = _tables_from_edges(page, v_edges, h_edges, settings)
+    with stats.timer("tables_lines_strict"):
+        h_edges_strict = _merge_filter_edges(
+            utils.filter_edges(edges, "h", edge_type="line", min_length=min_length), settings
+        )
+        tables_custos = (
+            tables
+            if h_edges_strict == h_edges
+            else _tables_from_edges(page, v_edges, h_edges_strict, settings)
+        )
+    return tables, tables_custos
+
+
+def extract_page_layout(page):
+    """Layout stage of one page, edges and chars are parsed once and the text of the cells found by both table views is extracted once.
+    Equivalent to page.extract_tables() and page.extract_tables({"horizontal_strategy": "lines_strict"}).
+
+    Args:
+        page (objeto): Página do pdfplumber.
+
+    Returns:
+        lista,lista: tables (header, negócios realizados), df_custo (blocos de custos)
+    """
+    tables, tables_custos = _find_page_tables(page)
+    v_mids, index = _index_chars(page.chars)
+    texts = {}
+    return (
+        [_extract_rows(_table_rows(table), v_mids, index, texts) for table in tables],
+        [_extract_rows(_table_rows(table), v_mids, index, texts) for table in tables_custos],
+    )
+
+
+# Template of crop regions
+
+
+class TemplateMismatch(ValueError):
+    """Page does not match the template of crop regions, full page detection must be used."""
+
+
+def _pad_bbox(bbox, page_bbox, padding=TEMPLATE_PADDING):
+    x0, top, x1, bottom = bbox
+    px0, ptop, px1, pbottom = page_bbox
+    return (
+        max(px0, x0 - padding),
+        max(ptop, top - padding),
+        min(px1, x1 + padding),
+        min(pbottom, bottom + padding),
+    )
+
+
+def extract_page_regions(page, stats=NO_STATS):
+    """Full page detection returning the named regions of the nota and the template of their bounding boxes, used to crop the next pages.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        stats (ParseStats, optional): Timers of the stages. Defaults to NO_STATS.
+
+    Returns:
+        dict,dict: regiões {"cabecalho", "negocios", "custos"} (text of tables), template {"page_bbox", "cabecalho", "negocios", "custos"} (bboxes)
+    """
+    tables, tables_custos = _find_page_tables(page, stats)
+    cabecalho_rows, negocios_rows, custos_rows = (
+        _table_rows(tables[0]),
+        _table_rows(tables[1]),
+        _table_rows(tables_custos[1]),
+    )
+    with stats.timer("text_layer"):
+        v_mids, index = _index_chars(page.chars)
+        texts = {}
+        regioes = {
+            "cabecalho": _extract_rows(cabecalho_rows, v_mids, index, texts),
+            "negocios": _extract_rows(negocios_rows, v_mids, index, texts),
+            "custos": _extract_rows(custos_rows, v_mids, index, texts),
+        }
+    ancora_chars = _cell_chars(custos_rows[0][1][0], index)
+    template = {
+        "page_bbox": tuple(page.bbox),
+        "cabecalho": tables[0].bbox,
+        "negocios": tables[1].bbox,
+        "custos": tables_custos[1].bbox,
+        "cabecalho_rows": cabecalho_rows,
+        "negocios_header": negocios_rows[0],
+        "custos_rows": custos_rows,
+        "custos_ancora": (  # First cell of custos, locates the blocos de custos below the negócios
+            regioes["custos"][0][0],
+            min(c["top"] for c in ancora_chars) if ancora_chars else None,
+        ),
+    }
+    return regioes, template
+
+
+def _iter_layout_leaves(layout_objects):
+    """Leaf objects of the pdfminer layout (chars, lines, rects, curves, ...), children of containers (figures) included, in the order of
+    pdfplumber page.objects.
+
+    Args:
+        layout_objects (list): page.layout._objs
+
+    Yields:
+        objeto: pdfminer LTComponent.
+    """
+    for obj in layout_objects:
+        if isinstance(obj, LTContainer):
+            yield from _iter_layout_leaves(obj._objs)
+        else:
+            yield obj
+
+
+def _region_objects(page, bboxes, kinds=REGION_OBJECT_KINDS):
+    """Objects of the page intersecting any of the bboxes, converted to dicts as page.objects. Layout objects outside the bboxes are
+    discarded from their pdfminer bounding box before any conversion, while page.objects and page.crop(bbox) convert every object of
+    the page.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        bboxes (list): Bounding boxes of the regions.
+        kinds (dict, optional): pdfminer class: kind of the objects read. Defaults to REGION_OBJECT_KINDS.
+
+    Returns:
+        dict: Objects per kind ("char", "line", "rect", "curve"), in the order of page.objects. Not clipped to the bboxes.
+    """
+    mb_x0, mb_top = page.mediabox[:2]
+    height = page.height
+    objects = {}
+    for obj in _iter_layout_leaves(page.layout._objs):
+        kind = kinds.get(type(obj))
+        if kind is None:
+            continue
+        obj_bbox = (  # As pdfplumber Page.process_object
+            obj.x0 + mb_x0,
+            (height - obj.y1) + mb_top,
+            obj.x1 + mb_x0,
+            (height - obj.y0) + mb_top,
+        )
+        if any(utils.get_bbox_overlap(obj_bbox, bbox) is not None for bbox in bboxes):
+            objects.setdefault(kind, []).append(
+                _char_object(page, obj, obj_bbox) if kind == "char" else page.process_object(obj)
+            )
+    return objects
+
+
+def _char_object(page, obj, obj_bbox):
+    """Dict of a pdfminer LTChar, same as page.process_object(obj) for pdfplumber 0.11 (environ.yml). The attributes are copied directly,
+    process_object resolves every attribute of every object as a possible pdf reference, while those of chars are plain values.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        obj (LTChar): Char of the layout.
+        obj_bbox (tuple): Bounding box of the char in page coordinates (x0, top, x1, bottom).
+
+    Returns:
+        dict: Char, as page.chars.
+    """
+    x0, top, x1, bottom = obj_bbox
+    gs = obj.graphicstate
+    text = obj.get_text()
+    fontname = obj.fontname
+    return {
+        "matrix": obj.matrix,
+        "fontname": fix_fontname_bytes(fontname) if isinstance(fontname, bytes) else fontname,
+        "adv": obj.adv,
+        "upright": obj.upright,
+        "x0": x0,
+        "y0": obj.y0,
+        "x1": x1,
+        "y1": obj.y1,
+        "width": obj.width,
+        "height": obj.height,
+        "size": obj.size,
+        "mcid": obj.mcid,
+        "tag": obj.tag,
+        "object_type": "char",
+        "page_number": page.page_number,
+        "ncs": resolve_and_decode(obj.ncs.name),
+        "text": text if page.pdf.unicode_norm is None else normalize_unicode(page.pdf.unicode_norm, text),
+        "stroking_color": gs.scolor if isinstance(gs.scolor, tuple) else (gs.scolor,),
+        "non_stroking_color": gs.ncolor if isinstance(gs.ncolor, tuple) else (gs.ncolor,),
+        "top": top,
+        "bottom": bottom,
+        "doctop": page.initial_doctop + top,
+    }
+
+
+def _region_edges(objects, bbox):
+    """Edges of the objects clipped to the bbox, same as page.crop(bbox).edges.
+
+    Args:
+        objects (dict): Objects from _region_objects.
+        bbox (tuple): Bounding box of the region.
+
+    Returns:
+        list: Edges.
+    """
+    return (
+        [utils.line_to_edge(obj) for obj in utils.crop_to_bbox(objects.get("line", []), bbox)]
+        + list(chain.from_iterable(utils.rect_to_edges(obj) for obj in utils.crop_to_bbox(objects.get("rect", []), bbox)))
+        + list(chain.from_iterable(utils.curve_to_edges(obj) for obj in utils.crop_to_bbox(objects.get("curve", []), bbox)))
+    )
+
+
+def _extract_region(page, edges, bbox, strict, v_mids, index, texts, stats=NO_STATS):
+    """Table detection only within a region of the page, on the edges clipped to the bbox of the template as page.crop(bbox).find_tables().
+    The text of the cells is read from the char index of the regions.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        edges (list): Edges of the region from _region_edges.
+        bbox (tuple): Bounding box of the region.
+        strict (bool): If true uses "lines_strict" horizontal strategy (blocos de custos).
+        v_mids (list): Sorted vertical middle points from _index_chars.
+        index (list): Char index from _index_chars.
+        texts (dict): Text per cell bbox, shared by the regions.
+        stats (ParseStats, optional): Timers of the stages. Defaults to NO_STATS.
+
+    Raises:
+        TemplateMismatch: No table found in the region.
+
+    Returns:
+        list: Text of the first table found in the region.
+    """
+    settings = TableSettings.resolve(TABLE_SETTINGS_CUSTOS if strict else None)
+    min_length = settings.edge_min_length_prefilter
+    with stats.timer("tables_lines_strict" if strict else "tables"):
+        v_edges = _merge_filter_edges(utils.filter_edges(edges, "v", min_length=min_length), settings)
+        h_edges = _merge_filter_edges(
+            utils.filter_edges(edges, "h", edge_type="line" if strict else None, min_length=min_length), settings
+        )
+        tables = _tables_from_edges(page, v_edges, h_edges, settings)
+    if not tables:
+        raise TemplateMismatch(f"No table found in region {bbox}.")
+    with stats.timer("text_layer"):
+        return _extract_rows(_table_rows(tables[0]), v_mids, index, texts)
+
+
+def extract_page_regions_template(page, template, stats=NO_STATS):
+    """Extract named regions of the nota running table detection on the crop of each region of the template only. Only the objects of
+    the page within the regions are extracted, the edges are clipped to each region as page.crop(bbox), the text of the cells is read
+    from one char index of the regions.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        template (dict): Template from extract_page_regions.
+        stats (ParseStats, optional): Timers of the stages. Defaults to NO_STATS.
+
+    Raises:
+        TemplateMismatch: Page size differs from the template or a region has no table.
+
+    Returns:
+        dict: regiões {"cabecalho", "negocios", "custos"} (text of tables)
+    """
+    if tuple(page.bbox) != template["page_bbox"]:
+        raise TemplateMismatch(f"Page bbox {page.bbox} differs from the template.")
+    bboxes = {name: _pad_bbox(template[name], page.bbox) for name in ("cabecalho", "negocios", "custos")}
+    with stats.timer("page_objects"):
+        objects = _region_objects(page, list(bboxes.values()))
+    with stats.timer("text_layer"):
+        v_mids, index = _index_chars(objects.get("char", []))
+    texts = {}
+    return {
+        name: _extract_region(
+            page, _region_edges(objects, bbox), bbox, name == "custos", v_mids, index, texts, stats
+        )
+        for name, bbox in bboxes.items()
+    }
+
+
+# Text layer
+
+
+def _shift_rows(rows, dy):
+    """Move bounding boxes of rows and cells vertically.
+
+    Args:
+        rows (list): List of (row bbox, list of cell bbox or None).
+        dy (float): Vertical displacement.
+
+    Returns:
+        list: Rows displaced by dy.
+    """
+    return [
+        (
+            (x0, top + dy, x1, bottom + dy),
+            [
+                None if cell is None else (cell[0], cell[1] + dy, cell[2], cell[3] + dy)
+                for cell in cells
+            ],
+        )
+        for (x0, top, x1, bottom), cells in rows
+    ]
+
+
+def extract_page_regions_text(page, template, stats=NO_STATS):
+    """Extract named regions of the nota from the text layer only, no edges are analysed.
+    Header and blocos de custos are read from the cells of the template, the custos displaced to the position of their first cell (anchor),
+    each text line between the header of negócios and the anchor is a negócio realizado, split in the columns of the template.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        template (dict): Template from extract_page_regions.
+        stats (ParseStats, optional): Timers of the stages. Defaults to NO_STATS.
+
+    Raises:
+        TemplateMismatch: Page size differs from the template or the anchor of the custos is not found.
+
+    Returns:
+        dict: regiões {"cabecalho", "negocios", "custos"} (text of tables)
+    """
+    if tuple(page.bbox) != template["page_bbox"]:
+        raise TemplateMismatch(f"Page bbox {page.bbox} differs from the template.")
+    with stats.timer("page_objects"):
+        chars = _region_objects(page, [page.bbox], TEXT_OBJECT_KINDS).get("char", [])
+    with stats.timer("text_layer"):
+        v_mids, index = _index_chars(chars)
+        header_bbox, header_cells = template["negocios_header"]
+        ancora_text, ancora_top = template["custos_ancora"]
+        ancora_cell = template["custos_rows"][0][1][0]
+        negocios = _extract_rows([template["negocios_header"]], v_mids, index)
+        lines = utils.cluster_objects(
+            index[bisect_left(v_mids, header_bbox[3]) :], itemgetter(0), TEXT_LINE_TOLERANCE
+        )
+        for line in lines:
+            line.sort(key=itemgetter(2))  # Order of page.chars
+            ancora_chars = [c[3] for c in line if ancora_cell[0] <= c[1] < ancora_cell[2]]
+            if ancora_chars and utils.extract_text(ancora_chars) == ancora_text:
+                dy = min(c["top"] for c in ancora_chars) - ancora_top
+                break
+            row = [
+                None
+                if cell is None
+                else utils.extract_text([c[3] for c in line if cell[0] <= c[1] < cell[2]])
+                for cell in header_cells
+            ]
+            if any(row):
+                negocios.append(row)
+        else:
+            raise TemplateMismatch(f"Anchor {ancora_text!r} of custos not found.")
+        return {
+            "cabecalho": _extract_rows(template["cabecalho_rows"], v_mids, index),
+            "negocios": negocios,
+            "custos": _extract_rows(_shift_rows(template["custos_rows"], dy), v_mids, index),
+        }
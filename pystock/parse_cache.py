@@ -0,0 +1,178 @@
+"""
+Content-addressed cache of parsed pages of notas de corretagem. Each entry is keyed by the hash of the page content stream plus the parser version,
+storing the parsed negócios realizados and the custos da nota, so historical pages are not parsed again when a new PDF is processed.
+
+Usage:
+    python -m pystock.parse_cache stats data/cache/parse_notas/
+    python -m pystock.parse_cache invalidate data/cache/parse_notas/ [key ...]
+"""
+import argparse
+import hashlib
+import json
+import os
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+EVICT_TO_RATIO = 0.9  # After eviction, cache size is at most this ratio of max_bytes
+CACHE_EXTENSION = ".json"
+
+
+def page_key(page, parser_version=None):
+    """Hash of the page content streams and parser version, no layout analysis is performed.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        parser_version (str, optional): Version of the parser that generated the entry. Defaults to None, hash of the content only
+            (nota_index).
+
+    Returns:
+        str: Hex digest sha256.
+    """
+    h = hashlib.sha256() if parser_version is None else hashlib.sha256(f"{parser_version}\n".encode("utf-8"))
+    for stream in page.page_obj.contents:
+        h.update(stream.get_data())
+    return h.hexdigest()
+
+
+class ParseCache:
+    """On disk cache of parsed pages with size based eviction (least recently used first).
+
+    Args:
+        cache_dir (string): Directory of the cache, created if missing.
+        max_bytes (int, optional): Maximum size of the cache entries. Defaults to DEFAULT_MAX_BYTES.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self._size = None  # Computed on first put
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + CACHE_EXTENSION)
+
+    def _entries(self):
+        """List entries of the cache.
+
+        Returns:
+            list: List of (mtime, size, path).
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(CACHE_EXTENSION):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def get(self, key):
+        """Return the cached page record or None if not cached.
+
+        Args:
+            key (str): Key from page_key.
+
+        Returns:
+            dict: Page record with keys "num_nota", "data_pregao", "negocios_realizados", "custos_nota" or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                pagina = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(path)  # Marks as recently used
+        return pagina
+
+    def put(self, key, pagina):
+        """Store a page record, evicting least recently used entries if max_bytes is exceeded.
+
+        Args:
+            key (str): Key from page_key.
+            pagina (dict): Page record from parse_notas_corretagem._parse_page_btg.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(
+            {k: v for k, v in pagina.items() if k != "pagina"},
+            ensure_ascii=False,
+            default=str,  # Dates as dd/mm/yyyy
+        ).encode("utf-8")
+        try:
+            size_replaced = os.path.getsize(path)  # Entry of the same key written again
+        except OSError:
+            size_replaced = 0
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Atomic, other processes may share the cache
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data) - size_replaced
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the size is below EVICT_TO_RATIO of max_bytes."""
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO_RATIO
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def invalidate(self, keys=None):
+        """Remove entries of the cache.
+
+        Args:
+            keys (list, optional): Keys to remove, if None removes all entries. Defaults to None.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        if keys is None:
+            paths = [path for _, _, path in self._entries()]
+        else:
+            paths = [self._path(key) for key in keys]
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        self._size = None
+        return removed
+
+    def stats(self):
+        """Number of entries and total size in bytes.
+
+        Returns:
+            int,int: entries, size
+        """
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the parse cache of notas de corretagem.")
+    parser.add_argument("command", choices=["stats", "invalidate"])
+    parser.add_argument("cache_dir")
+    parser.add_argument("keys", nargs="*", help="Keys to invalidate, all if empty.")
+    args = parser.parse_args()
+    cache = ParseCache(args.cache_dir)
+    if args.command == "invalidate":
+        removed = cache.invalidate(args.keys or None)
+        print(f"Removed {removed} entries from {cache.cache_dir}.")
+    else:
+        entries, size = cache.stats()
+        print(f"{entries} entries, {size} bytes in {cache.cache_dir}.")
+
+
+if __name__ == "__main__":
+    main()
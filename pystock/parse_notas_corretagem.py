@@ -7,9 +7,28 @@ import pdfplumber
 import re
 import json, codecs
 import pystock.helpersio as hio
+import pystock.page_layout as pl
+import pystock.parse_cache as pcache
+import pystock.schema_notas as schema
+import pystock.custos_table as ct
+from pystock.parse_stats import NO_STATS, ParseStats
 import sys
-
-HEADERS_NEGOCIOS_REALIZADOS=['Q', 'Negociação', 'C/V', 'Tipo Mercado', 'Prazo', 'Especificação do título', 'Obs. (*)', 'Quantidade', 'Preço / Ajuste', 'Valor Operação / Ajuste', 'D/C','Nr. nota']
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from pdfminer.pdfpage import PDFPage
+from pdfplumber.page import Page
+
+HEADERS_RESUMO_NOTA = schema.HEADERS_RESUMO_NOTA  # Columns typed by schema.NEGOCIOS_REALIZADOS_SCHEMA
+HEADERS_NEGOCIOS_REALIZADOS = HEADERS_RESUMO_NOTA[:-2]  # Without "taxas" and "Data pregao"
+PARSER_VERSION = "2"  # Increase when the parsed output changes, invalidating the parse cache entries
+PAGES_CHUNKS_PER_WORKER = 4  # Intervals of pages per process, smaller chunks balance uneven pages
+PAGES_WINDOW = None  # Pages parsed per opening of the pdf, None opens the pdf once
+MAX_MEMORY = None  # Bytes of resident memory that may grow while the pdf is open before it is reopened, None has no limit
+# Cells (row, column) of the tables of the BTG layout
+BTG_CELULA_NUM_NOTA = (0, 5)  # Header, "Nr. nota 12345"
+BTG_CELULA_DATA_PREGAO = (0, 8)  # Header, "Data pregão dd/mm/yyyy"
+BTG_CELULAS_CUSTOS = [(1, 0), (1, 1), (2, 1), (3, 1)]  # Blocos resumo dos negócios, clearing, bovespa, corretagem
+BTG_CELULA_LIQUIDO = (4, 1)  # "Líquido para dd/mm/yyyy 1.234,56 C"
 
 def _parse_add_negocios_realizados(table_negocios_realizados, num_nota):
     """Extrai tabela de negócios realizados, adicionando ao fim da tabela o número da nota.
@@ -32,35 +51,144 @@ def _parse_add_negocios_realizados(table_negocios_realizados, num_nota):
     return negocios_realizados
 
 
-def _parse_resumo_dos_negocios(df_str):
-    """Parse tabela resumo dos negócios.Retornando valores no formato delista.
+class CustosLayoutError(ValueError):
+    """Erro de parse dos blocos de custos, informando o atributo que não foi encontrado (mudança de layout da nota).
 
     Args:
-        df_str (str): String contendo tabela de resumo de negócios.
+        atributo (str): Nome do atributo de custo.
+        bloco (int): Índice do bloco de custos.
+        linha (str): Linha do bloco onde o atributo era esperado.
+    """
+
+    def __init__(self, atributo, bloco, linha):
+        self.atributo = atributo
+        self.bloco = bloco
+        self.linha = linha
+        super().__init__(
+            f"Could not parse custo '{atributo}' of block {bloco} from line {linha!r}, verify the layout of the nota."
+        )
+
+
+_NUM = r"(\d[\d.]*(?:,\d+)?)"  # Number in format 1.234,56
+_SP = r"[ \t]"  # Spaces within a line
+# Table of custos attributes: bloco, linha, atributo, pattern of the line. Title lines of blocks have no attribute.
+CUSTOS_FIELDS = [
+    (0, 0, "debêntures", r"debêntures" + _SP + "+" + _NUM + _SP + "*$"),
+    (0, 1, "vendas à vista", r"vendas à vista" + _SP + "+" + _NUM + _SP + "*$"),
+    (0, 2, "compras à vista", r"compras à vista" + _SP + "+" + _NUM + _SP + "*$"),
+    (0, 3, "opções - compras", r"opções - compras" + _SP + "+" + _NUM + _SP + "*$"),
+    (0, 4, "opções - vendas", r"opções - vendas" + _SP + "+" + _NUM + _SP + "*$"),
+    (0, 5, "operações à termo", r"operações à termo" + _SP + "+" + _NUM + _SP + "*$"),
+    (0, 6, "valor das oper. com títulos públ", r".*\)" + _SP + "*" + _NUM + _SP + "*$"),
+    (0, 7, "valor das operações", r"valor das operações" + _SP + "+" + _NUM + _SP + "*$"),
+    (1, 1, "valor líquido das operações", r"valor líquido das operações" + _SP + "+" + _NUM),
+    (1, 2, "taxa de liquidação", r"taxa de liquidação" + _SP + "+" + _NUM),
+    (1, 3, "taxa de registro", r"taxa de registro" + _SP + "+" + _NUM),
+    (1, 4, "total cblc", r"total cblc" + _SP + "+" + _NUM),
+    (2, 1, "taxa de termo/opções", r"taxa de termo/opções" + _SP + "+" + _NUM),
+    (2, 2, "taxa a.n.a.", r"taxa a\.?n\.?a\.?" + _SP + "+" + _NUM),
+    (2, 3, "emolumentos", r"emolumentos" + _SP + "+" + _NUM),
+    (2, 4, "total bovespa / soma", r"total bovespa / soma" + _SP + "+" + _NUM),
+    (3, 1, "clearing", r"clearing" + _SP + "+" + _NUM),
+    (3, 2, "execução", r"execução" + _SP + "+" + _NUM),
+    (3, 3, "execução casa", r"execução casa" + _SP + "+" + _NUM),
+    (3, 4, "iss (são paulo)", r"iss \(são paulo\)" + _SP + "+" + _NUM),
+    (3, 5, "i.r.r.f. s/ operações, base r$", r"i\.?r\.?r\.?f\.?.*" + _SP + _NUM + _SP + "*$"),  # Last value of line
+    (3, 6, "outras bovespa", r"outras bovespa" + _SP + "+" + _NUM),
+    (3, 7, "total corretagem / despesas", r"total corretagem / despesas" + _SP + "+" + _NUM),
+]
+_CUSTOS_FLAGS = re.IGNORECASE | re.MULTILINE
+assert [atributo for _, _, atributo, _ in CUSTOS_FIELDS] == ct.CUSTOS_ATTRIBUTES[
+    : len(CUSTOS_FIELDS)
+], "CUSTOS_FIELDS out of order with custos_table.CUSTOS_ATTRIBUTES."
+CUSTO_VALOR_OPERACOES = ct.CUSTOS_INDEX["valor das operações"]
+CUSTO_LIQUIDACAO = ct.CUSTOS_INDEX["taxa de liquidação"]
+CUSTO_REGISTRO = ct.CUSTOS_INDEX["taxa de registro"]
+CUSTO_EMOLUMENTOS = ct.CUSTOS_INDEX["emolumentos"]
+CUSTO_CORRETAGEM = ct.CUSTOS_INDEX["total corretagem / despesas"]
+
+
+def _compile_custos_patterns():
+    """Compile, per bloco, one pattern of the whole block (all attributes extracted by a single match) and the patterns per line used to report the attribute that failed.
 
     Returns:
-        lista str: Lista com valores de items.
+        list,list: block patterns, list per bloco of (linha, atributo, line pattern)
     """
+    linhas_blocos = [{} for _ in range(4)]
+    for bloco, linha, atributo, pattern in CUSTOS_FIELDS:
+        linhas_blocos[bloco][linha] = (atributo, pattern)
+    block_patterns = []
+    line_patterns = []
+    for linhas in linhas_blocos:
+        block_pattern = "\n".join(
+            _SP + "*" + linhas[linha][1] + r"[^\n]*" if linha in linhas else r"[^\n]*"
+            for linha in range(max(linhas) + 1)
+        )
+        block_patterns.append(re.compile(block_pattern, _CUSTOS_FLAGS).match)
+        line_patterns.append(
+            [
+                (linha, atributo, re.compile(_SP + "*" + pattern, _CUSTOS_FLAGS).match)
+                for linha, (atributo, pattern) in sorted(linhas.items())
+            ]
+        )
+    return block_patterns, line_patterns
 
-    linhas = df_str.split("\n")
-    linhas_processed = [x.lower().replace(".", "").replace(",", ".") for x in linhas]
 
-    HEADERS = [
-        "debêntures",
-        "vendas à vista",
-        "compras à vista",
-        "opções - compras",
-        "opções - vendas",
-        "operações à termo",
-        "\)",
-        "valor das operações",
-    ]
+_CUSTOS_BLOCK_PATTERNS, _CUSTOS_LINE_PATTERNS = _compile_custos_patterns()
+_NUM_RE = re.compile(_NUM)
+_DATA_RE = re.compile(r"\d{2}/\d{2}/\d{4}")
+_COLS_NUM_NEGOCIOS = [schema.col(name) for name in ("Quantidade", "Preço / Ajuste", "Valor Operação / Ajuste")]
+
+
+def _parse_custos_bloco(df_str, bloco):
+    """Parse um bloco de custos com um único match do padrão pré-compilado do bloco (CUSTOS_FIELDS).
+
+    Args:
+        df_str (str): String contendo o bloco de custos.
+        bloco (int): Índice do bloco: 0 resumo dos negócios, 1 clearing, 2 bovespa, 3 corretagem.
+
+    Returns:
+        lista float: Lista com valores dos atributos do bloco.
+    """
+    match = _CUSTOS_BLOCK_PATTERNS[bloco](df_str)
+    if match is None:  # Finds the attribute that failed
+        linhas = df_str.split("\n")
+        for linha, atributo, match_line in _CUSTOS_LINE_PATTERNS[bloco]:
+            if linha >= len(linhas) or match_line(linhas[linha]) is None:
+                raise CustosLayoutError(
+                    atributo, bloco, linhas[linha] if linha < len(linhas) else None
+                )
+        raise CustosLayoutError(None, bloco, df_str)
+    return [float(v.replace(".", "").replace(",", ".")) for v in match.groups()]
+
+
+def _parse_custos_blocos(blocos):
+    """Parse todos os 23 atributos numéricos de custos dos blocos resumo dos negócios, clearing, bovespa e corretagem.
+
+    Args:
+        blocos (lista str): Strings dos blocos na ordem resumo dos negócios, clearing, bovespa, corretagem.
+
+    Returns:
+        lista float: Lista com valores dos atributos na ordem de CUSTOS_FIELDS.
+    """
     valores = []
-    for i in range(len(HEADERS)):
-        valores.append(float(re.split(HEADERS[i], linhas_processed[i])[-1].strip()))
+    for bloco, df_str in enumerate(blocos):
+        valores.extend(_parse_custos_bloco(df_str, bloco))
     return valores
 
 
+def _parse_resumo_dos_negocios(df_str):
+    """Parse tabela resumo dos negócios.Retornando valores no formato delista.
+
+    Args:
+        df_str (str): String contendo tabela de resumo de negócios.
+
+    Returns:
+        lista str: Lista com valores de items.
+    """
+    return _parse_custos_bloco(df_str, 0)
+
+
 def _parse_clearing(df_str):
     """Parse tabela clearing.Retornando valores no formato delista.
 
@@ -70,22 +198,7 @@ def _parse_clearing(df_str):
     Returns:
         lista str: lista com valores de items.
     """
-
-    linhas = df_str.split("\n")
-    linhas_processed = [x.lower().replace(".", "").replace(",", ".") for x in linhas]
-
-    HEADERS = [
-        "clearing",  # No values
-        "valor líquido das operações",
-        "taxa de liquidação",
-        "taxa de registro",
-        "total cblc",
-    ]
-    valores = []
-    for i in range(1, len(HEADERS)):
-        values = re.split(HEADERS[i], linhas_processed[i])[-1].strip()
-        valores.append(float(values.split(" ")[0].strip()))
-    return valores
+    return _parse_custos_bloco(df_str, 1)
 
 
 def _parse_bovespa(df_str):
@@ -97,22 +210,7 @@ def _parse_bovespa(df_str):
     Returns:
         lista str: lista com valores de items.
     """
-
-    linhas = df_str.split("\n")
-    linhas_processed = [x.lower().replace(".", "").replace(",", ".") for x in linhas]
-
-    HEADERS = [
-        "bolsa",  # No values
-        "taxa de termo/opções",
-        "taxa ana",
-        "emolumentos",
-        "total bovespa / soma",
-    ]
-    valores = []
-    for i in range(1, len(HEADERS)):
-        values = re.split(HEADERS[i], linhas_processed[i])[-1].strip()
-        valores.append(float(values.split(" ")[0].strip()))
-    return valores
+    return _parse_custos_bloco(df_str, 2)
 
 
 def _parse_corretagem(df_str):
@@ -124,31 +222,10 @@ def _parse_corretagem(df_str):
     Returns:
         lista str: lista com valores de items.
     """
-
-    linhas = df_str.split("\n")
-    linhas_processed = [x.lower().replace(".", "").replace(",", ".") for x in linhas]
-
-    HEADERS = [
-        "corretagem / despesas",  # No values
-        "clearing",
-        "execução",
-        "execução casa",
-        "iss \(são paulo\)",
-        "irrf s/ operações, base r$",
-        "outras bovespa",
-        "total corretagem / despesas",
-    ]
-    valores = []
-    for i in range(1, len(HEADERS)):
-        values = re.split(HEADERS[i], linhas_processed[i])[-1].strip()
-        if i == 5:  # i.r.r.f. s/ operações
-            valores.append(float(values.split(" ")[-1].strip()))
-        else:
-            valores.append(float(values.split(" ")[0].strip()))
-    return valores
+    return _parse_custos_bloco(df_str, 3)
 
 
-def _parse_add_custos_notas(df_custo, custos_notas, num_nota, numtest):
+def _parse_add_custos_notas(table_custos, custos_notas, num_nota, numtest):
     """Parse Custos de operação por nota, gerando um dicionário key:número da nota e lista de atributos da nota.
     ATTRIBUTES = [
         "debêntures",
@@ -179,55 +256,22 @@ def _parse_add_custos_notas(df_custo, custos_notas, num_nota, numtest):
     ]
 
     Args:
-        df_custo (lista (str)): Lista das tabelas de custo.
+        table_custos (lista (str)): Tabela de custos (blocos resumo dos negócios, clearing, bovespa, corretagem e líquido).
         custos_notas (dict): Dicionário adicionar valores das notas.
         num_nota (str): Número da nota.
     """
-    values = []
-
     # # Export for testing
-    # export_obj_as_std_out_test(
-    #     df_custo[1][1][0], f"_parse_resumo_dos_negocios_{numtest}.in"
-    # )
+    # export_obj_as_std_out_test(table_custos[1][0], f"_parse_resumo_dos_negocios_{numtest}.in")
+    # export_obj_as_std_out_test(table_custos[1][1], f"_parse_clearing_{numtest}.in")
+    # export_obj_as_std_out_test(table_custos[2][1], f"_parse_bovespa_{numtest}.in")
+    # export_obj_as_std_out_test(table_custos[3][1], f"_parse_corretagem_{numtest}.in")
 
-    resumo_dos_negocios_df = _parse_resumo_dos_negocios(df_custo[1][1][0])
-    values.extend(resumo_dos_negocios_df)
+    values = _parse_custos_blocos([table_custos[r][c] for r, c in BTG_CELULAS_CUSTOS])
 
-    # # Export for testing
-    # export_obj_as_std_out_test(
-    #     resumo_dos_negocios_df,
-    #     f"_parse_resumo_dos_negocios_valores_resumo_dos_negocios_{numtest}.out",
-    # )
+    liquido = table_custos[BTG_CELULA_LIQUIDO[0]][BTG_CELULA_LIQUIDO[1]].split()
+    values.append(liquido[2])  # Data de liquidação
 
-    # # Export for testing
-    # export_obj_as_std_out_test(df_custo[1][1][1], f"_parse_clearing_{numtest}.in")
-
-    clearing_df = _parse_clearing(df_custo[1][1][1])
-    values.extend(clearing_df)
-
-    # # Export for testing
-    # export_obj_as_std_out_test(clearing_df, f"_parse_clearing_values_{numtest}.out")
-
-    # # Export for testing
-    # export_obj_as_std_out_test(df_custo[1][2][1], f"_parse_bovespa_{numtest}.in")
-
-    bovespa_df = _parse_bovespa(df_custo[1][2][1])
-    values.extend(bovespa_df)
-
-    # # Export for testing
-    # export_obj_as_std_out_test(bovespa_df, f"_parse_bovespa_values_{numtest}.out")
-
-    # # Export for testing
-    # export_obj_as_std_out_test(df_custo[1][3][1], f"_parse_corretagem_{numtest}.in")
-
-    corretagem_df = _parse_corretagem(df_custo[1][3][1])
-    values.extend(corretagem_df)
-    # # Export for testing
-    # export_obj_as_std_out_test(corretagem_df, f"_parse_corretagem_values_{numtest}.out")
-
-    values.append(df_custo[1][4][1].split()[2])  # Data de liquidação
-
-    values.append(df_custo[1][4][1].split()[3])  # Valor Liquido
+    values.append(liquido[3])  # Valor Liquido
 
     custos_notas[num_nota] = values
 
@@ -255,12 +299,11 @@ def _add_custos_notas_ativos_resumo_nota(
         resumo_nota ([type]): Resumo nota
         data_pregao ([type]): data_pregao
     """
-    taxa_corretagem = custos_notas[num_nota][22] / float(len(negocios_realizados))
+    custos = custos_notas[num_nota]
+    taxa_corretagem = custos[CUSTO_CORRETAGEM] / float(len(negocios_realizados))
     taxas_LRE_div_total = (
-        custos_notas[num_nota][9]
-        + custos_notas[num_nota][10]
-        + custos_notas[num_nota][14]
-    ) / (custos_notas[num_nota][7])
+        custos[CUSTO_LIQUIDACAO] + custos[CUSTO_REGISTRO] + custos[CUSTO_EMOLUMENTOS]
+    ) / (custos[CUSTO_VALOR_OPERACOES])
     for ativo in negocios_realizados:
         ativo.append(
             round(taxa_corretagem + taxas_LRE_div_total * float(ativo[9]), ndigits=2)
@@ -272,71 +315,568 @@ def _add_custos_notas_ativos_resumo_nota(
         resumo_nota.append(ativo)  # Final Update
 
 
-def parse_notas_corretagem_btg(path):
+def _cell(table, celula):
+    """Texto da célula (row, column) da tabela, None se a célula não existe."""
+    row, col = celula
+    if row < len(table) and col < len(table[row]):
+        return table[row][col]
+    return None
+
+
+def _check_regioes_btg(regioes):
+    """Verifica se as regiões extraídas com o template têm as células lidas por _parse_regioes_btg, no formato esperado.
+
+    Args:
+        regioes (dict): Tabelas das regiões "cabecalho", "negocios" e "custos".
+
+    Raises:
+        TemplateMismatch: Regiões não correspondem ao layout, a página deve utilizar a detecção na página inteira.
+    """
+    for celula in (BTG_CELULA_NUM_NOTA, BTG_CELULA_DATA_PREGAO):
+        text = _cell(regioes["cabecalho"], celula)
+        if text is None or len(text.split()) < 3:
+            raise pl.TemplateMismatch(f"Header cell {celula} not found: {text!r}.")
+    if not _DATA_RE.fullmatch(_cell(regioes["cabecalho"], BTG_CELULA_DATA_PREGAO).split()[2]):
+        raise pl.TemplateMismatch("Data pregão not found in the header.")
+    negocios = regioes["negocios"]
+    if len(negocios) < 2:
+        raise pl.TemplateMismatch("No negócios realizados found.")
+    for line in negocios[1:]:
+        if len(line) != len(HEADERS_NEGOCIOS_REALIZADOS) - 1 or None in line:
+            raise pl.TemplateMismatch(f"Negócio realizado {line} does not match the columns.")
+        if not all(_NUM_RE.fullmatch(line[col]) for col in _COLS_NUM_NEGOCIOS):
+            raise pl.TemplateMismatch(f"Negócio realizado {line} has no numeric values.")
+    for bloco, celula in enumerate(BTG_CELULAS_CUSTOS):
+        text = _cell(regioes["custos"], celula)
+        if text is None or _CUSTOS_BLOCK_PATTERNS[bloco](text) is None:
+            raise pl.TemplateMismatch(f"Bloco de custos {bloco} not found in cell {celula}.")
+    liquido = _cell(regioes["custos"], BTG_CELULA_LIQUIDO)
+    if liquido is None or len(liquido.split()) < 4:
+        raise pl.TemplateMismatch(f"Líquido not found in cell {BTG_CELULA_LIQUIDO}: {liquido!r}.")
+
+
+def _parse_regioes_btg(regioes, count_page, stats=NO_STATS):
+    """Parse as regiões de uma página de nota de corretagem btg. Extrai negócios realizados, taxas por ativo e custos da nota.
+
+    Args:
+        regioes (dict): Tabelas das regiões "cabecalho", "negocios" e "custos" (page_layout.extract_page_regions).
+        count_page (int): Número da página no arquivo.
+        stats (ParseStats, optional): Tempos das etapas. Defaults to NO_STATS.
+
+    Returns:
+        dict: Registro da página, keys: "pagina", "num_nota", "data_pregao", "negocios_realizados" (com taxas e data pregão, tipos de schema_notas), "custos_nota".
+    """
+    row, col = BTG_CELULA_NUM_NOTA
+    num_nota = regioes["cabecalho"][row][col].split()[2]
+    row, col = BTG_CELULA_DATA_PREGAO
+    data_pregao = regioes["cabecalho"][row][col].split()[2]
+
+    # # Export for testing
+    # export_obj_as_std_out_test(
+    #     regioes["negocios"],
+    #     f"_parse_add_negocios_realizados_table_negocios_realizados_{count_page}.in",
+    # )
+    with stats.timer("negocios"):
+        negocios_realizados = _parse_add_negocios_realizados(
+            regioes["negocios"], num_nota
+        )
+    assert len(HEADERS_RESUMO_NOTA) - 2 == len(
+        negocios_realizados[0]
+    ), f"Error in parsing, incorrect shape {len(negocios_realizados[0])} of received output."
+
+    # # Export for testing
+    # export_obj_as_std_out_test(
+    #     negocios_realizados,
+    #     f"_parse_add_negocios_realizados_table_negocios_realizados_{count_page}.out",
+    # )
+
+    custos_nota = {}
+    with stats.timer("custos"):
+        _parse_add_custos_notas(regioes["custos"], custos_nota, num_nota, count_page)
+    resumo_pagina = [HEADERS_RESUMO_NOTA]
+    with stats.timer("taxas"):
+        _add_custos_notas_ativos_resumo_nota(
+            negocios_realizados, custos_nota, num_nota, resumo_pagina, data_pregao
+        )
+    assert len(HEADERS_RESUMO_NOTA) == len(
+        negocios_realizados[0]
+    ), f"Error in parsing, incorrect shape {len(negocios_realizados[0])} of received output."
+    for ativo in negocios_realizados:
+        schema.type_negocio(ativo)
+    return {
+        "pagina": count_page,
+        "num_nota": num_nota,
+        "data_pregao": data_pregao,
+        "negocios_realizados": resumo_pagina[1:],
+        "custos_nota": custos_nota[num_nota],
+    }
+
+
+def _is_pagina_consistent(pagina):
+    """Verifica se a soma do valor das operações dos negócios realizados é igual ao valor das operações da nota.
+
+    Args:
+        pagina (dict): Registro da página.
+
+    Returns:
+        bool: True se os valores são consistentes.
+    """
+    negocios_realizados = pagina["negocios_realizados"]
+    total = sum(float(ativo[9]) for ativo in negocios_realizados)
+    return abs(total - pagina["custos_nota"][CUSTO_VALOR_OPERACOES]) <= 0.01 * max(
+        1, len(negocios_realizados)
+    )
+
+
+def _is_valor_liquido_consistent(pagina):
+    """Verifica se o valor líquido da nota é igual a vendas menos compras (à vista e opções) menos as taxas cblc, bovespa e corretagem.
+
+    Args:
+        pagina (dict): Registro da página.
+
+    Returns:
+        bool: True se os valores são consistentes.
+    """
+    custos_nota = dict(zip(ct.CUSTOS_ATTRIBUTES, pagina["custos_nota"]))
+    liquido = (
+        custos_nota["vendas à vista"]
+        + custos_nota["opções - vendas"]
+        - custos_nota["compras à vista"]
+        - custos_nota["opções - compras"]
+        - custos_nota["taxa de liquidação"]
+        - custos_nota["taxa de registro"]
+        - custos_nota["total bovespa / soma"]
+        - custos_nota["total corretagem / despesas"]
+    )
+    valor_liquido = ct.parse_brl(custos_nota["valor líquido"])
+    return abs(abs(liquido) - valor_liquido) <= 0.01
+
+
+def _parse_page_btg(page, count_page, template=None, fast=False, stats=NO_STATS):
+    """Parse uma página de nota de corretagem btg. Extrai negócios realizados, taxas por ativo e custos da nota.
+    Com template, a detecção de tabelas é feita apenas nas regiões recortadas do template. Se as regiões não forem encontradas ou os valores
+    não forem consistentes com o valor das operações da nota, utiliza a detecção na página inteira e recalibra o template.
+    Com fast, as regiões são lidas da camada de texto nas posições do template, sem detecção de tabelas, e validadas também pelo valor líquido.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        count_page (int): Número da página no arquivo.
+        template (dict, optional): Template de regiões, atualizado pela detecção na página inteira. {} aprende o template na primeira página, None não utiliza template. Defaults to None.
+        fast (bool, optional): Lê as regiões da camada de texto (page_layout.extract_page_regions_text), requer template. Defaults to False.
+        stats (ParseStats, optional): Tempos das etapas e contadores. Defaults to NO_STATS.
+
+    Returns:
+        dict: Registro da página, keys: "pagina", "num_nota", "data_pregao", "negocios_realizados" (com taxas e data pregão), "custos_nota".
+    """
+    if template:
+        extract_regioes = (
+            pl.extract_page_regions_text if fast else pl.extract_page_regions_template
+        )
+        try:
+            regioes = extract_regioes(page, template, stats)
+            _check_regioes_btg(regioes)
+        except pl.TemplateMismatch:
+            pass
+        else:
+            pagina = _parse_regioes_btg(regioes, count_page, stats)
+            if _is_pagina_consistent(pagina) and (
+                not fast or _is_valor_liquido_consistent(pagina)
+            ):
+                stats.count("fast_pages" if fast else "template_pages")
+                return pagina
+        stats.count("template_fallbacks")
+    regioes, page_template = pl.extract_page_regions(page, stats)  # Single layout pass per page
+    pagina = _parse_regioes_btg(regioes, count_page, stats)
+    if template is not None:
+        template.update(page_template)
+    return pagina
+
+
+def _parse_page_cached_btg(
+    page, count_page, cache=None, template=None, fast=False, stats=NO_STATS
+):
+    """Parse uma página consultando antes o cache de páginas pelo hash do conteúdo da página.
+
+    Args:
+        page (objeto): Página do pdfplumber.
+        count_page (int): Número da página no arquivo.
+        cache (ParseCache, optional): Cache de páginas processadas, se None não utiliza cache. Defaults to None.
+        template (dict, optional): Template de regiões, ver _parse_page_btg. Defaults to None.
+        fast (bool, optional): Lê as regiões da camada de texto, ver _parse_page_btg. Defaults to False.
+        stats (ParseStats, optional): Tempos das etapas e contadores. Defaults to NO_STATS.
+
+    Returns:
+        dict: Registro da página, mesmo formato de _parse_page_btg.
+    """
+    if cache is None:
+        return _parse_page_btg(page, count_page, template, fast, stats)
+    with stats.timer("cache"):
+        key = pcache.page_key(page, PARSER_VERSION)
+        pagina = cache.get(key)
+    if pagina is None:
+        pagina = _parse_page_btg(page, count_page, template, fast, stats)
+        with stats.timer("cache"):
+            cache.put(key, pagina)
+        return pagina
+    stats.count("cache_hits")
+    for ativo in pagina["negocios_realizados"]:  # Json keeps dates as strings
+        schema.type_negocio(ativo)
+    return {"pagina": count_page, **pagina}
+
+
+def _parse_page_range_btg(
+    path,
+    start,
+    stop,
+    cache=None,
+    use_template=False,
+    fast=False,
+    stats=None,
+    index=None,
+    window=PAGES_WINDOW,
+    max_memory=MAX_MEMORY,
+):
+    """Parse intervalo de páginas [start,stop) abrindo um handle próprio do pdfplumber, permitindo execução em outro processo.
+
+    Args:
+        path (string): Caminho do arquivo de nota do btg.
+        start (int): Primeira página do intervalo.
+        stop (int): Página final (exclusiva) do intervalo.
+        cache (ParseCache, optional): Cache de páginas processadas. Defaults to None.
+        use_template (bool, optional): Detecção de tabelas nas regiões do template aprendido na primeira página do intervalo. Defaults to False.
+        fast (bool, optional): Leitura da camada de texto nas posições do template aprendido na primeira página do intervalo. Defaults to False.
+        stats (ParseStats, optional): Stats do intervalo, preenchidas e retornadas (o processo recebe uma cópia). Defaults to None.
+        index (NotaIndex, optional): Cópia do índice de notas, ver _iter_paginas_btg. Defaults to None.
+        window (int, optional): Páginas por abertura do pdf, ver _iter_paginas_btg. Defaults to PAGES_WINDOW.
+        max_memory (int, optional): Limite de memória por abertura do pdf, ver _iter_paginas_btg. Defaults to MAX_MEMORY.
+
+    Returns:
+        lista,ParseStats: Lista de resultados de _parse_page_btg na ordem das páginas, stats (None sem stats).
+    """
+    template = {} if use_template or fast else None
+    paginas = list(
+        _iter_paginas_btg(
+            path,
+            start,
+            stop,
+            cache,
+            template,
+            fast,
+            NO_STATS if stats is None else stats,
+            index,
+            window,
+            max_memory,
+        )
+    )
+    return paginas, stats
+
+
+def iter_pdf_pages(pdf, start=0, initial_doctop=None):
+    """Páginas do pdf criadas uma a uma a partir da árvore de páginas. pdf.pages mantém todas as páginas, e o documento todos os objetos
+    resolvidos (streams de conteúdo), em memória enquanto o pdf está aberto. O doctop das páginas é o mesmo de pdf.pages.
+
+    Args:
+        pdf (objeto): Pdf aberto pelo pdfplumber sobre um stream do chamador, que não deve chamar pdf.close() (cria todas as páginas).
+        start (int, optional): Primeira página retornada. Defaults to 0.
+        initial_doctop (float, optional): Doctop da página start, conhecido de uma abertura anterior do pdf. As páginas anteriores a start
+            não são criadas. None cria as páginas anteriores para calcular o doctop. Defaults to None.
+
+    Yields:
+        int,objeto: Número da página no arquivo, página do pdfplumber.
+    """
+    pdf.doc.caching = False  # Resolved objects are released with the page
+    doctop = 0 if initial_doctop is None else initial_doctop
+    for count_page, page_obj in enumerate(PDFPage.create_pages(pdf.doc)):
+        if count_page < start and initial_doctop is not None:
+            continue
+        page = Page(pdf, page_obj, page_number=count_page + 1, initial_doctop=doctop)
+        doctop += page.height
+        try:
+            if count_page >= start:
+                yield count_page, page
+        finally:
+            page.close()  # Releases cached objects of the page
+
+
+def _iter_paginas_btg(
+    path,
+    start=0,
+    stop=None,
+    cache=None,
+    template=None,
+    fast=False,
+    stats=NO_STATS,
+    index=None,
+    window=PAGES_WINDOW,
+    max_memory=MAX_MEMORY,
+):
+    """Parse das páginas [start,stop) com memória limitada. As páginas são criadas uma a uma e liberadas após o parse. O pdf é reaberto
+    a cada window páginas, ou quando a memória residente cresceu mais que max_memory desde a abertura, liberando os caches do documento
+    (fontes, recursos). A reabertura continua da página seguinte sem criar as páginas já processadas.
+
+    Args:
+        path (string): Caminho do arquivo de nota do btg.
+        start (int, optional): Primeira página. Defaults to 0.
+        stop (int, optional): Página final (exclusiva), None até a última página. Defaults to None.
+        cache (ParseCache, optional): Cache de páginas processadas. Defaults to None.
+        template (dict, optional): Template de regiões, ver _parse_page_btg. Defaults to None.
+        fast (bool, optional): Lê as regiões da camada de texto, ver _parse_page_btg. Defaults to False.
+        stats (ParseStats, optional): Tempos das etapas e contadores. Defaults to NO_STATS.
+        index (NotaIndex, optional): Índice de notas, páginas com conteúdo já indexado não são processadas. Os registros recebem
+            "content_hash" para _register_paginas. Defaults to None.
+        window (int, optional): Páginas por abertura do pdf, None não reabre por número de páginas. Defaults to PAGES_WINDOW.
+        max_memory (int, optional): Bytes de crescimento da memória residente por abertura do pdf, None sem limite. Sem /proc (Linux)
+            não é aplicado. Defaults to MAX_MEMORY.
+
+    Yields:
+        dict: Registro da página, mesmo formato de _parse_page_btg.
+    """
+    assert window is None or window >= 1, f"Window of pages {window} must be at least 1."
+    next_page, next_doctop = start, None
+    while True:
+        memory_open = hio.memory_usage() if max_memory is not None else None
+        pages_open = 0
+        with open(path, "rb") as stream:
+            with stats.timer("open_pdf"):
+                pdf = pdfplumber.open(stream)  # pdf.close() is not used, it creates all pages of the pdf to close them
+            for count_page, page in stats.timed_iter(
+                iter_pdf_pages(pdf, next_page, next_doctop), "load_page"
+            ):
+                if stop is not None and count_page >= stop:
+                    return
+                next_page, next_doctop = count_page + 1, page.initial_doctop + page.height
+                pages_open += 1
+                if index is not None:
+                    with stats.timer("index"):
+                        page_hash = pcache.page_key(page)  # Content only, the index does not depend on the parser version
+                        duplicate = index.is_duplicate(page_hash)
+                if index is not None and duplicate:
+                    stats.count("duplicates")
+                    index.duplicates += 1
+                else:
+                    with stats.page(count_page):
+                        pagina = _parse_page_cached_btg(page, count_page, cache, template, fast, stats)
+                    stats.count("rows", len(pagina["negocios_realizados"]))
+                    if index is not None:
+                        pagina["content_hash"] = page_hash
+                    yield pagina
+                if (window is not None and pages_open >= window) or (
+                    memory_open is not None and hio.memory_usage() - memory_open > max_memory
+                ):
+                    break
+            else:
+                return
+        stats.count("reopen_pdf")
+        del pdf
+
+
+def _split_page_ranges(num_pages, workers):
+    """Divide as páginas em intervalos contíguos, alguns por worker para balancear a carga.
+
+    Args:
+        num_pages (int): Número de páginas do arquivo.
+        workers (int): Número de processos.
+
+    Returns:
+        lista (tuple): Lista de (start,stop) em ordem de páginas.
+    """
+    chunk = max(1, -(-num_pages // (workers * PAGES_CHUNKS_PER_WORKER)))
+    return [
+        (start, min(start + chunk, num_pages)) for start in range(0, num_pages, chunk)
+    ]
+
+
+def parse_notas_corretagem_btg(
+    path,
+    workers=1,
+    cache=None,
+    use_template=False,
+    fast=False,
+    stats=None,
+    stats_path=None,
+    index=None,
+    window=PAGES_WINDOW,
+    max_memory=MAX_MEMORY,
+):
     """Parse notas de corretagem btg. Extrai negócios realizados e custos por nota de corretagem.
 
     Args:
         path (string): Caminho do arquivo de nota do btg.
+        workers (int, optional): Número de processos para parse paralelo por intervalos de páginas, 1 executa em série. Defaults to 1.
+        cache (ParseCache, optional): Cache de páginas processadas, páginas sem alteração não são processadas novamente. Defaults to None.
+        use_template (bool, optional): Detecção de tabelas apenas nas regiões do template do layout, aprendido na primeira página, com fallback para a página inteira. Defaults to False.
+        fast (bool, optional): Leitura das regiões da camada de texto nas posições do template, sem detecção de tabelas. Páginas não consistentes com o valor das operações
+            e o valor líquido da nota utilizam a detecção de tabelas. Defaults to False.
+        stats (ParseStats, optional): Recebe tempos por etapa, contadores, histograma e páginas mais lentas (parse_stats), None sem instrumentação. Defaults to None.
+        stats_path (string, optional): Json onde as stats são escritas ao final do parse, cria stats se None. Defaults to None.
+        index (NotaIndex, optional): Índice persistente de notas (nota_index), páginas com conteúdo já indexado são ignoradas sem
+            análise de layout e notas reemitidas com outro conteúdo são reportadas e ignoradas. Salvo ao final do parse. Defaults to None.
+        window (int, optional): Páginas por abertura do pdf (por processo), limita a memória de pdfs muito grandes. Defaults to PAGES_WINDOW.
+        max_memory (int, optional): Bytes de crescimento da memória residente até o pdf ser reaberto (por processo). Defaults to MAX_MEMORY.
 
     Returns:
         lista (str),dict (key(str):values(str)): : lista de negócios realizados,dict de custos por nota
     """
-    resumo_nota = [
-        [
-            "Q",
-            "Negociação",
-            "C/V",
-            "Tipo Mercado",
-            "Prazo",
-            "Especificação do título",
-            "Obs. (*)",
-            "Quantidade",
-            "Preço / Ajuste",
-            "Valor Operação / Ajuste",
-            "D/C",
-            "Nr. nota",
-            "taxas",
-            "Data pregao",
-        ]
-    ]
+    assert workers >= 1, f"Number of workers {workers} must be at least 1."
+    if stats is None and stats_path is not None:
+        stats = ParseStats()
+    resumo_nota = [HEADERS_RESUMO_NOTA.copy()]
     custos_notas = {}  # Key:Num Nota, Negocios Realizados:
-    with pdfplumber.open(path) as pdf:
-        i = 0
-        count_page = 0
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            num_nota = tables[0][0][5].split()[2]
-            data_pregao = tables[0][0][8].split()[2]
-
-            # # Export for testing
-            # export_obj_as_std_out_test(
-            #     tables[1],
-            #     f"_parse_add_negocios_realizados_table_negocios_realizados_{count_page}.in",
-            # )
-            negocios_realizados = _parse_add_negocios_realizados(tables[1], num_nota)
-            assert len(resumo_nota[0]) - 2 == len(
-                negocios_realizados[0]
-            ), f"Error in parsing, incorrect shape {len(negocios_realizados[0])} of received output."
-
-            # # Export for testing
-            # export_obj_as_std_out_test(
-            #     negocios_realizados,
-            #     f"_parse_add_negocios_realizados_table_negocios_realizados_{count_page}.out",
-            # )
-
-            table_settings = {"horizontal_strategy": "lines_strict"}
-            df_custo = page.extract_tables(table_settings)
-            _parse_add_custos_notas(df_custo, custos_notas, num_nota, count_page)
-            _add_custos_notas_ativos_resumo_nota(
-                negocios_realizados, custos_notas, num_nota, resumo_nota, data_pregao
-            )
-            assert len(resumo_nota[0]) == len(
-                negocios_realizados[0]
-            ), f"Error in parsing, incorrect shape {len(negocios_realizados[0])} of received output."
-            count_page += 1
+    if workers == 1:
+        _merge_paginas(
+            iter_notas_corretagem_btg(
+                path, cache, use_template, fast, stats, index, window, max_memory
+            ),
+            resumo_nota,
+            custos_notas,
+        )
+    else:
+        with pdfplumber.open(path) as pdf:
+            num_pages = len(pdf.pages)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _parse_page_range_btg,
+                    path,
+                    start,
+                    stop,
+                    cache,
+                    use_template,
+                    fast,
+                    None if stats is None else ParseStats(stats.slowest),
+                    index,
+                    window,
+                    max_memory,
+                )
+                for start, stop in _split_page_ranges(num_pages, workers)
+            ]
+            for future in futures:  # Page order
+                paginas, stats_range = future.result()
+                if index is not None:
+                    paginas = _register_paginas(paginas, index, path)
+                _merge_paginas(paginas, resumo_nota, custos_notas)
+                if stats is not None:
+                    stats.merge(stats_range)
+    if index is not None and index.path is not None:
+        index.save()
+    if stats is not None:
+        stats.finish()
+        if stats_path is not None:
+            stats.emit(stats_path)
     return resumo_nota, custos_notas
 
 
+def _register_paginas(paginas, index, path):
+    """Registra as notas das páginas no índice, em ordem, ignorando páginas duplicadas e notas reemitidas com outro conteúdo.
+
+    Args:
+        paginas (iterable): Registros de _iter_paginas_btg com "content_hash".
+        index (NotaIndex): Índice de notas.
+        path (string): Caminho do arquivo de nota do btg.
+
+    Yields:
+        dict: Registro da página, sem "content_hash".
+    """
+    source = os.path.abspath(path)
+    for pagina in paginas:
+        page_hash = pagina.pop("content_hash")
+        if index.register(pagina["num_nota"], page_hash, source, pagina["pagina"]):
+            yield pagina
+
+
+def _merge_paginas(paginas, resumo_nota, custos_notas):
+    """Adiciona os resultados das páginas, em ordem, a resumo_nota e custos_notas.
+
+    Args:
+        paginas (iterable): Resultados de _parse_page_btg em ordem de páginas.
+        resumo_nota (list): Lista de negócios realizados que recebe as linhas.
+        custos_notas (dict): Dicionário de custos por nota.
+    """
+    for pagina in paginas:
+        custos_notas[pagina["num_nota"]] = pagina["custos_nota"]
+        resumo_nota.extend(pagina["negocios_realizados"])
+
+
+def iter_notas_corretagem_btg(
+    path,
+    cache=None,
+    use_template=False,
+    fast=False,
+    stats=None,
+    index=None,
+    window=PAGES_WINDOW,
+    max_memory=MAX_MEMORY,
+):
+    """Generator de notas de corretagem btg, retorna um registro por página assim que a página é processada.
+    As páginas são criadas uma a uma e liberadas após o parse, mantendo a memória constante independente do tamanho do pdf.
+
+    Args:
+        path (string): Caminho do arquivo de nota do btg.
+        cache (ParseCache, optional): Cache de páginas processadas. Defaults to None.
+        use_template (bool, optional): Detecção de tabelas nas regiões do template aprendido na primeira página. Defaults to False.
+        fast (bool, optional): Leitura da camada de texto nas posições do template aprendido na primeira página. Defaults to False.
+        stats (ParseStats, optional): Recebe tempos por etapa e contadores (parse_stats), None sem instrumentação. Defaults to None.
+        index (NotaIndex, optional): Índice persistente de notas, ver parse_notas_corretagem_btg. Não é salvo, o chamador salva o índice
+            depois de persistir os registros. Defaults to None.
+        window (int, optional): Páginas por abertura do pdf, ver _iter_paginas_btg. Defaults to PAGES_WINDOW.
+        max_memory (int, optional): Limite de memória por abertura do pdf, ver _iter_paginas_btg. Defaults to MAX_MEMORY.
+
+    Yields:
+        dict: Registro da página, keys: "pagina", "num_nota", "data_pregao", "negocios_realizados" (com taxas e data pregão), "custos_nota".
+    """
+    template = {} if use_template or fast else None
+    paginas = _iter_paginas_btg(
+        path,
+        0,
+        None,
+        cache,
+        template,
+        fast,
+        NO_STATS if stats is None else stats,
+        index,
+        window,
+        max_memory,
+    )
+    if index is None:
+        yield from paginas
+    else:
+        yield from _register_paginas(paginas, index, path)
+
+
+def export_notas_stream(paginas, path_negocios_realizados, path_custos_notas):
+    """Exporta registros de páginas de forma incremental, sem manter as notas em memória, repassando cada página após escrevê-la para
+    um consumidor seguinte (ex: calc_monthly_net_result._append_net_per_stock_from_stream). Gera os mesmos arquivos que run.py: csv de
+    negócios realizados (com index e header na primeira linha) e json de custos por nota. Os arquivos estão completos quando o
+    generator termina.
+
+    Args:
+        paginas (iterable): Registros de iter_notas_corretagem_btg.
+        path_negocios_realizados (string): Caminho do csv de negócios realizados.
+        path_custos_notas (string): Caminho do json de custos por nota.
+
+    Yields:
+        dict: Registro da página, escrito nos arquivos.
+    """
+    with open(path_negocios_realizados, "w", newline="", encoding="utf-8") as f_csv, open(
+        path_custos_notas, "w", encoding="utf-8"
+    ) as f_json:
+        writer = csv.writer(f_csv, lineterminator=os.linesep)  # Same as pandas and hio.append_to_csv_from_lists
+        writer.writerow([0] + HEADERS_RESUMO_NOTA)
+        ix = 1
+        separator = "{"
+        for pagina in paginas:
+            for row in pagina["negocios_realizados"]:
+                writer.writerow([ix] + row)
+                ix += 1
+            f_json.write(separator)
+            f_json.write(json.dumps(pagina["num_nota"], ensure_ascii=False))
+            f_json.write(": ")
+            f_json.write(json.dumps(pagina["custos_nota"], ensure_ascii=False))
+            separator = ", "
+            yield pagina
+        f_json.write("{}" if separator == "{" else "}")
+
+
 def main():
     data_raw_notas_path = os.path.abspath(
         os.path.join("data/raw/2020/btg/notas_corretagem/")
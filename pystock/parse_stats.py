@@ -0,0 +1,213 @@
+"""
+Instrumentation of the parse of notas de corretagem: time per stage, counters, histogram of the time per page and the slowest pages.
+Functions of the parse receive a ParseStats (or NO_STATS, whose timers are a shared no-op context) so the disabled instrumentation costs one
+method call per stage. Stats of parallel workers are merged. Emitted as json at the end of parse_notas_corretagem_btg.
+"""
+import contextlib
+import heapq
+import json
+import time
+
+# Stages of the parse, in pipeline order
+STAGES = [
+    "open_pdf",  # pdfplumber.open
+    "load_page",  # Page of the page tree
+    "cache",  # Content hash and lookup of the parse cache
+    "index",  # Content hash and lookup of the index of notas (nota_index)
+    "page_objects",  # Content stream to chars and edges (pdfminer)
+    "tables",  # Default table detection, header and negócios realizados
+    "tables_lines_strict",  # "lines_strict" table detection, blocos de custos
+    "text_layer",  # Text of the cells from the char index, regions from the text layer in fast parse
+    "negocios",  # _parse_add_negocios_realizados
+    "custos",  # Parsers of the four blocos de custos and líquido
+    "taxas",  # Allocation of taxas to the negócios realizados
+]
+PAGE_HISTOGRAM_BOUNDS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5]  # Upper bounds in seconds, last bucket is above
+SLOWEST_PAGES = 10
+
+
+class _Timer:
+    __slots__ = ("stats", "stage", "start")
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add_time(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _PageTimer(_Timer):
+    __slots__ = ()
+
+    def __exit__(self, *exc):
+        self.stats.add_page(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class ParseStats:
+    """Stats of one parse.
+
+    Args:
+        slowest (int, optional): Number of slowest pages kept. Defaults to SLOWEST_PAGES.
+    """
+
+    def __init__(self, slowest=SLOWEST_PAGES):
+        self.slowest = slowest
+        self.times = {}  # Stage: [seconds, calls]
+        self.counters = {}
+        self.histogram = [0] * (len(PAGE_HISTOGRAM_BOUNDS) + 1)
+        self.slowest_pages = []  # Heap of (seconds, page)
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def timer(self, stage):
+        """Context timing a stage.
+
+        Args:
+            stage (str): Stage, see STAGES.
+        """
+        return _Timer(self, stage)
+
+    def page(self, count_page):
+        """Context timing the whole parse of a page.
+
+        Args:
+            count_page (int): Número da página no arquivo.
+        """
+        return _PageTimer(self, count_page)
+
+    def timed_iter(self, iterable, stage):
+        """Items of iterable, the time of each next() added to stage.
+
+        Args:
+            iterable (iterable): Items, ex: pages of the pdf.
+            stage (str): Stage, see STAGES.
+
+        Yields:
+            Items of iterable.
+        """
+        iterator = iter(iterable)
+        end = object()
+        try:
+            while True:
+                with self.timer(stage):
+                    item = next(iterator, end)
+                if item is end:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def add_time(self, stage, seconds):
+        entry = self.times.get(stage)
+        if entry is None:
+            self.times[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def add_page(self, count_page, seconds):
+        self.count("pages")
+        bucket = 0
+        while (
+            bucket < len(PAGE_HISTOGRAM_BOUNDS)
+            and seconds > PAGE_HISTOGRAM_BOUNDS[bucket]
+        ):
+            bucket += 1
+        self.histogram[bucket] += 1
+        if len(self.slowest_pages) < self.slowest:
+            heapq.heappush(self.slowest_pages, (seconds, count_page))
+        else:
+            heapq.heappushpop(self.slowest_pages, (seconds, count_page))
+
+    def count(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def merge(self, other):
+        """Add the stats of other (ex: of a worker process).
+
+        Args:
+            other (ParseStats): Stats.
+        """
+        for stage, (seconds, calls) in other.times.items():
+            entry = self.times.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+        for counter, value in other.counters.items():
+            self.count(counter, value)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        for item in other.slowest_pages:
+            if len(self.slowest_pages) < self.slowest:
+                heapq.heappush(self.slowest_pages, item)
+            else:
+                heapq.heappushpop(self.slowest_pages, item)
+
+    def finish(self):
+        """Stop the wall clock of the parse."""
+        self.seconds = time.perf_counter() - self.started
+
+    def to_dict(self):
+        """Stats as dict: seconds (wall clock), stages {stage: {seconds, calls}} in STAGES order, counters, page_histogram
+        [{le: upper bound in seconds (None above the last bound), pages}], slowest_pages [{page, seconds}] slowest first.
+        """
+        stages = sorted(
+            self.times,
+            key=lambda s: (STAGES.index(s) if s in STAGES else len(STAGES), str(s)),
+        )
+        return {
+            "seconds": self.seconds,
+            "stages": {
+                stage: {"seconds": self.times[stage][0], "calls": self.times[stage][1]}
+                for stage in stages
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "page_histogram": [
+                {"le": bound, "pages": pages}
+                for bound, pages in zip(PAGE_HISTOGRAM_BOUNDS + [None], self.histogram)
+            ],
+            "slowest_pages": [
+                {"page": page, "seconds": seconds}
+                for seconds, page in sorted(self.slowest_pages, reverse=True)
+            ],
+        }
+
+    def emit(self, path=None):
+        """Write the stats as json to path, or print to stdout.
+
+        Args:
+            path (string, optional): Path to json. Defaults to None, stdout.
+        """
+        if path is None:
+            print(json.dumps(self.to_dict(), indent=1))
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+
+class _NoStats:
+    """Disabled stats, shared no-op timers."""
+
+    _null_timer = contextlib.nullcontext()
+
+    def timer(self, stage):
+        return self._null_timer
+
+    def page(self, count_page):
+        return self._null_timer
+
+    def timed_iter(self, iterable, stage):
+        return iterable
+
+    def count(self, counter, value=1):
+        pass
+
+
+NO_STATS = _NoStats()
@@ -0,0 +1,114 @@
+"""
+Schema of the negócios realizados shared by the parser of notas de corretagem (parse_notas_corretagem) and the calculator of the monthly
+net result (calc_monthly_net_result). Rows are typed once at parse time: quantities int, money float, data pregão DataBr.
+Rows read from csv (index column first) are typed by the same schema.
+"""
+import datetime
+
+import pystock.helpersio as hio
+
+
+class DataBr(datetime.date):
+    """Date printed as dd/mm/yyyy, the format of the notas de corretagem and of the csv files."""
+
+    def __str__(self):
+        return f"{self.day:02d}/{self.month:02d}/{self.year}"
+
+    @classmethod
+    def parse(cls, value):
+        """Date from string dd/mm/yyyy or datetime.date.
+
+        Args:
+            value (str or date): Date.
+
+        Returns:
+            DataBr: Date.
+        """
+        if isinstance(value, datetime.date):
+            return cls(value.year, value.month, value.day)
+        d, m, y = value.split("/")
+        return cls(int(y), int(m), int(d))
+
+
+def to_int(value):
+    """Quantity as int, non integer values raise ValueError instead of being truncated.
+
+    Args:
+        value (str or number): Quantity, ex: "1400", "1400.0", 1400
+
+    Returns:
+        int: Quantity.
+    """
+    if isinstance(value, int):
+        return value
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"Quantity {value!r} is not an integer.")
+    return int(number)
+
+
+NEGOCIOS_REALIZADOS_SCHEMA = [
+    ("Q", str),
+    ("Negociação", str),
+    ("C/V", str),
+    ("Tipo Mercado", str),
+    ("Prazo", str),
+    ("Especificação do título", str),
+    ("Obs. (*)", str),
+    ("Quantidade", int),
+    ("Preço / Ajuste", float),
+    ("Valor Operação / Ajuste", float),
+    ("D/C", str),
+    ("Nr. nota", str),
+    ("taxas", float),
+    ("Data pregao", DataBr),
+]
+HEADERS_RESUMO_NOTA = [name for name, _ in NEGOCIOS_REALIZADOS_SCHEMA]
+CONVERTERS = {int: to_int, float: float, DataBr: DataBr.parse}
+_TYPED_COLUMNS = [
+    (col, CONVERTERS[col_type])
+    for col, (_, col_type) in enumerate(NEGOCIOS_REALIZADOS_SCHEMA)
+    if col_type is not str
+]
+
+
+def col(name, offset=0):
+    """Index of the column in the rows of negócios realizados.
+
+    Args:
+        name (str): Header of the column.
+        offset (int, optional): Columns before the schema, 1 for rows read from csv (index column). Defaults to 0.
+
+    Returns:
+        int: Index of the column.
+    """
+    return HEADERS_RESUMO_NOTA.index(name) + offset
+
+
+def type_negocio(row, offset=0):
+    """Convert, in place, the columns of a row of negócios realizados to the types of the schema. Typed values are kept.
+
+    Args:
+        row (list): Row of negócios realizados.
+        offset (int, optional): Columns before the schema, 1 for rows read from csv (index column). Defaults to 0.
+
+    Returns:
+        list: The row.
+    """
+    for col_schema, convert in _TYPED_COLUMNS:
+        row[col_schema + offset] = convert(row[col_schema + offset])
+    return row
+
+
+def read_negocios_realizados_csv(path):
+    """Read csv of negócios realizados (index column and header row, as exported by run.py) with the columns typed by the schema.
+
+    Args:
+        path (string): Path to csv.
+
+    Returns:
+        list: Rows with the index column first.
+    """
+    return hio.read_csv(
+        path, skip_headers=True, func_transf_row=lambda row: type_negocio(row, 1)
+    )
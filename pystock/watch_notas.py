@@ -0,0 +1,274 @@
+"""
+Service watching the directory of raw notas de corretagem, pdfs are ingested (ingest_notas) as soon as they land on disk.
+The directory is polled by stat only, a file is queued once its size and mtime are unchanged for SETTLE_SECONDS, so a burst of writes of an
+attachment is coalesced into one ingestion. The queue is bounded: when the workers fall behind, polling waits (backpressure).
+Files are hashed and parsed in a pool of processes, rows are appended to the processed files and the manifest by the event loop, one file at
+a time. Pages already indexed (nota_index) are skipped in the pool with a copy of the index, the notas of each parsed file are registered
+in the index of the event loop, shared with ingest_notas, before its rows are appended. Queue depth, files in progress and latency (first seen to appended) are written to a status json after each event.
+
+Usage:
+    python -m pystock.watch_notas data/raw/ --workers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pystock.helpersio as hio
+from pystock import ingest_notas as ing
+from pystock import parse_notas_corretagem as pnc
+from pystock.nota_index import INDEX_FILE_NAME, NotaIndex
+
+POLL_SECONDS = 2.0
+SETTLE_SECONDS = 1.0  # Size and mtime unchanged for this time before the file is queued
+QUEUE_SIZE = 8
+WORKERS = 2
+STATUS_FILE_NAME = "status_watch_notas.json"
+
+
+def _parse_file(path, previous_sha256, cache=None, fast=False, index=None):
+    """Hash and parse a pdf, runs in the pool of processes.
+
+    Args:
+        path (string): Path to pdf.
+        previous_sha256 (string): Hash in the manifest, None if not ingested.
+        cache (ParseCache, optional): Cache of parsed pages. Defaults to None.
+        fast (bool, optional): Text layer parse, parse_notas_corretagem. Defaults to False.
+        index (NotaIndex, optional): Copy of the index of notas, indexed pages are skipped. The pages of a changed file are removed from
+            the copy before the parse. Defaults to None.
+
+    Returns:
+        dict, list: Entry of the manifest {"size", "mtime", "sha256"}, records of the pages (None if the content is unchanged), with
+            "content_hash" if index is given (parse_notas_corretagem._register_paginas).
+    """
+    stat = os.stat(path)
+    entry = {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": hio.file_sha256(path),
+    }
+    if entry["sha256"] == previous_sha256:
+        return entry, None
+    if index is None:
+        return entry, list(pnc.iter_notas_corretagem_btg(path, cache, fast=fast))
+    if previous_sha256 is not None:
+        index.remove_file(os.path.abspath(path))
+    paginas, _ = pnc._parse_page_range_btg(path, 0, None, cache, fast=fast, index=index)
+    return entry, paginas
+
+
+class WatchNotas:
+    """State of the service: manifest, files seen, queue and status.
+
+    Args:
+        raw_path (string): Root directory with pdfs, ex: data/raw/
+        processed_path_template (string, optional): Output directory with {year} placeholder. Defaults to ingest_notas.PROCESSED_PATH_TEMPLATE.
+        manifest_path (string, optional): Path to manifest json. Defaults to ingest_notas.MANIFEST_FILE_NAME in ingest_notas.processed_root.
+        status_path (string, optional): Path to status json. Defaults to STATUS_FILE_NAME in ingest_notas.processed_root.
+        index_path (string, optional): Path to index of notas json. Defaults to nota_index.INDEX_FILE_NAME in ingest_notas.processed_root.
+        workers (int, optional): Processes parsing files. Defaults to WORKERS.
+        queue_size (int, optional): Files waiting for a worker before polling waits. Defaults to QUEUE_SIZE.
+        poll_seconds (float, optional): Interval of polling. Defaults to POLL_SECONDS.
+        settle_seconds (float, optional): Time without changes before a file is queued. Defaults to SETTLE_SECONDS.
+        cache (ParseCache, optional): Cache of parsed pages. Defaults to None.
+        fast (bool, optional): Text layer parse. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        raw_path,
+        processed_path_template=ing.PROCESSED_PATH_TEMPLATE,
+        manifest_path=None,
+        status_path=None,
+        index_path=None,
+        workers=WORKERS,
+        queue_size=QUEUE_SIZE,
+        poll_seconds=POLL_SECONDS,
+        settle_seconds=SETTLE_SECONDS,
+        cache=None,
+        fast=False,
+    ):
+        assert workers >= 1, f"Number of workers {workers} must be at least 1."
+        self.raw_path = raw_path
+        self.processed_path_template = processed_path_template
+        root = ing.processed_root(processed_path_template)
+        os.makedirs(root, exist_ok=True)
+        self.manifest_path = manifest_path or os.path.join(root, ing.MANIFEST_FILE_NAME)
+        self.status_path = status_path or os.path.join(root, STATUS_FILE_NAME)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.cache = cache
+        self.fast = fast
+        self.manifest = ing._load_manifest(self.manifest_path)
+        self.index = NotaIndex(index_path or os.path.join(root, INDEX_FILE_NAME))
+        self.seen = {}  # Relative path: (size, mtime, time first seen with this stat)
+        self.pending = set()  # Queued or in progress
+        self.failed = {}  # Relative path: (size, mtime) of the failed parse, retried when the file changes
+        self.queue = None
+        self.status = {
+            "queue_depth": 0,
+            "in_progress": 0,
+            "ingested_files": 0,
+            "ingested_rows": 0,
+            "failed_files": 0,
+            "last_latency": None,
+            "mean_latency": None,
+        }
+
+    def _write_status(self):
+        self.status["queue_depth"] = self.queue.qsize()
+        self.status["updated"] = time.time()
+        tmp_path = f"{self.status_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.status, f, indent=1)
+        os.replace(tmp_path, self.status_path)
+
+    def _settled_files(self, now):
+        """Files new or changed since the manifest whose stat did not change for settle_seconds.
+
+        Args:
+            now (float): time.monotonic()
+
+        Returns:
+            list: Relative paths and time first seen.
+        """
+        settled = []
+        for rel_path in ing.scan_pdfs(self.raw_path):
+            if rel_path in self.pending:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.raw_path, rel_path))
+            except FileNotFoundError:  # Moved or deleted after the scan
+                continue
+            key = (stat.st_size, stat.st_mtime)
+            ingested = self.manifest["files"].get(rel_path)
+            if (
+                ingested is not None and (ingested["size"], ingested["mtime"]) == key
+            ) or self.failed.get(rel_path) == key:
+                continue
+            seen = self.seen.get(rel_path)
+            if seen is None or seen[:2] != key:
+                self.seen[rel_path] = key + (now,)
+            elif now - seen[2] >= self.settle_seconds:
+                settled.append((rel_path, seen[2]))
+        return settled
+
+    async def _poll(self, stop_event):
+        while not stop_event.is_set():
+            for rel_path, first_seen in self._settled_files(time.monotonic()):
+                self.pending.add(rel_path)
+                await self.queue.put((rel_path, first_seen))  # Waits while the queue is full
+                self._write_status()
+            try:
+                await asyncio.wait_for(stop_event.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            rel_path, first_seen = await self.queue.get()
+            self.status["in_progress"] += 1
+            self._write_status()
+            path = os.path.join(self.raw_path, rel_path)
+            previous = self.manifest["files"].get(rel_path)
+            try:
+                entry, paginas = await loop.run_in_executor(
+                    executor,
+                    _parse_file,
+                    path,
+                    previous and previous["sha256"],
+                    self.cache,
+                    self.fast,
+                    self.index,
+                )
+                num_rows = 0
+                if paginas is None:  # Touched only
+                    self.manifest["files"][rel_path].update(entry)
+                else:
+                    if previous is not None:  # Changed, its notas are indexed again
+                        self.index.remove_file(os.path.abspath(path))
+                    paginas = list(pnc._register_paginas(paginas, self.index, path))
+                    num_rows = ing._ingest_paginas(
+                        rel_path, entry, paginas, self.manifest, self.processed_path_template
+                    )
+                    print(f"Ingested {rel_path}: {num_rows} negocios realizados.")
+            except Exception as e:  # Broken or unknown pdf, rows that cannot be replaced, the service keeps running
+                print(f"Failed to ingest {rel_path}: {e!r}")
+                self.index = NotaIndex(self.index.path)  # Notas registered for the failed file are dropped
+                stat = self.seen.get(rel_path)
+                self.failed[rel_path] = stat[:2] if stat else None
+                self.status["failed_files"] += 1
+            else:
+                ing._save_manifest(self.manifest, self.manifest_path)
+                self.index.save()  # After the rows are persisted, an interrupted ingestion parses the file again
+                self.failed.pop(rel_path, None)
+                latency = time.monotonic() - first_seen
+                num_files = self.status["ingested_files"]
+                mean = self.status["mean_latency"] or 0.0
+                self.status["ingested_files"] = num_files + 1
+                self.status["ingested_rows"] += num_rows
+                self.status["last_latency"] = latency
+                self.status["mean_latency"] = (mean * num_files + latency) / (
+                    num_files + 1
+                )
+            finally:
+                self.pending.discard(rel_path)
+                self.status["in_progress"] -= 1
+                self.queue.task_done()
+                self._write_status()
+
+    async def run(self, stop_event=None):
+        """Watch until stop_event is set, files in the queue are ingested before returning.
+
+        Args:
+            stop_event (asyncio.Event, optional): Stops the service. Defaults to None, runs forever.
+        """
+        hio.assert_exist_path(self.raw_path)
+        stop_event = stop_event or asyncio.Event()
+        self.queue = asyncio.Queue(self.queue_size)
+        self._write_status()
+        with ProcessPoolExecutor(self.workers) as executor:
+            workers = [
+                asyncio.ensure_future(self._work(executor)) for _ in range(self.workers)
+            ]
+            try:
+                await self._poll(stop_event)
+                await self.queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                ing._save_manifest(self.manifest, self.manifest_path)
+                self._write_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest notas de corretagem as they land in the directory.")
+    parser.add_argument("raw_path", nargs="?", default="data/raw/")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS)
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS)
+    parser.add_argument("--fast", action="store_true")
+    args = parser.parse_args()
+    service = WatchNotas(
+        os.path.abspath(args.raw_path),
+        workers=args.workers,
+        queue_size=args.queue_size,
+        poll_seconds=args.poll,
+        settle_seconds=args.settle,
+        fast=args.fast,
+    )
+    try:
+        asyncio.run(service.run())
+    except KeyboardInterrupt:
+        print("Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,21 @@ import os
 from pystock import parse_notas_corretagem as pnc
 from pystock import helpersio as hio
 from pystock import calc_monthly_net_result as cmnr
+from pystock import net_per_stock_engine as engine
+from pystock import ingest_notas as ing
+from pystock import broker_parsers as bp
+from pystock import schema_notas as schema
+from pystock.custos_table import CustosNotas
+from pystock.net_per_stock_table import NetPerStock
+from pystock import fee_allocation as fa
+from pystock.parse_cache import ParseCache
 
 
 def calc_monthly_net_result_per_stock(
-    CUR_YEAR, data_processed_notas_path_cur_year, data_processed_notas_path_prev_year
+    CUR_YEAR,
+    data_processed_notas_path_cur_year,
+    data_processed_notas_path_prev_year,
+    taxas_policy=None,
 ):
 
     PREV_YEAR = CUR_YEAR - 1
@@ -20,28 +31,133 @@ def calc_monthly_net_result_per_stock(
         skip_headers=True,
         func_transf_row=cmnr._transform_str_numeric_read_negocios_realizados,
     )
-    try:
-        net_per_stock = hio.read_csv(
-            os.path.join(
-                data_processed_notas_path_prev_year,
-                f"net_per_stock_year_balance{PREV_YEAR}.csv",
-            ),
-            skip_headers=True,
-            func_transf_row=cmnr._transform_str_numeric_read_net_per_stock,
+    if taxas_policy is not None:  # Reallocate the taxas from the custos of the notas, fee_allocation.POLICIES
+        custos = ing.load_custos_notas(data_processed_notas_path_cur_year, CUR_YEAR)
+        fa.apply_taxas(negocios_realizados, custos, taxas_policy, offset=1)
+    net_per_stock = cmnr.read_net_per_stock_year_balance(
+        os.path.join(
+            data_processed_notas_path_prev_year,
+            f"net_per_stock_year_balance{PREV_YEAR}.csv",
         )
-    except AssertionError:
-        print("No previous stock data found.")
-        net_per_stock = []
+    )
+    net_per_stock = NetPerStock(net_per_stock)  # Typed table, rows are views
+    month_index = cmnr.index_months(negocios_realizados)  # Rows per month, built once
+    positions = engine.Positions(net_per_stock)  # Latest position per ticker
     # TODO:Fix range of 1,13. Verify the potential breaks given the change of the year.
     for i in range(1, 13):
         if i < 10:
             date = f"0{i}/{CUR_YEAR}"
         else:
             date = f"{i}/{CUR_YEAR}"
-        cmnr._append_net_per_stock_for_month(net_per_stock, date, negocios_realizados)
+        cmnr._append_net_per_stock_for_month(
+            net_per_stock, date, negocios_realizados, month_index, positions
+        )
     return net_per_stock
 
 
+def parse_calc_monthly_net_result_per_stock_stream(
+    path_notas,
+    CUR_YEAR,
+    data_processed_notas_path_cur_year,
+    data_processed_notas_path_prev_year,
+    **kwargs,
+):
+    """Parse the notas page by page, writing negocios_realizados_{year}.csv and custos_notas{year}.json and calculating net_per_stock
+    from the same stream. Only the negócios of one month are kept in memory.
+
+    Args:
+        path_notas (string): Pdf of the notas de corretagem of CUR_YEAR.
+        CUR_YEAR (int): Year of the notas.
+        data_processed_notas_path_cur_year (string): Directory of the processed files of CUR_YEAR.
+        data_processed_notas_path_prev_year (string): Directory of the processed files of the previous year (year balance).
+        **kwargs: Options of the parser of the broker, see broker_parsers.iter_notas_corretagem.
+
+    Returns:
+        NetPerStock: Table net_per_stock of CUR_YEAR.
+    """
+    PREV_YEAR = CUR_YEAR - 1
+    net_per_stock = NetPerStock(
+        cmnr.read_net_per_stock_year_balance(
+            os.path.join(
+                data_processed_notas_path_prev_year,
+                f"net_per_stock_year_balance{PREV_YEAR}.csv",
+            )
+        )
+    )
+    paginas = pnc.export_notas_stream(
+        bp.iter_notas_corretagem(path_notas, **kwargs),
+        os.path.join(data_processed_notas_path_cur_year, f"negocios_realizados_{CUR_YEAR}.csv"),
+        os.path.join(data_processed_notas_path_cur_year, f"custos_notas{CUR_YEAR}.json"),
+    )
+    cmnr._append_net_per_stock_from_stream(net_per_stock, paginas)
+    return net_per_stock
+
+
+def calc_monthly_net_result_per_stock_years(
+    years, processed_path_template=ing.PROCESSED_PATH_TEMPLATE, taxas_policy=None
+):
+    """Net per stock of consecutive years in one pass (calc_monthly_net_result.calc_net_per_stock_years), the balance of each year is
+    passed in memory to the next one. Only the year balance before the first year is read from disk. Years without
+    negocios_realizados_{year}.csv are skipped and carry the balance forward.
+
+    Args:
+        years (iterable): Consecutive years, ex: range(2019, 2021).
+        processed_path_template (string, optional): Directory of the processed files with {year} placeholder. Defaults to ingest_notas.PROCESSED_PATH_TEMPLATE.
+        taxas_policy (str, optional): Allocation of the taxas, fee_allocation.POLICIES. Defaults to None, parsed taxas.
+
+    Returns:
+        dict: year: {"net_per_stock", "net_per_stock_year_balance", "monthly_profit_loss"}
+    """
+    years = list(years)
+    negocios_realizados = []
+    for year in years:
+        path = os.path.abspath(processed_path_template.format(year=year))
+        path_negocios = os.path.join(path, f"negocios_realizados_{year}.csv")
+        if not os.path.exists(path_negocios):
+            print(f"No negocios realizados found for {year}, balance carried forward.")
+            continue
+        rows = schema.read_negocios_realizados_csv(path_negocios)
+        if taxas_policy is not None:
+            custos = ing.load_custos_notas(path, year)
+            fa.apply_taxas(rows, custos, taxas_policy, offset=1)
+        negocios_realizados.extend(rows)
+    prev_year = years[0] - 1
+    net_per_stock_year_balance = cmnr.read_net_per_stock_year_balance(
+        os.path.join(
+            os.path.abspath(processed_path_template.format(year=prev_year)),
+            f"net_per_stock_year_balance{prev_year}.csv",
+        )
+    )
+    return cmnr.calc_net_per_stock_years(negocios_realizados, net_per_stock_year_balance, years)
+
+
+def export_net_per_stock_year(result, year, path):
+    """Write net_per_stock{year}.csv, net_per_stock_year_balance{year}.csv and monthly_profit_loss_{year}.csv.
+
+    Args:
+        result (dict): Tables of the year from calc_monthly_net_result_per_stock_years.
+        year (int): Year.
+        path (string): Directory of the processed files of the year.
+    """
+    result["net_per_stock"].to_pandas().to_csv(
+        os.path.join(path, f"net_per_stock{year}.csv"),
+        header=cmnr.HEADERS_TABLE_NET_PER_STOCK,
+        index=False,
+    )
+    pd.DataFrame(result["net_per_stock_year_balance"]).to_csv(
+        os.path.join(path, f"net_per_stock_year_balance{year}.csv"),
+        header=cmnr.HEADERS_TABLE_NET_PER_STOCK
+        if result["net_per_stock_year_balance"]
+        else 0,
+        index=False,
+    )
+    pd.DataFrame(result["monthly_profit_loss"]).to_csv(
+        os.path.join(path, f"monthly_profit_loss_{year}.csv"),
+        header=cmnr.HEADERS_MONTHLY_PROFIT_LOSS if result["monthly_profit_loss"] else 0,
+        index=False,
+    )
+
+
 def main():
     CUR_YEAR = 2020
 
@@ -61,14 +177,55 @@ def main():
     hio.assert_exist_path(data_processed_notas_path_cur_year)
     hio.assert_exist_path(test_data_path)
 
+    # Ingest new or changed Notas de corretagem found in data/raw/, appending to the processed files per year
+    INGEST_NOTAS_CORRETAGEM = False
+    if INGEST_NOTAS_CORRETAGEM:
+        ing.ingest_notas_corretagem(
+            os.path.abspath(os.path.join("data/raw/")),
+            cache=ParseCache(os.path.abspath(os.path.join("data/cache/parse_notas/"))),
+        )
+
     # Parse Notas de corretagem
     PARSE_NOTAS_CORRETAGEM = False
+    PARSE_WORKERS = 1  # Number of processes parsing page ranges in parallel
+    PARSE_CACHE_PATH = os.path.abspath(os.path.join("data/cache/parse_notas/"))
+    PARSE_USE_TEMPLATE = False  # Table detection on the crop regions of the layout template, falls back to the full page
+    PARSE_FAST = False  # Reads the text layer on the positions of the template, pages failing the totals of the nota use table detection
+    PARSE_PAGES_WINDOW = None  # Pages per opening of the pdf, bounds the memory of very large pdfs
+    PARSE_MAX_MEMORY = None  # Bytes of resident memory growth before the pdf is reopened
+    PARSE_STREAM = False  # Parses page by page writing the csv and json below and calculating net_per_stock from the same stream, the notas are not kept in memory
+    PARSE_STATS = False  # Writes time per stage, counters and slowest pages of the parse to parse_stats_{year}.json
     NEGOCIOS_REALIZADOS_EXPORT_RESULTS = False
     NEGOCIOS_REALIZADOS_EXPORT_FOR_TESTS = False
     if PARSE_NOTAS_CORRETAGEM:
         inputPath = os.path.join(data_raw_notas_path, f"notas_operacoes_{CUR_YEAR}.pdf")
-        negocios_realizados, custos_notas = pnc.parse_notas_corretagem_btg(inputPath)
+        negocios_realizados, custos_notas = bp.parse_notas_corretagem(
+            inputPath,
+            workers=PARSE_WORKERS,
+            cache=ParseCache(PARSE_CACHE_PATH),
+            use_template=PARSE_USE_TEMPLATE,
+            fast=PARSE_FAST,
+            window=PARSE_PAGES_WINDOW,
+            max_memory=PARSE_MAX_MEMORY,
+            stats_path=os.path.join(
+                data_processed_notas_path_cur_year, f"parse_stats_{CUR_YEAR}.json"
+            )
+            if PARSE_STATS
+            else None,
+        )
         negocios_realizados_df = pd.DataFrame(negocios_realizados)
+    if PARSE_STREAM:
+        net_per_stock = parse_calc_monthly_net_result_per_stock_stream(
+            os.path.join(data_raw_notas_path, f"notas_operacoes_{CUR_YEAR}.pdf"),
+            CUR_YEAR,
+            data_processed_notas_path_cur_year,
+            data_processed_notas_path_prev_year,
+            cache=ParseCache(PARSE_CACHE_PATH),
+            use_template=PARSE_USE_TEMPLATE,
+            fast=PARSE_FAST,
+            window=PARSE_PAGES_WINDOW,
+            max_memory=PARSE_MAX_MEMORY,
+        )
     if NEGOCIOS_REALIZADOS_EXPORT_RESULTS:
         negocios_realizados_df.to_csv(
             os.path.join(
@@ -83,6 +240,11 @@ def main():
                 data_processed_notas_path_cur_year, f"custos_notas{CUR_YEAR}.json"
             ),
         )
+        CustosNotas.from_negocios_realizados(custos_notas, negocios_realizados).save(
+            os.path.join(
+                data_processed_notas_path_cur_year, f"custos_notas{CUR_YEAR}.npz"
+            )
+        )
     if NEGOCIOS_REALIZADOS_EXPORT_FOR_TESTS:  # Export for testing
         hio.export_object_as_std_out(
             negocios_realizados,
@@ -96,18 +258,21 @@ def main():
     CALC_MONTHLY_NET_RESULT_PER_STOCK = True
     EXPORT_NET_PER_STOCK = True
     EXPORT_NET_PER_STOCK_YEAR_BALANCE = True
+    TAXAS_POLICY = None  # Allocation of the taxas of the notas to the negócios ("nota", "valor", "quantidade", "igual"), None keeps the parsed taxas
 
     if CALC_MONTHLY_NET_RESULT_PER_STOCK:
-        net_per_stock = calc_monthly_net_result_per_stock(
-            CUR_YEAR,
-            data_processed_notas_path_cur_year,
-            data_processed_notas_path_prev_year,
-        )
+        if not PARSE_STREAM:  # The stream parse calculated net_per_stock with the parsed taxas
+            net_per_stock = calc_monthly_net_result_per_stock(
+                CUR_YEAR,
+                data_processed_notas_path_cur_year,
+                data_processed_notas_path_prev_year,
+                TAXAS_POLICY,
+            )
         net_per_stock_year_balance = cmnr._create_net_per_stock_year_balance(
             net_per_stock
         )
     if EXPORT_NET_PER_STOCK:
-        net_per_stock_df = pd.DataFrame(net_per_stock)
+        net_per_stock_df = net_per_stock.to_pandas()  # Numeric columns without copy
         net_per_stock_df.to_csv(
             os.path.join(
                 data_processed_notas_path_cur_year, f"net_per_stock{CUR_YEAR}.csv"
@@ -151,7 +316,17 @@ def main():
             header=cmnr.HEADERS_MONTHLY_PROFIT_LOSS,
             index=False,
         )
-        
+
+
+    # Calculate the net result per stock of several years in one pass, the balance of each year is passed in memory to the next one
+    CALC_YEARS = None  # Consecutive years, ex: range(2019, CUR_YEAR + 1). None computes CUR_YEAR only, above
+    if CALC_YEARS:
+        results = calc_monthly_net_result_per_stock_years(CALC_YEARS, taxas_policy=TAXAS_POLICY)
+        for year, result in results.items():
+            path = os.path.abspath(ing.PROCESSED_PATH_TEMPLATE.format(year=year))
+            os.makedirs(path, exist_ok=True)
+            export_net_per_stock_year(result, year, path)
+
 
 if __name__ == "__main__":
     main()
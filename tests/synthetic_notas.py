@@ -0,0 +1,338 @@
+"""
+Generator of synthetic notas de corretagem in the BTG layout (one nota per page), written as PDF with ruled tables so the whole parse path
+(table detection, template, text layer) runs on them, and tables of negocios_realizados as read from csv for the monthly calc.
+Used by tests and benchmarks.
+
+Usage:
+    python tests/synthetic_notas.py path.pdf --pages 1000 --trades 5 --tickers PETR4 VALE3 --year 2020
+"""
+import argparse
+import random
+
+from context import pystock
+from pystock import schema_notas as schema
+
+TICKERS = ["PETR4", "VALE3", "ITUB4", "BBDC4", "ABEV3", "WEGE3"]
+TICKERS_NEGOCIOS_REALIZADOS = ["PETR4 PN", "VALE3 ON", "ITUB4 PN", "BBDC4 PN", "ABEV3 ON"]
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+TAXA_LIQUIDACAO = 0.00025
+TAXA_EMOLUMENTOS = 0.00005
+HEADER_CELLS_X = [20 + i * 58 for i in range(9)] + [575]
+NEGOCIOS_COLS_X = [20, 30, 80, 95, 135, 150, 260, 280, 330, 380, 450, 470]
+NEGOCIOS_HEADER = [
+    "Q",
+    "Negociação",
+    "C/V",
+    "Tipo mercado",
+    "Prazo",
+    "Especificação do título",
+    "Obs. (*)",
+    "Quantidade",
+    "Preço / Ajuste",
+    "Valor Operação / Ajuste",
+    "D/C",
+]
+ROW_HEIGHT = 12
+LINE_HEIGHT = 8
+CUSTOS_X = (20, 250, 490)  # Left, middle and right vertical lines of the blocos de custos
+
+
+def _escape(s):
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text(x, y, s, size=6):
+    return f"BT /F1 {size} Tf {x:.2f} {y:.2f} Td ({_escape(s)}) Tj ET"
+
+
+def _line(x0, y0, x1, y1):
+    return f"{x0:.2f} {y0:.2f} m {x1:.2f} {y1:.2f} l S"
+
+
+def format_brl(value):
+    """Format number as 1.234,56
+
+    Args:
+        value (float): Number.
+
+    Returns:
+        str: Formatted number.
+    """
+    return f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _parse_brl(value):
+    return float(value.replace(".", "").replace(",", "."))
+
+
+def make_negocios(rng, num_trades, tickers):
+    """Random negócios realizados of a nota, columns of NEGOCIOS_HEADER.
+
+    Args:
+        rng (random.Random): Random generator.
+        num_trades (int): Number of negócios.
+        tickers (list): Tickers to choose from.
+
+    Returns:
+        list: Rows of strings.
+    """
+    negocios = []
+    for _ in range(num_trades):
+        quantidade = rng.randint(1, 20) * 100
+        preco = round(rng.uniform(5, 80), 2)
+        c_v = rng.choice("CV")
+        negocios.append(
+            [
+                "",
+                "1-BOVESPA",
+                c_v,
+                "VISTA",
+                "",
+                f"{rng.choice(tickers)} ON NM",
+                "",
+                f"{quantidade:,}".replace(",", "."),
+                format_brl(preco),
+                format_brl(quantidade * preco),
+                "D" if c_v == "C" else "C",
+            ]
+        )
+    return negocios
+
+
+def make_negocios_realizados(num_rows, year=2020, seed=0, tickers=TICKERS_NEGOCIOS_REALIZADOS):
+    """Rows of negocios_realizados as read from csv (index column first), sorted by date over the months of the year, four negócios per nota.
+
+    Args:
+        num_rows (int): Number of negócios.
+        year (int, optional): Year of the data pregão. Defaults to 2020.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+        tickers (list, optional): Tickers to choose from. Defaults to TICKERS_NEGOCIOS_REALIZADOS.
+
+    Returns:
+        list: Rows typed by schema_notas.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(num_rows):
+        day = i * 12 * 28 // num_rows
+        quantidade = rng.randint(1, 20) * 100
+        preco = round(rng.uniform(5, 80), 2)
+        c_v = rng.choice("CCV")
+        rows.append(
+            [str(i + 1), "", "1-BOVESPA", c_v, "VISTA", "", rng.choice(tickers), "", quantidade, preco,
+             round(quantidade * preco, 2), "D" if c_v == "C" else "C", str(1000 + i // 4),
+             round(quantidade * preco * 0.0003, 2), schema.DataBr(year, day // 28 + 1, day % 28 + 1)]
+        )
+    return rows
+
+
+def _blocos_custos(negocios, data_pregao):
+    """Text lines of the blocos de custos, consistent with the negócios (valor das operações and valor líquido).
+
+    Returns:
+        list: Lines of blocos resumo dos negócios, clearing, bolsa, corretagem and líquido.
+    """
+    compras = sum(_parse_brl(row[9]) for row in negocios if row[2] == "C")
+    vendas = sum(_parse_brl(row[9]) for row in negocios if row[2] == "V")
+    total = compras + vendas
+    liquidacao = round(total * TAXA_LIQUIDACAO, 2)
+    emolumentos = round(total * TAXA_EMOLUMENTOS, 2)
+    liquido = round(vendas - compras - liquidacao - emolumentos, 2)
+    return [
+        [
+            "Debêntures 0,00",
+            f"Vendas à vista {format_brl(vendas)}",
+            f"Compras à vista {format_brl(compras)}",
+            "Opções - compras 0,00",
+            "Opções - vendas 0,00",
+            "Operações à termo 0,00",
+            "Valor das oper. c/ títulos públ. (v. nom.) 0,00",
+            f"Valor das operações {format_brl(total)}",
+        ],
+        [
+            "Clearing",
+            f"Valor líquido das operações {format_brl(abs(vendas - compras))} D",
+            f"Taxa de liquidação {format_brl(liquidacao)} D",
+            "Taxa de Registro 0,00 D",
+            f"Total CBLC {format_brl(abs(vendas - compras) + liquidacao)} D",
+        ],
+        [
+            "Bolsa",
+            "Taxa de termo/opções 0,00 D",
+            "Taxa A.N.A. 0,00 D",
+            f"Emolumentos {format_brl(emolumentos)} D",
+            f"Total Bovespa / Soma {format_brl(emolumentos)} D",
+        ],
+        [
+            "Corretagem / Despesas",
+            "Clearing 0,00",
+            "Execução 0,00",
+            "Execução casa 0,00",
+            "ISS (SÃO PAULO) 0,00",
+            "I.R.R.F. s/ operações, base R$ 0,00 0,00",
+            "Outras Bovespa 0,00",
+            "Total Corretagem / Despesas 0,00 D",
+        ],
+        [
+            f"Líquido para {data_pregao} {format_brl(abs(liquido))} {'C' if liquido >= 0 else 'D'}"
+        ],
+    ]
+
+
+def page_content(num_nota, data_pregao, negocios):
+    """Content stream of one page of nota de corretagem.
+
+    Args:
+        num_nota (int): Número da nota.
+        data_pregao (str): Data pregão dd/mm/yyyy.
+        negocios (list): Rows of make_negocios.
+
+    Returns:
+        bytes: Content stream.
+    """
+    ops = ["0.5 w"]
+    # Header, cells drawn as rectangles
+    top, bottom = PAGE_HEIGHT - 30, PAGE_HEIGHT - 60
+    header = ["NOTA DE", "CORRETAGEM", "BTG", "Pactual", "Folha 1", f"Nr. nota {num_nota}", "", "", f"Data pregão {data_pregao}"]
+    for i, text in enumerate(header):
+        x0, x1 = HEADER_CELLS_X[i], HEADER_CELLS_X[i + 1]
+        ops.append(f"{x0:.2f} {bottom:.2f} {x1 - x0:.2f} {top - bottom:.2f} re S")
+        if text:
+            ops.append(_text(x0 + 2, bottom + 12, text))
+    # Negócios realizados, ruled lines
+    y0 = PAGE_HEIGHT - 80
+    num_rows = len(negocios) + 1
+    for r in range(num_rows + 1):
+        ops.append(_line(NEGOCIOS_COLS_X[0], y0 - r * ROW_HEIGHT, NEGOCIOS_COLS_X[-1], y0 - r * ROW_HEIGHT))
+    for x in NEGOCIOS_COLS_X:
+        ops.append(_line(x, y0, x, y0 - num_rows * ROW_HEIGHT))
+    for r, row in enumerate([NEGOCIOS_HEADER] + negocios):
+        for c, text in enumerate(row):
+            if text:
+                ops.append(
+                    _text(
+                        NEGOCIOS_COLS_X[c] + 1,
+                        y0 - (r + 1) * ROW_HEIGHT + 4,
+                        text[:14] if r == 0 else text,
+                        4 if r == 0 else 5,
+                    )
+                )
+    # Blocos de custos, title row then clearing, bolsa, corretagem and líquido on the right
+    resumo, *blocos_direita = _blocos_custos(negocios, data_pregao)
+    xl, xm, xr = CUSTOS_X
+    ys = [y0 - num_rows * ROW_HEIGHT - 30]
+    for height in [14] + [len(bloco) * LINE_HEIGHT + 4 for bloco in blocos_direita]:
+        ys.append(ys[-1] - height)
+    for y in ys:
+        ops.append(_line(xm, y, xr, y))
+    for y in (ys[0], ys[1], ys[-1]):
+        ops.append(_line(xl, y, xm, y))
+    for x in CUSTOS_X:
+        ops.append(_line(x, ys[0], x, ys[-1]))
+    ops.append(_text(xl + 2, ys[1] + 4, "Resumo dos Negócios"))
+    ops.append(_text(xm + 2, ys[1] + 4, "Resumo Financeiro"))
+    for k, text in enumerate(resumo):
+        ops.append(_text(xl + 2, ys[1] - (k + 1) * LINE_HEIGHT, text))
+    for b, bloco in enumerate(blocos_direita):
+        for k, text in enumerate(bloco):
+            ops.append(_text(xm + 2, ys[b + 1] - (k + 1) * LINE_HEIGHT, text))
+    return "\n".join(ops).encode("cp1252")
+
+
+def _data_pregao(count_page, pages, year):
+    """Dates increase with the pages, spread over the months of the year (28 days per month)."""
+    day_index = count_page * 12 * 28 // max(pages, 1)
+    return f"{day_index % 28 + 1:02d}/{day_index // 28 + 1:02d}/{year}"
+
+
+def write_notas_pdf(
+    path,
+    pages=3,
+    trades_per_page=5,
+    tickers=TICKERS,
+    year=2020,
+    seed=0,
+    first_nota=1000,
+    pages_per_nota=1,
+):
+    """Write a pdf of synthetic notas de corretagem btg, pages_per_nota pages per nota. Pages are written one at a time.
+
+    Args:
+        path (string): Output path.
+        pages (int, optional): Number of pages. Defaults to 3.
+        trades_per_page (int or tuple, optional): Negócios per page, or (min,max) random per page. Defaults to 5.
+        tickers (list, optional): Tickers of the negócios. Defaults to TICKERS.
+        year (int, optional): Year of the data pregão. Defaults to 2020.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+        first_nota (int, optional): Número of the nota of the first page, increasing per nota. Defaults to 1000.
+        pages_per_nota (int, optional): Consecutive pages with the same número and data pregão. Defaults to 1.
+
+    Returns:
+        int: Number of negócios realizados written.
+    """
+    assert pages >= 1, f"Number of pages {pages} must be at least 1."
+    rng = random.Random(seed)
+    num_negocios = 0
+    offsets = []
+    with open(path, "wb") as f:
+
+        def write_obj(body):
+            offsets.append(f.tell())
+            f.write(f"{len(offsets)} 0 obj\n".encode() + body + b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        # 1 catalog, 2 pages, 3 font, per page: page object (4+2i) and content (5+2i)
+        kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+        write_obj(b"<< /Type /Catalog /Pages 2 0 R >>")
+        write_obj(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+        write_obj(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        for count_page in range(pages):
+            if isinstance(trades_per_page, int):
+                num_trades = trades_per_page
+            else:
+                num_trades = rng.randint(*trades_per_page)
+            negocios = make_negocios(rng, num_trades, tickers)
+            num_negocios += len(negocios)
+            content = page_content(
+                first_nota + count_page // pages_per_nota,
+                _data_pregao(count_page // pages_per_nota, pages // pages_per_nota, year),
+                negocios,
+            )
+            write_obj(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * count_page} 0 R >>".encode()
+            )
+            write_obj(
+                f"<< /Length {len(content)} >>\nstream\n".encode()
+                + content
+                + b"\nendstream"
+            )
+        xref = f.tell()
+        f.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(
+            f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+        )
+    return num_negocios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a pdf of synthetic notas de corretagem btg.")
+    parser.add_argument("path")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--trades", type=int, nargs="+", default=[5], help="Negócios per page, or min max.")
+    parser.add_argument("--tickers", nargs="+", default=TICKERS)
+    parser.add_argument("--year", type=int, default=2020)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    trades_per_page = args.trades[0] if len(args.trades) == 1 else tuple(args.trades[:2])
+    num_negocios = write_notas_pdf(
+        args.path, args.pages, trades_per_page, args.tickers, args.year, args.seed
+    )
+    print(f"Written {args.pages} pages, {num_negocios} negocios realizados to {args.path}.")
+
+
+if __name__ == "__main__":
+    main()
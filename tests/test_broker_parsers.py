@@ -0,0 +1,52 @@
+import unittest
+from context import pystock
+from pystock import broker_parsers as bp
+from pystock import parse_notas_corretagem as pnc
+import synthetic_notas as sn
+import os
+import tempfile
+
+
+class TestBrokerParsers(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_detect_broker(self):
+        """
+        Test the fingerprint of the header of the first page selects the btg parser.
+        """
+        print("detect_broker")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 2)
+            self.assertEqual(bp.detect_broker(path), "btg")
+            self.assertEqual(bp.detect_broker(path), "btg")  # Cached
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_parse_notas_corretagem(self):
+        """
+        Test parse through the registry matches the btg parser, unknown brokers raise UnknownBrokerError.
+        """
+        print("parse_notas_corretagem")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 4)
+            negocios_realizados, custos_notas = pnc.parse_notas_corretagem_btg(path)
+            negocios_realizados_reg, custos_notas_reg = bp.parse_notas_corretagem(path)
+            self.assertListEqual(negocios_realizados, negocios_realizados_reg)
+            self.assertEqual(repr(custos_notas), repr(custos_notas_reg))
+            self.assertListEqual(pnc.HEADERS_RESUMO_NOTA, negocios_realizados_reg[0])
+            with self.assertRaises(bp.UnknownBrokerError):
+                bp.parse_notas_corretagem(path, broker="unknown")
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
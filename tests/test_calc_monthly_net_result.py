@@ -0,0 +1,190 @@
+import unittest
+from context import pystock
+from pystock import calc_monthly_net_result as cmnr
+from pystock import schema_notas as schema
+from pystock import net_per_stock_engine as engine
+from pystock import helpersio as hio
+from synthetic_notas import make_negocios_realizados
+import os
+import tempfile
+import pandas as pd
+
+
+class TestCalcMonthlyNetResult(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_index_months(self):
+        """
+        Test the index of months has the range of rows of each month and the monthly calc is the same with or without it.
+        """
+        print("index_months")
+        negocios_realizados = make_negocios_realizados(200)
+        month_index = cmnr.index_months(negocios_realizados)
+        self.assertListEqual(sorted(month_index), [(2020, m) for m in range(1, 13)])
+        self.assertEqual(month_index[(2020, 1)][0], 0)
+        self.assertEqual(month_index[(2020, 12)][1], len(negocios_realizados))
+        for (year, month), (lo, hi) in month_index.items():
+            self.assertTrue(all(row[14].month == month for row in negocios_realizados[lo:hi]))
+        net_per_stock, net_per_stock_index = [], []
+        for m in range(1, 13):
+            cmnr._append_net_per_stock_for_month(net_per_stock, f"{m:02d}/2020", negocios_realizados)
+            cmnr._append_net_per_stock_for_month(
+                net_per_stock_index, f"{m:02d}/2020", negocios_realizados, month_index
+            )
+        self.assertListEqual(net_per_stock, net_per_stock_index)
+        self.assertDictEqual(cmnr.index_months([]), {})
+
+    def test_group_month_ticker(self):
+        """
+        Test the groups of the engine are the sums of a loop over the negocios of each ticker of the month, tickers in order of first negocio.
+        """
+        print("group_month_ticker")
+        negocios_realizados = make_negocios_realizados(300, seed=1)
+        expected = []
+        for (year, month), (lo, hi) in cmnr.index_months(negocios_realizados).items():
+            tickers = list(dict.fromkeys(row[6] for row in negocios_realizados[lo:hi]))
+            for ticker in tickers:
+                buy_units, buy_value, sell_units, sell_value, sell_value_with_ops_cost = 0, 0.0, 0, 0.0, 0.0
+                for row in negocios_realizados[lo:hi]:
+                    if row[6] != ticker:
+                        continue
+                    if row[3] == "C":
+                        buy_units += row[8]
+                        buy_value += row[10] + row[13]
+                    else:
+                        sell_units += row[8]
+                        sell_value += row[10]
+                        sell_value_with_ops_cost += sell_value + row[13]
+                expected.append(
+                    (year, month, ticker, buy_units, buy_value, sell_units, sell_value, sell_value_with_ops_cost)
+                )
+        self.assertListEqual(engine.group_month_ticker(negocios_realizados), expected)
+        lo, hi = cmnr.index_months(negocios_realizados)[(2020, 3)]
+        self.assertListEqual(
+            engine.group_month_ticker(negocios_realizados, lo, hi),
+            [group for group in expected if group[1] == 3],
+        )
+        self.assertListEqual(engine.group_month_ticker([]), [])
+
+    def test_positions(self):
+        """
+        Test the latest position per ticker is the one of the backwards scan of net_per_stock and is loaded from a year balance csv.
+        """
+        print("positions")
+        negocios_realizados = make_negocios_realizados(200, seed=2)
+        net_per_stock = []
+        positions = engine.Positions()
+        for m in range(1, 13):
+            cmnr._append_net_per_stock_for_month(
+                net_per_stock, f"{m:02d}/2020", negocios_realizados, positions=positions
+            )
+        tickers = {row[1] for row in net_per_stock}
+        self.assertEqual(len(positions), len(tickers))
+        for ticker in tickers:
+            latest = next(row for row in reversed(net_per_stock) if row[1] == ticker)  # Backwards scan
+            self.assertTupleEqual(positions.get(ticker), (latest[-2], latest[-1]))
+        self.assertTupleEqual(positions.get("XXXX3 ON"), (0, 0))
+        year_balance = cmnr._create_net_per_stock_year_balance(net_per_stock)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "net_per_stock_year_balance2020.csv")
+            pd.DataFrame(year_balance).to_csv(path, header=cmnr.HEADERS_TABLE_NET_PER_STOCK, index=False)
+            loaded = engine.Positions(cmnr.read_net_per_stock_year_balance(path))
+            self.assertListEqual(cmnr.read_net_per_stock_year_balance(os.path.join(tmp_dir, "missing.csv")), [])
+        self.assertDictEqual(loaded.latest, {row[1]: (row[-2], row[-1]) for row in year_balance})
+
+    def test_sorted_keys(self):
+        """
+        Test the bounds of the precomputed yyyymm keys, missing keys and lookups of net_per_stock by month.
+        """
+        print("sorted_keys")
+        self.assertEqual(cmnr.month_key("15/03/2019"), 201903)
+        self.assertEqual(cmnr.month_key("3/2019"), 201903)
+        self.assertEqual(cmnr.month_key("00/2020"), 202000)
+        self.assertEqual(cmnr.month_key(schema.DataBr(2019, 12, 2)), 201912)
+        net_per_stock = [
+            ["00/2020", "PETR4 PN", 100, 10.0, 0, 0.0, 0.0, 0.0, 0.0, 100, 1000.0],
+            ["02/2020", "PETR4 PN", 200, 10.5, 0, 0.0, 0.0, 0.0, 0.0, 200, 2100.0],
+            ["02/2020", "VALE3 ON", 50, 40.0, 0, 0.0, 0.0, 0.0, 0.0, 50, 2000.0],
+            ["05/2020", "PETR4 PN", 200, 10.5, 100, 12.0, 1.5, 1.4, 150.0, 100, 1050.0],
+        ]
+        keys = cmnr.SortedKeys(net_per_stock, 0)
+        self.assertTupleEqual(keys.range(202002), (1, 3))
+        self.assertTupleEqual(keys.range(202003), (3, 3))
+        self.assertTupleEqual(keys.range(202101), (4, 4))
+        self.assertEqual(keys.first(202005), 3)
+        self.assertEqual(keys.first(202003), -1)
+        self.assertEqual(keys.first(202101), -1)
+        self.assertEqual(keys.previous(202002), 0)
+        self.assertEqual(keys.previous(202000), -1)
+        self.assertListEqual(list(keys.groups()), [(202000, 0, 1), (202002, 1, 3), (202005, 3, 4)])
+        self.assertTupleEqual(cmnr.get_stocks_per_ticker_at_month_year("VALE3 ON", net_per_stock, "02", "2020"), (50, 2000.0))
+        self.assertTupleEqual(cmnr.get_stocks_per_ticker_at_month_year("VALE3 ON", net_per_stock, "05", "2020"), (0, 0))
+        self.assertEqual(cmnr._get_first_index_search_col("05", 0, net_per_stock, cmnr.get_month, True), 3)
+        self.assertEqual(cmnr._get_first_index_search_col("12", 0, net_per_stock, cmnr.get_month, True), -1)
+        self.assertTupleEqual(cmnr._get_index_range_search_col("02", 0, net_per_stock, cmnr.get_month, True), (1, 3))
+        self.assertTupleEqual(cmnr._get_index_range_search_col("03", 0, net_per_stock, cmnr.get_month, True), (0, 0))
+        self.assertEqual(cmnr._get_previous_index_search_col("05", 0, net_per_stock, cmnr.get_month, True), 2)
+        month_keys = cmnr.SortedKeys(net_per_stock, 0, cmnr.get_month)  # Built once for the searches on the table
+        self.assertEqual(cmnr._get_first_index_search_col("05", 0, net_per_stock, keys=month_keys), 3)
+        self.assertTupleEqual(cmnr._get_index_range_search_col("02", 0, net_per_stock, keys=month_keys), (1, 3))
+        self.assertEqual(cmnr._get_previous_index_search_col("05", 0, net_per_stock, keys=month_keys), 2)
+        self.assertTupleEqual(cmnr.get_stocks_per_ticker_at_month_year("VALE3 ON", net_per_stock, "02", "2020", keys), (50, 2000.0))
+
+    def test_calc_net_per_stock_years(self):
+        """
+        Test the single pass over several years gives the tables of one run per year chained by net_per_stock_year_balance{year}.csv.
+        """
+        print("calc_net_per_stock_years")
+        years = [2019, 2020, 2021]
+        negocios_per_year = {year: make_negocios_realizados(150, year, seed=year) for year in years}
+        results = cmnr.calc_net_per_stock_years(sum(negocios_per_year.values(), []))
+        self.assertListEqual(sorted(results), years)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            net_per_stock = []
+            for year in years:
+                month_index = cmnr.index_months(negocios_per_year[year])
+                for m in range(1, 13):
+                    cmnr._append_net_per_stock_for_month(
+                        net_per_stock, f"{m:02d}/{year}", negocios_per_year[year], month_index
+                    )
+                year_balance = cmnr._create_net_per_stock_year_balance(net_per_stock)
+                self.assertListEqual(results[year]["net_per_stock"].tolist(), net_per_stock)
+                self.assertListEqual(results[year]["net_per_stock_year_balance"], year_balance)
+                self.assertListEqual(
+                    results[year]["monthly_profit_loss"], cmnr._calc_monthly_profit_loss(net_per_stock)
+                )
+                path = os.path.join(tmp_dir, f"net_per_stock_year_balance{year}.csv")
+                pd.DataFrame(year_balance).to_csv(path, header=cmnr.HEADERS_TABLE_NET_PER_STOCK, index=False)
+                net_per_stock = hio.read_csv(
+                    path, skip_headers=True, func_transf_row=cmnr._transform_str_numeric_read_net_per_stock
+                )
+        # Year without notas carries the balance forward
+        results = cmnr.calc_net_per_stock_years(negocios_per_year[2019] + negocios_per_year[2021])
+        self.assertListEqual(sorted(results), years)
+        balance_2019 = results[2019]["net_per_stock_year_balance"]
+        self.assertListEqual(
+            sorted(row[1:] for row in results[2020]["net_per_stock_year_balance"]),
+            sorted(row[1:] for row in balance_2019),
+        )
+        self.assertTrue(all(row[0] == "00/2021" for row in results[2020]["net_per_stock_year_balance"]))
+        self.assertDictEqual(cmnr.calc_net_per_stock_years([]), {})
+        # Years requested without notas before and after the negocios
+        results = cmnr.calc_net_per_stock_years(negocios_per_year[2020], balance_2019, range(2019, 2023))
+        self.assertListEqual(sorted(results), [2019, 2020, 2021, 2022])
+        self.assertListEqual(
+            sorted(row[1:] for row in results[2019]["net_per_stock_year_balance"]),
+            sorted(row[1:] for row in balance_2019),
+        )
+        self.assertListEqual(
+            sorted(row[1:] for row in results[2022]["net_per_stock_year_balance"]),
+            sorted(row[1:] for row in results[2021]["net_per_stock_year_balance"]),
+        )
+        self.assertListEqual(cmnr.calc_net_per_stock_years([], years=[2020])[2020]["net_per_stock"].tolist(), [])
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,46 @@
+import unittest
+from context import pystock
+from pystock import parse_notas_corretagem as pnc
+import synthetic_notas as sn
+from pystock.custos_table import CustosNotas
+import os
+import tempfile
+import numpy as np
+
+
+
+class TestCustosTable(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_custos_notas(self):
+        """
+        Test the table has the custos of the parser by name, aggregations match the sums of the dict and the npz round trip.
+        """
+        print("custos_notas")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 6, (1, 8))
+            negocios_realizados, custos_notas = pnc.parse_notas_corretagem_btg(path)
+        custos = CustosNotas.from_negocios_realizados(custos_notas, negocios_realizados)
+        self.assertEqual(len(custos), len(custos_notas))
+        for num_nota, values in custos_notas.items():
+            self.assertEqual(custos.row(num_nota)["emolumentos"], values[14])
+            self.assertEqual(custos["total corretagem / despesas"][custos.index(num_nota)], values[22])
+        total = sum(v[9] + v[10] + v[14] + v[22] for v in custos_notas.values())
+        self.assertAlmostEqual(sum(custos.taxas_por_mes().values()), total, places=2)
+        self.assertAlmostEqual(sum(custos.taxas_por_liquidacao().values()), total, places=2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "custos_notas.npz")
+            custos.save(path)
+            loaded = CustosNotas.load(path)
+        self.assertListEqual(sorted(custos.columns), sorted(loaded.columns))
+        for name, array in custos.columns.items():
+            np.testing.assert_array_equal(array, loaded[name])
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
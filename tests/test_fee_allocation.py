@@ -0,0 +1,47 @@
+import unittest
+from context import pystock
+from pystock import parse_notas_corretagem as pnc
+from pystock import fee_allocation as fa
+import synthetic_notas as sn
+from pystock.custos_table import CustosNotas
+import os
+import tempfile
+
+
+
+class TestFeeAllocation(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_allocate_taxas(self):
+        """
+        Test the default policy gives the taxas of the parser and every policy allocates the taxas of the notas.
+        """
+        print("allocate_taxas")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 6, (1, 8))
+            negocios_realizados, custos_notas = pnc.parse_notas_corretagem_btg(path)
+        custos = CustosNotas.from_dict(custos_notas)
+        taxas = fa.allocate_taxas(negocios_realizados[1:], custos)
+        self.assertListEqual(taxas.tolist(), [row[12] for row in negocios_realizados[1:]])
+        csv_rows = [[str(ix)] + row for ix, row in enumerate(negocios_realizados[1:])]
+        fa.apply_taxas(csv_rows, custos, "igual", offset=1)
+        self.assertListEqual(
+            [row[13] for row in csv_rows],
+            fa.allocate_taxas(negocios_realizados[1:], custos, "igual").tolist(),
+        )
+        for policy in fa.POLICIES:
+            taxas = fa.allocate_taxas(negocios_realizados[1:], custos, policy)
+            self.assertAlmostEqual(
+                taxas.sum(), custos.taxas().sum(), delta=0.005 * len(taxas)
+            )
+        with self.assertRaises(fa.UnknownPolicyError):
+            fa.allocate_taxas(negocios_realizados[1:], custos, "corretora")
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
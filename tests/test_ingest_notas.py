@@ -0,0 +1,177 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import pandas as pd
+from context import pystock
+from pystock import helpersio as hio
+from pystock import ingest_notas as ing
+from pystock import net_per_stock_state as nps
+from pystock import schema_notas as schema
+from pystock import parse_notas_corretagem as pnc
+from pystock.custos_table import CustosNotas
+import synthetic_notas as sn
+
+
+
+class TestIngestNotas(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_ingest_notas_corretagem(self):
+        """
+        Test ingestion appends only new files and generates the same files as run.py.
+        """
+        print("ingest_notas_corretagem")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 4)
+            negocios_realizados, custos_notas = pnc.parse_notas_corretagem_btg(path)
+            raw_path = os.path.join(tmp_dir, "raw")
+            os.makedirs(raw_path)
+            shutil.copy(path, raw_path)
+            template = os.path.join(tmp_dir, "processed", "{year}")
+            self.assertEqual(len(ing.ingest_notas_corretagem(raw_path, template)), 1)
+            self.assertListEqual(ing.ingest_notas_corretagem(raw_path, template), [])
+
+            processed_path = template.format(year=negocios_realizados[1][-1].year)
+            expected_path = os.path.join(tmp_dir, "expected.csv")
+            pd.DataFrame(negocios_realizados).to_csv(expected_path, header=0)
+            self.assertEqual(
+                hio.read_strings(expected_path),
+                hio.read_strings(
+                    os.path.join(
+                        processed_path,
+                        f"negocios_realizados_{negocios_realizados[1][-1].year}.csv",
+                    )
+                ),
+            )
+            with open(
+                os.path.join(
+                    processed_path, f"custos_notas{negocios_realizados[1][-1].year}.json"
+                ),
+                encoding="utf-8",
+            ) as f:
+                self.assertEqual(json.loads(json.dumps(custos_notas)), json.load(f))
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_ingest_changed_file(self):
+        """
+        Test the rows of a changed file replace the rows of its previous ingestion, manifest and index are kept out of the raw directory.
+        """
+        print("ingest_changed_file")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            raw_path = os.path.join(tmp_dir, "raw")
+            os.makedirs(raw_path)
+            sn.write_notas_pdf(os.path.join(raw_path, "a.pdf"), 3, year=2021)
+            sn.write_notas_pdf(os.path.join(raw_path, "b.pdf"), 4, year=2021, seed=1, first_nota=2000)
+            template = os.path.join(tmp_dir, "processed", "{year}")
+            ing.ingest_notas_corretagem(raw_path, template)
+            self.assertListEqual(sorted(os.listdir(raw_path)), ["a.pdf", "b.pdf"])
+            self.assertTrue(
+                os.path.exists(os.path.join(tmp_dir, "processed", ing.MANIFEST_FILE_NAME))
+            )
+
+            sn.write_notas_pdf(os.path.join(raw_path, "a.pdf"), 2, year=2021, seed=2)
+            os.utime(os.path.join(raw_path, "a.pdf"), (0, 0))
+            self.assertEqual(len(ing.ingest_notas_corretagem(raw_path, template)), 1)
+
+            expected_raw_path = os.path.join(tmp_dir, "expected_raw")
+            os.makedirs(expected_raw_path)
+            shutil.copy(os.path.join(raw_path, "b.pdf"), os.path.join(expected_raw_path, "1.pdf"))
+            shutil.copy(os.path.join(raw_path, "a.pdf"), os.path.join(expected_raw_path, "2.pdf"))
+            expected_template = os.path.join(tmp_dir, "expected", "{year}")
+            ing.ingest_notas_corretagem(expected_raw_path, expected_template)
+            self.assertEqual(  # Rows of b.pdf then the rows of a.pdf appended again, renumbered
+                hio.read_strings(os.path.join(expected_template.format(year=2021), "negocios_realizados_2021.csv")),
+                hio.read_strings(os.path.join(template.format(year=2021), "negocios_realizados_2021.csv")),
+            )
+            with open(os.path.join(template.format(year=2021), "custos_notas2021.json"), encoding="utf-8") as f:
+                pairs = json.load(f, object_pairs_hook=list)
+            self.assertEqual(len(pairs), len(dict(pairs)))  # No duplicate keys
+            with open(os.path.join(expected_template.format(year=2021), "custos_notas2021.json"), encoding="utf-8") as f:
+                self.assertEqual(json.load(f), dict(pairs))
+            # State of net_per_stock updated per file, the same as computed from the final csv
+            processed_path = template.format(year=2021)
+            state = nps.NetPerStockState(2021, path=os.path.join(processed_path, nps.STATE_FILE_NAME.format(year=2021)))
+            expected = nps.NetPerStockState(2021)
+            negocios_realizados = schema.read_negocios_realizados_csv(
+                os.path.join(processed_path, "negocios_realizados_2021.csv")
+            )
+            expected.update(negocios_realizados)
+            self.assertListEqual(
+                sorted(row[1:] for row in state.negocios_realizados()),
+                sorted(row[1:] for row in negocios_realizados),
+            )
+            self.assertListEqual(sorted(state.net_per_stock), sorted(expected.net_per_stock))
+            self.assertEqual(state.high_water_mark, expected.high_water_mark)
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_append_to_json_dict(self):
+        """
+        Test items appended to a json dict file load as the merged dict.
+        """
+        print("append_to_json_dict")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "custos.json")
+            hio.append_to_json_dict({}, path)
+            hio.append_to_json_dict({"1": [0.0, "ç"]}, path)
+            hio.append_to_json_dict({"2": [1.5]}, path)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual({"1": [0.0, "ç"], "2": [1.5]}, json.load(f))
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_load_custos_notas(self):
+        """
+        Test the table of custos is built from the json of the ingested notas, and built again once new notas are ingested.
+        """
+        print("load_custos_notas")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            raw_path = os.path.join(tmp_dir, "raw")
+            os.makedirs(raw_path)
+            sn.write_notas_pdf(os.path.join(raw_path, "a.pdf"), 3, year=2021)
+            template = os.path.join(tmp_dir, "processed", "{year}")
+            processed_path = template.format(year=2021)
+            path_custos_table = os.path.join(processed_path, "custos_notas2021.npz")
+            ing.ingest_notas_corretagem(raw_path, template)
+            self.assertFalse(os.path.exists(path_custos_table))
+            self.assertEqual(len(ing.load_custos_notas(processed_path, 2021)), 3)
+            self.assertTrue(os.path.exists(path_custos_table))
+
+            sn.write_notas_pdf(os.path.join(raw_path, "b.pdf"), 4, year=2021, seed=1, first_nota=2000)
+            ing.ingest_notas_corretagem(raw_path, template)
+            self.assertFalse(os.path.exists(path_custos_table))  # Stale table removed by the ingestion
+            negocios_realizados, custos_notas = [], {}
+            for name in ("a.pdf", "b.pdf"):
+                negocios, custos = pnc.parse_notas_corretagem_btg(os.path.join(raw_path, name))
+                negocios_realizados.extend(negocios if not negocios_realizados else negocios[1:])
+                custos_notas.update(custos)
+            expected = CustosNotas.from_negocios_realizados(custos_notas, negocios_realizados)
+            for _ in range(2):  # Built from the json, then loaded from the npz
+                custos = ing.load_custos_notas(processed_path, 2021)
+                self.assertListEqual(sorted(custos.columns), sorted(expected.columns))
+                for name, array in expected.columns.items():
+                    self.assertListEqual(array.tolist(), custos[name].tolist())
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
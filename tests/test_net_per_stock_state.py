@@ -0,0 +1,156 @@
+import unittest
+from context import pystock
+from pystock import calc_monthly_net_result as cmnr
+from pystock import net_per_stock_state as nps
+from synthetic_notas import make_negocios_realizados
+import os
+import tempfile
+
+
+def calc_year(negocios_realizados, year_balance):
+    """net_per_stock and monthly profit loss of the whole year, as run.calc_monthly_net_result_per_stock."""
+    net_per_stock = [cmnr._transform_str_numeric_read_net_per_stock(row.copy()) for row in year_balance]
+    month_index = cmnr.index_months(negocios_realizados)
+    for m in range(1, 13):
+        cmnr._append_net_per_stock_for_month(net_per_stock, f"{m:02d}/2020", negocios_realizados, month_index)
+    return net_per_stock, cmnr._calc_monthly_profit_loss(net_per_stock)
+
+
+class TestNetPerStockState(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+        self.year_balance = [
+            ["00/2020", "PETR4 PN", "1000", "20.5", "0", "0.0", "0.0", "0.0", "0.0", "1000", "20500.0"],
+            ["00/2020", "VALE3 ON", "300", "45.1", "0", "0.0", "0.0", "0.0", "0.0", "300", "13530.0"],
+        ]
+        self.negocios_realizados = make_negocios_realizados(240, seed=3)
+
+    def test_update_per_month(self):
+        """
+        Test feeding the negócios month by month, with the state saved and loaded between months, gives the tables of the whole year and
+        only appends rows.
+        """
+        print("update_per_month")
+        month_index = cmnr.index_months(self.negocios_realizados)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, nps.STATE_FILE_NAME.format(year=2020))
+            for (year, month), (lo, hi) in sorted(month_index.items()):
+                state = nps.NetPerStockState(2020, self.year_balance, path)
+                previous = [row.copy() for row in state.net_per_stock]
+                self.assertEqual(state.update(self.negocios_realizados[lo:hi]), year * 100 + month)
+                self.assertEqual(state.high_water_mark, year * 100 + month)
+                self.assertListEqual(state.net_per_stock[: len(previous)], previous)
+                state.save()
+            state = nps.NetPerStockState(2020, self.year_balance, path)
+        net_per_stock, monthly_profit_loss = calc_year(self.negocios_realizados, self.year_balance)
+        self.assertListEqual(state.net_per_stock, net_per_stock)
+        self.assertListEqual(state.monthly_profit_loss, monthly_profit_loss)
+        self.assertDictEqual(
+            state.positions.latest, {row[1]: (row[-2], row[-1]) for row in net_per_stock}
+        )
+        self.assertEqual(state.update(self.negocios_realizados), 0)  # Notas sent again
+
+    def test_update_correction(self):
+        """
+        Test a re-issued nota of a processed month replays the months from it on and keeps the rows of the months before.
+        """
+        print("update_correction")
+        state = nps.NetPerStockState(2020, self.year_balance)
+        state.update(self.negocios_realizados)
+        lo, hi = cmnr.index_months(self.negocios_realizados)[(2020, 3)]
+        num_nota = self.negocios_realizados[lo + 5][12]
+        corrected = [row.copy() for row in self.negocios_realizados if row[12] == num_nota]
+        corrected[0][8] += 100
+        corrected[0][10] = round(corrected[0][10] + 100 * corrected[0][9], 2)
+        before = [row for row in state.net_per_stock if cmnr.month_key(row[0]) < 202003]
+        self.assertEqual(state.update(corrected), 202003)
+        self.assertEqual(state.high_water_mark, 202012)
+        self.assertListEqual(state.net_per_stock[: len(before)], before)
+        negocios_realizados = [
+            corrected.pop(0) if row[12] == num_nota else row for row in self.negocios_realizados
+        ]
+        self.assertListEqual(state.negocios_realizados(), negocios_realizados)
+        net_per_stock, monthly_profit_loss = calc_year(negocios_realizados, self.year_balance)
+        self.assertListEqual(state.net_per_stock, net_per_stock)
+        self.assertListEqual(state.monthly_profit_loss, monthly_profit_loss)
+
+    def test_update_reissued_month(self):
+        """
+        Test a nota re-issued with the data pregão of another month replaces its rows in the month indexed and a removed nota is dropped.
+        """
+        print("update_reissued_month")
+        state = nps.NetPerStockState(2020, self.year_balance)
+        state.update(self.negocios_realizados)
+        lo, hi = cmnr.index_months(self.negocios_realizados)[(2020, 3)]
+        num_nota = self.negocios_realizados[lo + 5][12]
+        moved_to = self.negocios_realizados[cmnr.index_months(self.negocios_realizados)[(2020, 8)][0]][14]
+        reissued = [row.copy() for row in self.negocios_realizados if row[12] == num_nota]
+        for ix, row in enumerate(reissued, len(self.negocios_realizados) + 1):  # Appended to the csv
+            row[0] = str(ix)
+            row[14] = moved_to
+        self.assertEqual(state.update(reissued), 202003)
+        negocios_realizados = [row for row in self.negocios_realizados if row[12] != num_nota]
+        at = next(  # After the notas starting at the same date
+            i
+            for i, row in enumerate(negocios_realizados)
+            if row[14] > moved_to and row[12] != negocios_realizados[i - 1][12]
+        )
+        negocios_realizados[at:at] = reissued
+        self.assertListEqual(state.negocios_realizados(), negocios_realizados)
+        net_per_stock, monthly_profit_loss = calc_year(negocios_realizados, self.year_balance)
+        self.assertListEqual(state.net_per_stock, net_per_stock)
+        self.assertListEqual(state.monthly_profit_loss, monthly_profit_loss)
+
+        removed = negocios_realizados[-1][12]
+        self.assertEqual(state.update([], notas_removed=[removed, "missing"]), 202012)
+        negocios_realizados = [row for row in negocios_realizados if row[12] != removed]
+        self.assertListEqual([row[1:] for row in state.negocios_realizados()], [row[1:] for row in negocios_realizados])
+        self.assertListEqual(  # Renumbered as the csv
+            sorted(row[0] for row in state.negocios_realizados()), list(range(1, len(negocios_realizados) + 1))
+        )
+        net_per_stock, monthly_profit_loss = calc_year(negocios_realizados, self.year_balance)
+        self.assertListEqual(state.net_per_stock, net_per_stock)
+        self.assertListEqual(state.monthly_profit_loss, monthly_profit_loss)
+        self.assertEqual(state.update([], notas_removed=["missing"]), 0)
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+        self.year_balance = [
+            ["00/2020", "PETR4 PN", "1000", "20.5", "0", "0.0", "0.0", "0.0", "0.0", "1000", "20500.0"],
+            ["00/2020", "VALE3 ON", "300", "45.1", "0", "0.0", "0.0", "0.0", "0.0", "300", "13530.0"],
+        ]
+        self.negocios_realizados = make_negocios_realizados(240, seed=3)
+
+    def test_update_notas_same_date(self):
+        """
+        Test notas of the same data pregão fed out of the order of the csv are kept in the order of the csv, the state is the one of the
+        recompute of the whole year.
+        """
+        print("update_notas_same_date")
+        negocios_realizados = make_negocios_realizados(2000, seed=4)
+        notas = {}  # Nr. nota: rows, all rows of a nota with the data pregão of its first row
+        for row in negocios_realizados:
+            rows = notas.setdefault(row[12], [])
+            row[14] = rows[0][14] if rows else row[14]
+            rows.append(row)
+        self.assertLess(len({rows[0][14] for rows in notas.values()}), len(notas))
+        state = nps.NetPerStockState(2020, self.year_balance)
+        month_index = cmnr.index_months(negocios_realizados)
+        for key in sorted(month_index):
+            lo, hi = month_index[key]
+            month_notas = list(dict.fromkeys(row[12] for row in negocios_realizados[lo:hi]))
+            state.update([row for num_nota in reversed(month_notas) for row in notas[num_nota]])
+        self.assertListEqual(state.negocios_realizados(), negocios_realizados)
+        expected = cmnr.calc_net_per_stock_years(negocios_realizados, self.year_balance, [2020])[2020]
+        self.assertListEqual(state.net_per_stock, [list(row) for row in expected["net_per_stock"]])
+        self.assertListEqual(state.monthly_profit_loss, expected["monthly_profit_loss"])
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
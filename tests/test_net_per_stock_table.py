@@ -0,0 +1,98 @@
+import unittest
+from context import pystock
+from pystock import calc_monthly_net_result as cmnr
+from pystock import helpersio as hio
+from pystock.net_per_stock_table import NetPerStock
+from synthetic_notas import make_negocios_realizados
+import numpy as np
+import pandas as pd
+import os
+import sys
+import tempfile
+
+
+def to_csv(df):
+    """Csv written by run.py."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "net_per_stock.csv")
+        df.to_csv(path, header=cmnr.HEADERS_TABLE_NET_PER_STOCK, index=False)
+        return hio.read_strings(path)
+
+
+class TestNetPerStockTable(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+        self.year_balance = [
+            ["00/2020", "PETR4 PN", 1000, 20.5, 0, 0.0, 0.0, 0.0, 0.0, 1000, 20500.0],
+            ["00/2020", "VALE3 ON", 300, 45.1, 0, 0.0, 0.0, 0.0, 0.0, 300, 13530.0],
+        ]
+
+    def test_monthly_calc(self):
+        """
+        Test the monthly calc on the typed table gives the rows, year balance and monthly profit loss of the list of lists.
+        """
+        print("monthly_calc")
+        negocios_realizados = make_negocios_realizados(600, seed=4)
+        month_index = cmnr.index_months(negocios_realizados)
+        net_per_stock = [row.copy() for row in self.year_balance]
+        table = NetPerStock(self.year_balance, capacity=1)  # Grows while appending
+        for m in range(1, 13):
+            for rows in (net_per_stock, table):
+                cmnr._append_net_per_stock_for_month(rows, f"{m:02d}/2020", negocios_realizados, month_index)
+        self.assertEqual(len(table), len(net_per_stock))
+        self.assertListEqual(table.tolist(), net_per_stock)
+        self.assertTrue(table == net_per_stock)
+        self.assertListEqual(
+            cmnr._create_net_per_stock_year_balance(table), cmnr._create_net_per_stock_year_balance(net_per_stock)
+        )
+        self.assertListEqual(cmnr._calc_monthly_profit_loss(table), cmnr._calc_monthly_profit_loss(net_per_stock))
+        self.assertIn(0, [type(row[7]) is int and row[7] for row in net_per_stock])  # Months without sells
+        self.assertListEqual([type(v) for v in table[-1]], [type(v) for v in net_per_stock[-1]])
+        self.assertEqual(to_csv(table.to_pandas()), to_csv(pd.DataFrame(net_per_stock)))
+        size_lists = sum(sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row[2:]) for row in net_per_stock)
+        self.assertLess(table.nbytes * 3, size_lists)
+
+    def test_csv_without_sells(self):
+        """
+        Test the csv of a year without sells and previous stocks, Profit Loss with sales operations costs per unit is int 0 in every row, is
+        the csv of the list of lists.
+        """
+        print("csv_without_sells")
+        negocios_realizados = [row for row in make_negocios_realizados(200, seed=5) if row[3] == "C"]
+        month_index = cmnr.index_months(negocios_realizados)
+        net_per_stock, table = [], NetPerStock()
+        for m in range(1, 13):
+            for rows in (net_per_stock, table):
+                cmnr._append_net_per_stock_for_month(rows, f"{m:02d}/2020", negocios_realizados, month_index)
+        self.assertTrue(all(type(row[7]) is int for row in table))
+        self.assertEqual(to_csv(table.to_pandas()), to_csv(pd.DataFrame(net_per_stock)))
+        self.assertEqual(to_csv(NetPerStock().to_pandas()), to_csv(pd.DataFrame([], columns=range(11))))
+
+    def test_rows_and_pandas(self):
+        """
+        Test row views, python types of the values and export to pandas sharing the numeric columns.
+        """
+        print("rows_and_pandas")
+        table = NetPerStock(self.year_balance)
+        row = table[-1]
+        self.assertEqual(row[1], "VALE3 ON")
+        self.assertEqual((row[-2], row[-1]), (300, 13530.0))
+        self.assertIs(type(row[2]), int)
+        self.assertIs(type(row[3]), float)
+        self.assertListEqual(row[1:3], ["VALE3 ON", 300])
+        self.assertListEqual(row.copy(), self.year_balance[1])
+        self.assertEqual(len(table[0:1]), 1)
+        with self.assertRaises(IndexError):
+            table[2]
+        df = table.to_pandas()
+        self.assertListEqual(list(df.columns), cmnr.HEADERS_TABLE_NET_PER_STOCK)
+        self.assertListEqual(df["Ticker"].tolist(), ["PETR4 PN", "VALE3 ON"])
+        self.assertTrue(np.shares_memory(df["Remain Quantity units"].to_numpy(), table.column(9)))
+        self.assertListEqual(NetPerStock().monthly_profit_loss(), [])
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,118 @@
+import unittest
+from context import pystock
+from pystock import parse_notas_corretagem as pnc
+import synthetic_notas as sn
+from pystock.nota_index import NotaIndex
+import os
+import shutil
+import tempfile
+
+
+class TestNotaIndex(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_parse_notas_corretagem_btg_index(self):
+        """
+        Test notas re-sent in another file or parsed again are skipped, re-issued notas are reported and skipped, and a file removed from the
+        index is parsed completely.
+        """
+        print("parse_notas_corretagem_btg_index")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas.pdf")
+            sn.write_notas_pdf(path, 4)
+            path_copy = os.path.join(tmp_dir, "notas_reenviadas.pdf")
+            shutil.copy(path, path_copy)
+            path_reissued = os.path.join(tmp_dir, "notas_reemitidas.pdf")
+            sn.write_notas_pdf(path_reissued, 4, seed=1)  # Same números de nota, other negócios
+            index_path = os.path.join(tmp_dir, "index.json")
+            negocios_realizados, custos_notas = pnc.parse_notas_corretagem_btg(path)
+
+            index = NotaIndex(index_path)
+            self.assertListEqual(
+                negocios_realizados,
+                pnc.parse_notas_corretagem_btg(path, index=index)[0],
+            )
+            self.assertEqual(len(index), len(custos_notas))
+            for workers in (1, 2):
+                index = NotaIndex(index_path)
+                negocios_copy, custos_copy = pnc.parse_notas_corretagem_btg(
+                    path_copy, workers=workers, index=index
+                )
+                self.assertEqual(len(negocios_copy), 1)
+                self.assertEqual(custos_copy, {})
+                negocios_reissued, _ = pnc.parse_notas_corretagem_btg(
+                    path_reissued, workers=workers, index=index
+                )
+                self.assertEqual(len(negocios_reissued), 1)
+                self.assertEqual(len(index.conflicts), len(custos_notas))
+            index = NotaIndex(index_path)
+            self.assertEqual(len(pnc.parse_notas_corretagem_btg(path, index=index)[0]), 1)
+            index.remove_file(os.path.abspath(path))
+            self.assertEqual(len(index), 0)
+            self.assertListEqual(
+                negocios_realizados,
+                pnc.parse_notas_corretagem_btg(path, index=index)[0],
+            )
+            self.assertEqual(set(index.notas.values()), {os.path.abspath(path)})
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_iter_notas_corretagem_btg_index_not_saved(self):
+        """
+        Test the stream registers the pages in the index without saving it, the caller saves the index after persisting the rows.
+        """
+        print("iter_notas_corretagem_btg_index_not_saved")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas.pdf")
+            sn.write_notas_pdf(path, 3)
+            index_path = os.path.join(tmp_dir, "index.json")
+            index = NotaIndex(index_path)
+            paginas = pnc.iter_notas_corretagem_btg(path, index=index)
+            next(paginas)
+            paginas.close()  # Consumer interrupted before persisting the rows
+            self.assertEqual(len(index), 1)
+            self.assertFalse(os.path.exists(index_path))
+            for _ in pnc.iter_notas_corretagem_btg(path, index=index):
+                pass
+            self.assertFalse(os.path.exists(index_path))
+            index.save()
+            self.assertEqual(len(NotaIndex(index_path)), 3)
+            self.assertEqual(len(pnc.parse_notas_corretagem_btg(path, index=NotaIndex(index_path))[0]), 1)
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_parse_notas_corretagem_btg_index_pages(self):
+        """
+        Test every page of notas of two pages is parsed with the index, the pages are indexed by content.
+        """
+        print("parse_notas_corretagem_btg_index_pages")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas.pdf")
+            sn.write_notas_pdf(path, 6, pages_per_nota=2)
+            negocios_realizados, custos_notas = pnc.parse_notas_corretagem_btg(path)
+            self.assertEqual(len(custos_notas), 3)
+            for workers in (1, 2):
+                index = NotaIndex()
+                self.assertListEqual(
+                    negocios_realizados,
+                    pnc.parse_notas_corretagem_btg(path, workers=workers, index=index)[0],
+                )
+                self.assertEqual(len(index), 3)
+                self.assertEqual(len(index.pages), 6)
+                self.assertListEqual(index.conflicts, [])
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,104 @@
+import unittest
+import pdfplumber
+from context import pystock
+from pystock import page_layout as pl
+import synthetic_notas as sn
+import os
+import tempfile
+
+
+class TestPageLayout(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_extract_page_layout(self):
+        """
+        Test the shared layout stage matches both page.find_tables() and page.extract_tables() passes.
+        """
+        print("extract_page_layout")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 4, (1, 8))
+            with pdfplumber.open(path) as pdf:
+                for page in pdf.pages:
+                    tables, df_custo = pl.extract_page_layout(page)
+                    self.assertListEqual(page.extract_tables(), tables)
+                    self.assertListEqual(
+                        page.extract_tables(pl.TABLE_SETTINGS_CUSTOS), df_custo
+                    )
+                    tables, tables_custos = pl._find_page_tables(page)
+                    self.assertListEqual([t.cells for t in page.find_tables()], [t.cells for t in tables])
+                    self.assertListEqual(
+                        [t.cells for t in page.find_tables(pl.TABLE_SETTINGS_CUSTOS)],
+                        [t.cells for t in tables_custos],
+                    )
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_extract_page_regions_template(self):
+        """
+        Test regions of the template read from the objects of the regions match the tables of page.crop(bbox), and the objects of the
+        regions are the ones of page.objects.
+        """
+        print("extract_page_regions_template")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 4, (1, 8))
+            with pdfplumber.open(path) as pdf:
+                _, template = pl.extract_page_regions(pdf.pages[0])
+                for page in pdf.pages:
+                    kinds = set(pl.REGION_OBJECT_KINDS.values())
+                    self.assertDictEqual(
+                        pl._region_objects(page, [page.bbox]),
+                        {kind: objs for kind, objs in page.objects.items() if kind in kinds},
+                    )
+                    self.assertDictEqual(pl._region_objects(page, [page.bbox], pl.TEXT_OBJECT_KINDS), {"char": page.chars})
+                    bbox = pl._pad_bbox(template["custos"], page.bbox)
+                    self.assertListEqual(
+                        pl._region_objects(page, [bbox])["char"], pdfplumber.utils.intersects_bbox(page.chars, bbox)
+                    )
+                    regioes_crop = {}
+                    for name in ("cabecalho", "negocios", "custos"):
+                        tables = page.crop(pl._pad_bbox(template[name], page.bbox)).find_tables(
+                            pl.TABLE_SETTINGS_CUSTOS if name == "custos" else None
+                        )
+                        regioes_crop[name] = tables[0].extract() if tables else None
+                    if None in regioes_crop.values():
+                        with self.assertRaises(pl.TemplateMismatch):
+                            pl.extract_page_regions_template(page, template)
+                    else:
+                        self.assertDictEqual(pl.extract_page_regions_template(page, template), regioes_crop)
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_extract_page_regions_text(self):
+        """
+        Test regions read from the text layer match the full page detection.
+        """
+        print("extract_page_regions_text")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 4, (1, 8))
+            with pdfplumber.open(path) as pdf:
+                _, template = pl.extract_page_regions(pdf.pages[0])
+                for page in pdf.pages:
+                    regioes, _ = pl.extract_page_regions(page)
+                    regioes_text = pl.extract_page_regions_text(page, template)
+                    self.assertListEqual(regioes["cabecalho"][:1], regioes_text["cabecalho"][:1])
+                    self.assertListEqual(regioes["negocios"], regioes_text["negocios"])
+                    self.assertListEqual(regioes["custos"], regioes_text["custos"])
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -7,6 +7,7 @@ from pystock import helpersio as hio
 from pystock import parse_notas_corretagem as pnc
 from ast import literal_eval
 import os
+from pystock import schema_notas as schema
 
 path_data = os.path.abspath(os.path.join(os.path.dirname(__file__), "tests_data/"))
 hio.assert_exist_path(path_data)
@@ -156,6 +157,7 @@ class TestParseNotasCorretagem(unittest.TestCase):
         out_case = hio.import_object_as_literal(
             os.path.join(path_data, "negocios_realizados.out")
         )
+        out_case = [out_case[0]] + [schema.type_negocio(row) for row in out_case[1:]]
         self.assertListEqual(out_case, negocios_realizados)
 
         # Verify custos_notas
@@ -0,0 +1,274 @@
+import unittest
+from context import pystock
+from pystock import parse_notas_corretagem as pnc
+from pystock import calc_monthly_net_result as cmnr
+from pystock import helpersio as hio
+from pystock.parse_cache import ParseCache
+import synthetic_notas as sn
+import os
+import tempfile
+import json
+import gc
+import tracemalloc
+import pandas as pd
+
+
+class TestParseNotasCorretagemSynthetic(unittest.TestCase):
+    """
+    Tests of the parse options on notas generated by synthetic_notas, they do not need the private tests_data.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        print("setupClass")
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp_dir.name, "notas.pdf")
+        sn.write_notas_pdf(cls.path, 6, (1, 8))
+        cls.negocios_realizados, cls.custos_notas = pnc.parse_notas_corretagem_btg(cls.path)
+
+    def setUp(self):
+        print("setUp")
+
+    def test__parse_custos_blocos_layout_error(self):
+        """
+        Test layout drift of a bloco de custos reports the attribute that failed.
+        """
+        print("_parse_custos_blocos_layout_error")
+        clearing = "Clearing\nValor líquido das operações 5.200,00 D\nTaxa liquidação 1,43 D\nTaxa de Registro 0,00 D\nTotal CBLC 5.201,43 D"
+        with self.assertRaises(pnc.CustosLayoutError) as cm:
+            pnc._parse_clearing(clearing)
+        self.assertEqual(cm.exception.atributo, "taxa de liquidação")
+        self.assertListEqual(
+            pnc._parse_clearing(clearing.replace("Taxa liquidação", "Taxa de liquidação")),
+            [5200.0, 1.43, 0.0, 5201.43],
+        )
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_parse_notas_corretagem_btg_workers(self):
+        """
+        Test parallel parse by page ranges matches the serial parse.
+        """
+        print("parse_notas_corretagem_btg_workers")
+        negocios_realizados_par, custos_notas_par = pnc.parse_notas_corretagem_btg(
+            self.path, workers=2
+        )
+        self.assertListEqual(self.negocios_realizados, negocios_realizados_par)
+        self.assertEqual(repr(self.custos_notas), repr(custos_notas_par))
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_parse_notas_corretagem_btg_template(self):
+        """
+        Test parse on the crop regions of the layout template matches the full page detection.
+        """
+        print("parse_notas_corretagem_btg_template")
+        for fast in (False, True):
+            negocios_realizados_tpl, custos_notas_tpl = pnc.parse_notas_corretagem_btg(
+                self.path, use_template=True, fast=fast
+            )
+            self.assertListEqual(self.negocios_realizados, negocios_realizados_tpl)
+            self.assertEqual(repr(self.custos_notas), repr(custos_notas_tpl))
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_parse_notas_corretagem_btg_fast(self):
+        """
+        Test parse from the text layer matches the table detection.
+        """
+        print("parse_notas_corretagem_btg_fast")
+        negocios_realizados_fast, custos_notas_fast = pnc.parse_notas_corretagem_btg(
+            self.path, fast=True
+        )
+        self.assertListEqual(self.negocios_realizados, negocios_realizados_fast)
+        self.assertEqual(repr(self.custos_notas), repr(custos_notas_fast))
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_parse_notas_corretagem_btg_stats(self):
+        """
+        Test stats emitted as json count the pages and rows of the parse, in series and in parallel, without changing the output.
+        """
+        print("parse_notas_corretagem_btg_stats")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for workers in (1, 2):
+                stats_path = os.path.join(tmp_dir, f"stats_{workers}.json")
+                negocios_realizados_s, custos_notas_s = pnc.parse_notas_corretagem_btg(
+                    self.path, workers=workers, stats_path=stats_path
+                )
+                self.assertListEqual(self.negocios_realizados, negocios_realizados_s)
+                self.assertEqual(repr(self.custos_notas), repr(custos_notas_s))
+                with open(stats_path, encoding="utf-8") as f:
+                    stats = json.load(f)
+                self.assertEqual(stats["counters"]["pages"], len(self.custos_notas))
+                self.assertEqual(stats["counters"]["rows"], len(self.negocios_realizados) - 1)
+                self.assertEqual(
+                    sum(bucket["pages"] for bucket in stats["page_histogram"]),
+                    len(self.custos_notas),
+                )
+                self.assertEqual(stats["stages"]["custos"]["calls"], len(self.custos_notas))
+                seconds = [page["seconds"] for page in stats["slowest_pages"]]
+                self.assertListEqual(seconds, sorted(seconds, reverse=True))
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_iter_notas_corretagem_btg(self):
+        """
+        Test the stream of records per page matches the parse of the whole file.
+        """
+        print("iter_notas_corretagem_btg")
+        negocios_realizados_stream = [self.negocios_realizados[0]]
+        custos_notas_stream = {}
+        for pagina in pnc.iter_notas_corretagem_btg(self.path):
+            negocios_realizados_stream.extend(pagina["negocios_realizados"])
+            custos_notas_stream[pagina["num_nota"]] = pagina["custos_nota"]
+            self.assertEqual(
+                pagina["data_pregao"], str(pagina["negocios_realizados"][0][-1])
+            )
+        self.assertListEqual(self.negocios_realizados, negocios_realizados_stream)
+        self.assertEqual(repr(self.custos_notas), repr(custos_notas_stream))
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_parse_notas_corretagem_btg_cache(self):
+        """
+        Test pages served from the parse cache match the parse without cache.
+        """
+        print("parse_notas_corretagem_btg_cache")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ParseCache(cache_dir)
+            for _ in range(2):  # Miss then hit
+                negocios_realizados_cache, custos_notas_cache = pnc.parse_notas_corretagem_btg(
+                    self.path, cache=cache
+                )
+                self.assertListEqual(self.negocios_realizados, negocios_realizados_cache)
+                self.assertEqual(repr(self.custos_notas), repr(custos_notas_cache))
+            self.assertEqual(cache.stats()[0], len(self.custos_notas))
+            for num_nota in ("1", "12345"):  # Same key written again, the size of the replaced entry is not counted
+                cache.put("0" * 64, {"pagina": 0, "num_nota": num_nota})
+            self.assertEqual(cache._size, cache.stats()[1])
+            self.assertGreater(cache.invalidate(), 0)
+            self.assertEqual(cache.stats()[0], 0)
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_export_notas_stream(self):
+        """
+        Test csv and json written page by page are the files exported by run.py from the parse of the whole file, and net_per_stock
+        calculated from the same stream is the one calculated from the csv.
+        """
+        print("export_notas_stream")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path_csv = os.path.join(tmp_dir, "negocios_realizados_stream.csv")
+            path_json = os.path.join(tmp_dir, "custos_notas_stream.json")
+            paginas = pnc.export_notas_stream(pnc.iter_notas_corretagem_btg(self.path), path_csv, path_json)
+            net_per_stock = []
+            months = cmnr._append_net_per_stock_from_stream(net_per_stock, paginas)
+            pd.DataFrame(self.negocios_realizados).to_csv(os.path.join(tmp_dir, "negocios_realizados.csv"), header=0)
+            hio.exportToJson(self.custos_notas, os.path.join(tmp_dir, "custos_notas.json"))
+            for path, path_stream in (("negocios_realizados.csv", path_csv), ("custos_notas.json", path_json)):
+                with open(os.path.join(tmp_dir, path), "rb") as f, open(path_stream, "rb") as f_stream:
+                    self.assertEqual(f.read(), f_stream.read())
+            negocios_realizados = hio.read_csv(
+                path_csv, skip_headers=True, func_transf_row=cmnr._transform_str_numeric_read_negocios_realizados
+            )
+            for path_stream in (path_csv, path_json):
+                os.remove(path_stream)
+            self.assertListEqual(list(pnc.export_notas_stream([], path_csv, path_json)), [])
+            with open(path_json, encoding="utf-8") as f:
+                self.assertDictEqual(json.load(f), {})
+        expected = []
+        month_index = cmnr.index_months(negocios_realizados)
+        for year, month in sorted(month_index):
+            cmnr._append_net_per_stock_for_month(expected, f"{month:02d}/{year}", negocios_realizados, month_index)
+        self.assertListEqual(months, [f"{month:02d}/{year}" for year, month in sorted(month_index)])
+        self.assertListEqual(net_per_stock, expected)
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_parse_notas_corretagem_btg_window(self):
+        """
+        Test parse reopening the pdf per window of pages or memory ceiling matches the parse in one opening, in series and in parallel.
+        """
+        print("parse_notas_corretagem_btg_window")
+        for kwargs, reopens in (({"window": 1}, 6), ({"window": 4}, 1), ({"max_memory": -1}, 6)):
+            stats = pnc.ParseStats()
+            negocios_realizados_w, custos_notas_w = pnc.parse_notas_corretagem_btg(
+                self.path, stats=stats, **kwargs
+            )
+            self.assertListEqual(self.negocios_realizados, negocios_realizados_w)
+            self.assertEqual(repr(self.custos_notas), repr(custos_notas_w))
+            self.assertEqual(stats.counters["reopen_pdf"], reopens)
+            negocios_realizados_w, custos_notas_w = pnc.parse_notas_corretagem_btg(
+                self.path, workers=2, **kwargs
+            )
+            self.assertListEqual(self.negocios_realizados, negocios_realizados_w)
+            self.assertEqual(repr(self.custos_notas), repr(custos_notas_w))
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_iter_notas_corretagem_btg_memory(self):
+        """
+        Test peak memory (tracemalloc) of the parse stays flat when the number of pages of the pdf doubles.
+        """
+        print("iter_notas_corretagem_btg_memory")
+        peaks = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for pages in (10, 20):
+                path = os.path.join(tmp_dir, f"notas_{pages}.pdf")
+                sn.write_notas_pdf(path, pages)
+                gc.collect()
+                tracemalloc.start()
+                for _ in pnc.iter_notas_corretagem_btg(path):
+                    pass
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        self.assertLess(peaks[1], peaks[0] * 1.25)
+
+    def tearDown(self):
+        print("tearDown")
+
+    @classmethod
+    def tearDownClass(cls):
+        print("teardownClass")
+        cls.tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,41 @@
+import unittest
+from context import pystock
+from pystock import helpersio as hio
+from pystock import schema_notas as schema
+import os
+import tempfile
+import pandas as pd
+
+
+class TestSchemaNotas(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_type_negocio(self):
+        """
+        Test rows are typed by the schema and keep the same types after the round trip through csv.
+        """
+        print("type_negocio")
+        row = ["", "1-BOVESPA", "C", "VISTA", "", "PETR4 PN", "", "1400", "8.04", "11256.00", "D", "1000", 3.38, "01/02/2020"]
+        typed = schema.type_negocio(list(row))
+        self.assertEqual(typed[schema.col("Quantidade")], 1400)
+        self.assertIsInstance(typed[schema.col("Quantidade")], int)
+        self.assertEqual(typed[schema.col("Valor Operação / Ajuste")], 11256.0)
+        self.assertEqual(typed[-1], schema.DataBr(2020, 2, 1))
+        self.assertEqual(str(typed[-1]), "01/02/2020")
+        self.assertListEqual(typed, schema.type_negocio(list(typed)))
+        with self.assertRaises(ValueError):
+            schema.to_int("1400.5")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "negocios_realizados.csv")
+            pd.DataFrame([schema.HEADERS_RESUMO_NOTA, typed]).to_csv(path, header=0)
+            self.assertListEqual(
+                [["1"] + typed], schema.read_negocios_realizados_csv(path)
+            )
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,37 @@
+import unittest
+from context import pystock
+from pystock import parse_notas_corretagem as pnc
+import synthetic_notas as sn
+import os
+import tempfile
+
+
+class TestSyntheticNotas(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_write_notas_pdf(self):
+        """
+        Test generated notas are parsed, with the generated number of negócios and dates in order.
+        """
+        print("write_notas_pdf")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas.pdf")
+            num_negocios = sn.write_notas_pdf(path, 6, (1, 8), ["PETR4", "VALE3"], 2021)
+            negocios_realizados, custos_notas = pnc.parse_notas_corretagem_btg(path)
+            negocios_realizados_fast, _ = pnc.parse_notas_corretagem_btg(path, fast=True)
+        self.assertEqual(len(negocios_realizados) - 1, num_negocios)
+        self.assertEqual(len(custos_notas), 6)
+        self.assertListEqual(negocios_realizados, negocios_realizados_fast)
+        tickers = {row[5].split()[0] for row in negocios_realizados[1:]}
+        self.assertTrue(tickers <= {"PETR4", "VALE3"})
+        datas = [row[-1] for row in negocios_realizados[1:]]
+        self.assertListEqual(datas, sorted(datas))
+        self.assertTrue(all(data.year == 2021 for data in datas))
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from context import pystock
+from pystock import helpersio as hio
+from pystock import ingest_notas as ing
+from pystock import parse_notas_corretagem as pnc
+from pystock.nota_index import INDEX_FILE_NAME, NotaIndex
+import synthetic_notas as sn
+from pystock.watch_notas import WatchNotas
+
+
+
+class TestWatchNotas(unittest.TestCase):
+    def setUp(self):
+        print("setUp")
+
+    def test_watch_notas(self):
+        """
+        Test a pdf copied to the watched directory is ingested once, with the same files as ingest_notas_corretagem.
+        """
+        print("watch_notas")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 4)
+            raw_path = os.path.join(tmp_dir, "raw")
+            os.makedirs(raw_path)
+            template = os.path.join(tmp_dir, "processed", "{year}")
+            service = WatchNotas(
+                raw_path, template, workers=1, poll_seconds=0.05, settle_seconds=0.1
+            )
+
+            async def run():
+                stop_event = asyncio.Event()
+                task = asyncio.ensure_future(service.run(stop_event))
+                await asyncio.sleep(0.2)
+                shutil.copy(path, raw_path)
+                while service.status["ingested_files"] < 1:
+                    self.assertFalse(task.done())
+                    await asyncio.sleep(0.05)
+                await asyncio.sleep(0.3)  # Polls after the ingestion do not queue the file again
+                stop_event.set()
+                await task
+
+            asyncio.run(run())
+            with open(service.status_path, encoding="utf-8") as f:
+                status = json.load(f)
+            self.assertEqual(status["ingested_files"], 1)
+            self.assertEqual(status["queue_depth"], 0)
+            self.assertGreater(status["ingested_rows"], 0)
+            self.assertGreater(status["last_latency"], 0)
+
+            expected_raw_path = os.path.join(tmp_dir, "expected_raw")
+            os.makedirs(expected_raw_path)
+            shutil.copy(path, expected_raw_path)
+            expected_template = os.path.join(tmp_dir, "expected", "{year}")
+            ing.ingest_notas_corretagem(expected_raw_path, expected_template)
+            for name in sorted(os.listdir(template.format(year=2020))):
+                self.assertEqual(
+                    hio.read_strings(os.path.join(expected_template.format(year=2020), name)),
+                    hio.read_strings(os.path.join(template.format(year=2020), name)),
+                )
+
+    def tearDown(self):
+        print("tearDown")
+
+    def setUp(self):
+        print("setUp")
+
+    def test_watch_notas_duplicated(self):
+        """
+        Test notas already ingested from another file are skipped by the index of notas shared with ingest_notas_corretagem.
+        """
+        print("watch_notas_duplicated")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "notas_operacoes_2020.pdf")
+            sn.write_notas_pdf(path, 4)
+            raw_path = os.path.join(tmp_dir, "raw")
+            os.makedirs(raw_path)
+            template = os.path.join(tmp_dir, "processed", "{year}")
+            service = WatchNotas(
+                raw_path, template, workers=1, poll_seconds=0.05, settle_seconds=0.1
+            )
+
+            async def run():
+                stop_event = asyncio.Event()
+                task = asyncio.ensure_future(service.run(stop_event))
+                for num_files, name in enumerate(("a.pdf", "b.pdf"), 1):  # b.pdf re-sends the notas of a.pdf
+                    shutil.copy(path, os.path.join(raw_path, name))
+                    while service.status["ingested_files"] < num_files:
+                        self.assertFalse(task.done())
+                        await asyncio.sleep(0.05)
+                stop_event.set()
+                await task
+
+            asyncio.run(run())
+            self.assertEqual(service.status["ingested_rows"], len(pnc.parse_notas_corretagem_btg(path)[0]) - 1)
+            index = NotaIndex(os.path.join(ing.processed_root(template), INDEX_FILE_NAME))
+            self.assertEqual(len(index), 4)
+            self.assertSetEqual(set(index.notas.values()), {os.path.abspath(os.path.join(raw_path, "a.pdf"))})
+
+            expected_raw_path = os.path.join(tmp_dir, "expected_raw")
+            os.makedirs(expected_raw_path)
+            shutil.copy(path, os.path.join(expected_raw_path, "a.pdf"))
+            shutil.copy(path, os.path.join(expected_raw_path, "b.pdf"))
+            expected_template = os.path.join(tmp_dir, "expected", "{year}")
+            ing.ingest_notas_corretagem(expected_raw_path, expected_template)
+            for name in sorted(os.listdir(template.format(year=2020))):
+                self.assertEqual(
+                    hio.read_strings(os.path.join(expected_template.format(year=2020), name)),
+                    hio.read_strings(os.path.join(template.format(year=2020), name)),
+                )
+
+    def tearDown(self):
+        print("tearDown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)